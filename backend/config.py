@@ -25,24 +25,118 @@ class Settings(BaseSettings):
     infer_device: str = os.getenv("INFER_DEVICE", 'cuda')
     local_embedding_model: str = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     use_local_embedding: bool = os.getenv("USE_LOCAL_EMBEDDING", "true").lower() == "true"
+    # 推理后端：torch / onnx / onnx-int8；CUDA 不可用时自动回退到 CPU
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    embedding_threads: int = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 表示使用库的默认值
+    embedding_onnx_file: str = os.getenv("EMBEDDING_ONNX_FILE", "")
+    # 查询嵌入微批处理：收到第一条查询后最多等待的毫秒数和单批最多条数（<= 1 关闭）
+    embedding_batch_max_wait_ms: float = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "2"))
+    embedding_batch_max_size: int = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+    # 文档块嵌入缓存（按模型和文本哈希复用向量，重新索引时只嵌入变化的文档块）
+    embedding_cache_enabled: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    embedding_cache_dir: str = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+    # 嵌入缓存向量文件总大小上限（字节），超过后淘汰最久未使用的向量（0 表示不限制）
+    embedding_cache_max_bytes: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(1024 ** 3)))
+    # 嵌入模型变化后在后台把知识库迁移到新模型（完成前旧模型继续提供检索）
+    embedding_migration_auto: bool = os.getenv("EMBEDDING_MIGRATION_AUTO", "true").lower() == "true"
+    embedding_migration_batch_size: int = int(os.getenv("EMBEDDING_MIGRATION_BATCH_SIZE", "64"))
+    # 迁移线程占用时间的比例上限（0.5 表示每计算 1 秒休眠 1 秒，1 表示不限速）
+    embedding_migration_duty_cycle: float = float(os.getenv("EMBEDDING_MIGRATION_DUTY_CYCLE", "0.5"))
+    
+    # LLM 响应缓存配置（按调用点启用，如 intent,grading,review）
+    llm_cache_sites: str = os.getenv("LLM_CACHE_SITES", "")
+    llm_cache_backend: str = os.getenv("LLM_CACHE_BACKEND", "memory")  # memory 或 sqlite
+    llm_cache_path: str = os.getenv("LLM_CACHE_PATH", "./cache/llm_cache.sqlite3")
+    llm_cache_ttl: int = int(os.getenv("LLM_CACHE_TTL", "86400"))  # 秒，0 表示永不过期
+    llm_cache_max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+    
+    # 请求合并：相同的检索、联网搜索和 LLM 调用同时进行时只执行一次，结果共享
+    single_flight_enabled: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    # 合并 LLM 调用的调用点（只应包含低温度、结果可共享的调用）
+    single_flight_llm_sites: str = os.getenv("SINGLE_FLIGHT_LLM_SITES", "intent,grading")
     
     # Tavily 搜索配置
     tavily_api_key: Optional[str] = os.getenv("TAVILY_API_KEY", None)
+    tavily_base_url: str = os.getenv("TAVILY_BASE_URL", "https://api.tavily.com/search")
+    search_cache_ttl: int = int(os.getenv("SEARCH_CACHE_TTL", "300"))  # 秒
+    search_cache_size: int = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+    
+    # 工具调用超时（秒，从调用开始执行时计时；在线程池中排队等待的时间另外最多等待同样长）
+    tool_timeout: float = float(os.getenv("TOOL_TIMEOUT", "15"))
+    # 工具调用线程数：与同时处理的请求数（Starlette 线程池默认 40）一致，慢调用占满线程池时其他请求的调用不会一直排队
+    tool_workers: int = int(os.getenv("TOOL_WORKERS", "40"))
+    
+    # 图表渲染配置
+    chart_output_dir: str = os.getenv("CHART_OUTPUT_DIR", "./charts")
+    chart_render_workers: int = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+    
+    # 外部 HTTP 请求配置（连接池 + 重试）
+    http_timeout: float = float(os.getenv("HTTP_TIMEOUT", "10"))
+    http_max_retries: int = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    http_retry_backoff: float = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))  # 秒，按指数递增
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
     
     # ChromaDB 配置
     chroma_db_path: str = os.getenv("CHROMA_DB_PATH", "./chroma_db")
     chroma_collection_name: str = os.getenv("CHROMA_COLLECTION_NAME", "financial_economics_knowledge")
+    # 知识点倒排索引：入库时为文档块提取关键词标签，按知识点检索时直接查表（未命中时回退到语义检索）
+    topic_index_enabled: bool = os.getenv("TOPIC_INDEX_ENABLED", "true").lower() == "true"
+    topic_keywords_per_chunk: int = int(os.getenv("TOPIC_KEYWORDS_PER_CHUNK", "8"))
+    # 未指定课程时使用的命名空间（对应 CHROMA_COLLECTION_NAME 集合本身，其他课程为 <集合名>__<课程>）
+    default_namespace: str = os.getenv("DEFAULT_NAMESPACE", "default")
+    
+    # 向量存储后端：chroma 或 local（进程内内存映射存储）
+    vector_store_backend: str = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    local_vector_store_path: str = os.getenv("LOCAL_VECTOR_STORE_PATH", "./vector_store")
+    local_vector_dtype: str = os.getenv("LOCAL_VECTOR_DTYPE", "float16")  # float16 或 int8
+    vector_hnsw_threshold: int = int(os.getenv("VECTOR_HNSW_THRESHOLD", "50000"))  # 需要安装 hnswlib，0 表示不使用
+    # snapshot 后端：各 worker 检查新版本的间隔（秒）和保留的历史版本数
+    vector_snapshot_check_interval: float = float(os.getenv("VECTOR_SNAPSHOT_CHECK_INTERVAL", "1.0"))
+    vector_snapshot_keep: int = int(os.getenv("VECTOR_SNAPSHOT_KEEP", "3"))
     
     # 学习进度数据库配置
     learning_progress_db_path: str = os.getenv("LEARNING_PROGRESS_DB_PATH", "./learning_progress_db")
     
+    # 对话存储配置（短期记忆）
+    conversation_store_backend: str = os.getenv("CONVERSATION_STORE_BACKEND", "sqlite")  # sqlite 或 memory
+    conversation_db_path: str = os.getenv("CONVERSATION_DB_PATH", "./conversation_db/conversations.sqlite3")
+    conversation_history_limit: int = int(os.getenv("CONVERSATION_HISTORY_LIMIT", "20"))
+    conversation_cache_size: int = int(os.getenv("CONVERSATION_CACHE_SIZE", "1000"))
+    conversation_summary_enabled: bool = os.getenv("CONVERSATION_SUMMARY_ENABLED", "true").lower() == "true"
+    conversation_summary_trigger: int = int(os.getenv("CONVERSATION_SUMMARY_TRIGGER", "10"))  # 窗口外累计多少条消息后触发摘要
+    conversation_summary_model: str = os.getenv("CONVERSATION_SUMMARY_MODEL", "gpt-3.5-turbo")
+    
+    # 提示词 token 预算：每次调用 LLM 的输入 token 上限，依次放入系统提示词、最新一轮对话和摘要、检索片段、更早的消息（0 表示不限制）
+    prompt_token_budget: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+    # 最新一轮对话和摘要在检索片段之前预留的预算比例上限
+    prompt_history_reserve_ratio: float = float(os.getenv("PROMPT_HISTORY_RESERVE_RATIO", "0.25"))
+    # 预算边界上的片段或消息截断后至少保留的 token 数，不足则整条丢弃
+    prompt_min_truncated_tokens: int = int(os.getenv("PROMPT_MIN_TRUNCATED_TOKENS", "64"))
+    
     # 文档分片配置（默认值，可通过 API 修改）
     default_chunk_size: int = int(os.getenv("DEFAULT_CHUNK_SIZE", "1000"))
     default_chunk_overlap: int = int(os.getenv("DEFAULT_CHUNK_OVERLAP", "200"))
+    # 文档解析结果缓存（按文件内容哈希保存，修改分片参数后重新分片无需再次解析）
+    parsed_text_cache_enabled: bool = os.getenv("PARSED_TEXT_CACHE_ENABLED", "true").lower() == "true"
+    parsed_text_cache_dir: str = os.getenv("PARSED_TEXT_CACHE_DIR", "./uploads/.parsed")
+    # 解析结果缓存总大小上限（MB），超过后删除最久未使用的文件（0 表示不限制）
+    parsed_text_cache_max_mb: int = int(os.getenv("PARSED_TEXT_CACHE_MAX_MB", "512"))
     
     # 服务器配置
     api_host: str = os.getenv("API_HOST", "0.0.0.0")
     api_port: int = int(os.getenv("API_PORT", "8000"))
+    # python -m backend.serve 启动的 worker 进程数（共享 master 中加载的嵌入模型）
+    api_workers: int = int(os.getenv("API_WORKERS", "2"))
+    # 启动后在后台预热模型和数据库连接（预热完成前 /readyz 返回 503）
+    warmup_on_startup: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+    # 预热失败的步骤第一次重试前等待的秒数（之后每次翻倍，不超过上限；0 表示不重试）
+    warmup_retry_interval: float = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+    warmup_retry_max_interval: float = float(os.getenv("WARMUP_RETRY_MAX_INTERVAL", "300"))
+    # 预热时嵌入的代表性查询（逗号分隔）
+    warmup_queries: str = os.getenv(
+        "WARMUP_QUERIES",
+        "什么是通货膨胀,利率变化如何影响债券价格,GDP 是如何计算的,股票和债券有什么区别"
+    )
     
     # 前端配置
     frontend_url: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -3,18 +3,50 @@ import os
 import uuid
 from typing import Optional
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
 from backend.config import settings
 from backend.models.schemas import (
-    ChatRequest, ChatResponse, UserProgress, 
+    ChatRequest, ChatResponse, UserProgress, CourseEnrollment,
     DocumentUpload, ProgressUpdate, ChunkSettings,
-    ReindexRequest, ReindexResponse
+    ReindexRequest, ReindexResponse, ChartSpec, ChartResponse
 )
-from backend.modules.workflow import teaching_workflow
-from backend.modules.rag import rag_knowledge_base
-from backend.modules.memory import memory_manager
-from backend.models.database import learning_progress_db
+from backend.utils.http_client import close_http_clients
+from backend.utils.charts import chart_renderer
+from backend.utils.lazy import lazy_import
+from backend.utils.locks import single_flight_stats
+from backend.utils.warmup import Warmup
+
+# 业务模块（及 LangChain、ChromaDB、嵌入模型）在第一次使用时才导入和初始化，
+# 服务进程启动后即可响应健康检查
+rag_knowledge_base = lazy_import("backend.modules.rag", "rag_knowledge_base")
+knowledge_bases = lazy_import("backend.modules.rag", "knowledge_bases")
+learning_progress_db = lazy_import("backend.models.database", "learning_progress_db")
+memory_manager = lazy_import("backend.modules.memory", "memory_manager")
+teaching_workflow = lazy_import("backend.modules.workflow", "teaching_workflow")
+llm_response_cache = lazy_import("backend.utils.llm_cache", "llm_response_cache")
+
+# 就绪检查的服务
+SERVICES = [rag_knowledge_base, learning_progress_db, memory_manager, teaching_workflow]
+
+
+def _load_tokenizer():
+    """加载 token 计数使用的编码（首次使用时可能需要下载编码文件）"""
+    from backend.utils.tokens import get_encoding
+    get_encoding()
+
+
+# 启动预热步骤（按依赖顺序）
+WARMUP_QUERIES = [query.strip() for query in settings.warmup_queries.split(",") if query.strip()]
+warmup = Warmup(retry_interval=settings.warmup_retry_interval,
+                max_retry_interval=settings.warmup_retry_max_interval)
+warmup.add_step("rag_knowledge_base", lambda: knowledge_bases.warm_up(WARMUP_QUERIES))
+warmup.add_step("learning_progress_db", learning_progress_db.get)
+warmup.add_step("memory_manager", memory_manager.get)
+warmup.add_step("tokenizer", _load_tokenizer)
+warmup.add_step("teaching_workflow", lambda: teaching_workflow.warm_up())
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -36,6 +68,23 @@ app.add_middleware(
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# 已渲染的图表作为静态文件提供
+app.mount("/charts", StaticFiles(directory=settings.chart_output_dir), name="charts")
+
+
+@app.on_event("startup")
+async def startup():
+    """在后台线程中预热服务，不阻塞启动"""
+    if settings.warmup_on_startup:
+        warmup.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """关闭共享的 HTTP 连接池和图表渲染进程池"""
+    await close_http_clients()
+    chart_renderer.shutdown()
+
 
 @app.get("/")
 async def root():
@@ -47,6 +96,33 @@ async def root():
     }
 
 
+@app.get("/healthz")
+async def healthz():
+    """存活检查（进程可以响应请求即返回 200）"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    就绪检查
+
+    开启预热时预热全部成功后才返回 200（失败的步骤在后台重试，成功后自动就绪）；
+    未开启预热时服务在第一次请求时才初始化，应用启动后即返回 200。
+    """
+    services = {service.name: service.initialized for service in SERVICES}
+    if settings.warmup_on_startup:
+        ready = warmup.ready
+        status = "ready" if ready else ("retrying" if warmup.done else "warming_up")
+    else:
+        ready = True
+        status = "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": status, "services": services, "warmup": warmup.snapshot()}
+    )
+
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -55,7 +131,9 @@ async def chat(request: ChatRequest):
     处理用户消息，返回 AI 回复
     """
     try:
-        response = teaching_workflow.process_message(
+        # 在线程池中处理，避免阻塞事件循环；同一用户的并发请求由记忆和进度模块加锁保护
+        response = await run_in_threadpool(
+            teaching_workflow.process_message,
             user_id=request.user_id,
             message=request.message,
             conversation_id=request.conversation_id
@@ -66,13 +144,18 @@ async def chat(request: ChatRequest):
 
 
 @app.post("/api/upload", response_model=DocumentUpload)
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), namespace: Optional[str] = None):
     """
     文档上传接口
     
-    上传文档到知识库
+    上传文档到知识库（namespace 指定课程命名空间，为空时使用默认命名空间）
     """
     try:
+        try:
+            knowledge_base = await run_in_threadpool(knowledge_bases.for_namespace, namespace)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # 检查文件类型
         allowed_extensions = [".pdf", ".txt", ".doc", ".docx", ".ppt", ".pptx", ".md"]
         file_ext = os.path.splitext(file.filename)[1].lower()
@@ -87,12 +170,17 @@ async def upload_document(file: UploadFile = File(...)):
         file_id = str(uuid.uuid4())
         file_path = os.path.join(UPLOAD_DIR, f"{file_id}{file_ext}")
         
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        content = await file.read()
+        
+        def save():
+            with open(file_path, "wb") as f:
+                f.write(content)
         
-        # 添加到知识库（使用当前配置的分片参数）
-        chunks_count = rag_knowledge_base.add_document_from_file(
+        await run_in_threadpool(save)
+        
+        # 添加到知识库（使用当前配置的分片参数；解析、嵌入和写入在线程池中执行，不阻塞事件循环）
+        chunks_count = await run_in_threadpool(
+            knowledge_base.add_document_from_file,
             file_path,
             chunk_size=settings.default_chunk_size,
             chunk_overlap=settings.default_chunk_overlap
@@ -102,7 +190,8 @@ async def upload_document(file: UploadFile = File(...)):
             file_id=file_id,
             filename=file.filename,
             status="success",
-            chunks_count=chunks_count
+            chunks_count=chunks_count,
+            namespace=knowledge_base.namespace
         )
     except HTTPException:
         raise
@@ -110,13 +199,29 @@ async def upload_document(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"上传文档时出错: {str(e)}")
 
 
+@app.post("/api/charts", response_model=ChartResponse)
+async def create_chart(spec: ChartSpec):
+    """
+    生成图表
+    
+    相同的图表只渲染一次，之后直接返回已缓存的图片地址
+    """
+    try:
+        url, cached = await chart_renderer.arender(spec)
+        return ChartResponse(url=url, cached=cached)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"图表数据无法绘制: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"生成图表时出错: {str(e)}")
+
+
 @app.get("/api/progress/{user_id}", response_model=UserProgress)
 async def get_progress(user_id: str):
     """
     获取用户学习进度
     """
     try:
-        progress = learning_progress_db.get_user_progress(user_id)
+        progress = await run_in_threadpool(learning_progress_db.get_user_progress, user_id)
         return progress
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取进度时出错: {str(e)}")
@@ -128,40 +233,113 @@ async def update_progress(user_id: str, update: ProgressUpdate):
     更新用户学习进度
     """
     try:
-        learning_progress_db.update_user_progress(user_id, update)
+        await run_in_threadpool(learning_progress_db.update_user_progress, user_id, update)
         return {"message": "进度更新成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新进度时出错: {str(e)}")
 
 
+@app.post("/api/progress/{user_id}/courses")
+async def update_enrolled_courses(user_id: str, enrollment: CourseEnrollment):
+    """
+    设置用户选修的课程（检索只在这些课程的知识库中进行）
+    """
+    from backend.modules.rag import normalize_namespace
+    
+    try:
+        courses = [normalize_namespace(course) for course in enrollment.courses]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        await run_in_threadpool(learning_progress_db.set_enrolled_courses, user_id, courses)
+        return {"message": "选课更新成功", "courses": courses}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"更新选课时出错: {str(e)}")
+
+
+@app.get("/api/knowledge/namespaces")
+async def list_knowledge_namespaces():
+    """
+    列出所有课程命名空间及其知识库信息
+    """
+    try:
+        return await run_in_threadpool(knowledge_bases.get_namespaces_info)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取课程列表时出错: {str(e)}")
+
+
 @app.get("/api/knowledge/info")
-async def get_knowledge_info():
+async def get_knowledge_info(namespace: Optional[str] = None):
     """
     获取知识库信息
     """
     try:
-        info = rag_knowledge_base.get_collection_info()
+        info = await run_in_threadpool(lambda: knowledge_bases.for_namespace(namespace, create=False).get_collection_info())
         return info
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取知识库信息时出错: {str(e)}")
 
 
 @app.post("/api/knowledge/search")
-async def search_knowledge(query: str, k: int = 5):
+async def search_knowledge(query: str, k: int = 5, namespaces: Optional[str] = None):
     """
-    搜索知识库
+    搜索知识库（namespaces 为逗号分隔的课程命名空间，为空时检索默认命名空间）
     """
     try:
-        results = rag_knowledge_base.search(query, k=k)
+        selected = [ns.strip() for ns in namespaces.split(",") if ns.strip()] if namespaces else None
+        # 在线程池中检索：等待合并批次或其他请求的相同检索时不阻塞事件循环
+        results = await run_in_threadpool(knowledge_bases.search, query, k=k, namespaces=selected)
         return {
             "query": query,
             "results": results,
             "count": len(results)
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索知识库时出错: {str(e)}")
 
 
+@app.get("/api/knowledge/migration")
+async def get_embedding_migration(namespace: Optional[str] = None):
+    """
+    获取嵌入模型迁移状态
+    """
+    try:
+        return await run_in_threadpool(lambda: knowledge_bases.for_namespace(namespace, create=False).migration_status())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取迁移状态时出错: {str(e)}")
+
+
+@app.post("/api/knowledge/migration")
+async def start_embedding_migration(namespace: Optional[str] = None):
+    """
+    把知识库迁移到当前配置的嵌入模型（后台执行，完成前旧模型继续提供检索）
+    """
+    try:
+        return await run_in_threadpool(lambda: knowledge_bases.for_namespace(namespace, create=False).start_migration())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"启动迁移时出错: {str(e)}")
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """
+    获取 LLM 响应缓存命中统计和请求合并统计
+    """
+    return {
+        "enabled_sites": sorted(llm_response_cache.enabled_sites),
+        "sites": llm_response_cache.stats.snapshot(),
+        "single_flight": single_flight_stats()
+    }
+
+
 @app.get("/api/knowledge/chunk-settings")
 async def get_chunk_settings():
     """
@@ -202,7 +380,7 @@ async def update_chunk_settings(settings_data: ChunkSettings):
 @app.post("/api/knowledge/reindex", response_model=ReindexResponse)
 async def reindex_knowledge(request: ReindexRequest):
     """
-    重新分片和索引所有文档
+    重新分片和索引所有文档（指定 namespace 时只处理一门课程）
     
     警告：此操作会删除所有现有文档块并重新创建，可能需要较长时间。
     请确保已确认操作。
@@ -216,11 +394,16 @@ async def reindex_knowledge(request: ReindexRequest):
             )
         
         # 执行重新索引
-        stats = rag_knowledge_base.reindex_all_documents(
-            chunk_size=request.chunk_size,
-            chunk_overlap=request.chunk_overlap,
-            upload_dir=UPLOAD_DIR
-        )
+        try:
+            stats = await run_in_threadpool(
+                knowledge_bases.reindex,
+                chunk_size=request.chunk_size,
+                chunk_overlap=request.chunk_overlap,
+                upload_dir=UPLOAD_DIR,
+                namespace=request.namespace
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # 更新配置（通过环境变量或配置文件）
         # 注意：这里只是临时更新，实际应该持久化到配置文件
@@ -232,6 +415,8 @@ async def reindex_knowledge(request: ReindexRequest):
             message=f"重新索引完成。处理了 {stats['reindexed_sources']} 个文档源，共 {stats['total_chunks_after']} 个文档块。",
             stats=stats
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"重新索引时出错: {str(e)}")
 
@@ -0,0 +1,418 @@
+"""对话存储模块（短期记忆持久化）"""
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from backend.config import settings
+
+
+class StoredMessage(NamedTuple):
+    """存储中的一条对话消息"""
+    id: int
+    role: str  # "human" 或 "ai"
+    content: str
+
+
+class ConversationSummary(NamedTuple):
+    """对话的滚动摘要"""
+    summary: str
+    upto_id: int  # 摘要已覆盖到的最后一条消息ID
+
+
+class CompactHistory:
+    """
+    紧凑的消息序列
+
+    消息ID、角色编码和文本分别存放在并行数组中，每条消息只占一个 int64、
+    一个字节的角色编码和文本本身，没有逐条消息的对象和字典开销。
+    只有在读取时才会生成 StoredMessage。
+    """
+
+    __slots__ = ("_ids", "_roles", "_texts", "maxlen")
+
+    ROLE_NAMES = ("human", "ai")
+    ROLE_CODES = {name: code for code, name in enumerate(ROLE_NAMES)}
+
+    def __init__(self, maxlen: Optional[int] = None):
+        """
+        初始化消息序列
+
+        Args:
+            maxlen: 最多保留的消息条数（None 表示不限制）
+        """
+        self._ids = array("q")
+        self._roles = bytearray()
+        self._texts: List[str] = []
+        self.maxlen = maxlen
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def last_id(self) -> int:
+        """最后一条消息的ID（为空时返回 0）"""
+        return self._ids[-1] if self._ids else 0
+
+    def append(self, message_id: int, role: str, content: str) -> None:
+        """追加一条消息"""
+        self._ids.append(message_id)
+        self._roles.append(self.ROLE_CODES[role])
+        self._texts.append(content)
+        # 超出上限一倍时再整体裁剪，均摊掉删除数组头部的开销
+        if self.maxlen is not None and len(self._ids) >= self.maxlen * 2:
+            excess = len(self._ids) - self.maxlen
+            del self._ids[:excess]
+            del self._roles[:excess]
+            del self._texts[:excess]
+
+    def _materialize(self, start: int, stop: int) -> List[StoredMessage]:
+        """生成 [start, stop) 区间的消息"""
+        role_names = self.ROLE_NAMES
+        return [
+            StoredMessage(self._ids[i], role_names[self._roles[i]], self._texts[i])
+            for i in range(start, stop)
+        ]
+
+    def tail(self, limit: int) -> List[StoredMessage]:
+        """读取最近的 limit 条消息（受 maxlen 限制）"""
+        size = len(self._ids)
+        if self.maxlen is not None:
+            limit = min(limit, self.maxlen)
+        return self._materialize(max(0, size - limit), size) if limit > 0 else []
+
+    def range(self, after_id: int, before_id: int) -> List[StoredMessage]:
+        """读取 ID 在 (after_id, before_id) 区间内的消息"""
+        ids = self._ids
+        start = 0
+        while start < len(ids) and ids[start] <= after_id:
+            start += 1
+        stop = start
+        while stop < len(ids) and ids[stop] < before_id:
+            stop += 1
+        return self._materialize(start, stop)
+
+
+class ConversationStore(ABC):
+    """
+    对话存储后端接口
+
+    只支持追加写入和读取最近 N 条消息，不提供原地修改，
+    因此多个进程可以安全地共享同一份存储。
+    """
+
+    @abstractmethod
+    def append(self, memory_key: str, role: str, content: str) -> int:
+        """追加一条消息，返回消息ID（单调递增）"""
+
+    @abstractmethod
+    def append_many(self, memory_key: str, messages: Sequence[Tuple[str, str]]) -> List[int]:
+        """
+        原子地追加多条消息，保证它们在对话中相邻（不会与其他请求的消息交错）
+
+        Args:
+            memory_key: 对话键
+            messages: (role, content) 列表
+
+        Returns:
+            消息ID列表
+        """
+
+    @abstractmethod
+    def read_recent(self, memory_key: str, limit: int, after_id: int = 0) -> List[StoredMessage]:
+        """
+        读取最近的消息（按时间正序）
+
+        Args:
+            memory_key: 对话键
+            limit: 最多返回的消息数
+            after_id: 只返回 ID 大于该值的消息
+
+        Returns:
+            消息列表
+        """
+
+    @abstractmethod
+    def read_range(self, memory_key: str, after_id: int, before_id: int, limit: int) -> List[StoredMessage]:
+        """读取 ID 在 (after_id, before_id) 区间内最早的若干条消息（按时间正序）"""
+
+    @abstractmethod
+    def get_summary(self, memory_key: str) -> Optional[ConversationSummary]:
+        """获取对话摘要"""
+
+    @abstractmethod
+    def save_summary(self, memory_key: str, summary: str, upto_id: int) -> None:
+        """保存对话摘要（只接受覆盖范围更新的摘要）"""
+
+    @abstractmethod
+    def clear(self, memory_key: str) -> None:
+        """删除某个对话的全部消息和摘要"""
+
+
+class InMemoryConversationStore(ConversationStore):
+    """进程内存储（仅适用于单进程开发环境）"""
+
+    def __init__(self):
+        self._messages: Dict[str, CompactHistory] = {}
+        self._summaries: Dict[str, ConversationSummary] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def append(self, memory_key: str, role: str, content: str) -> int:
+        with self._lock:
+            message_id = self._next_id
+            self._next_id += 1
+            self._messages.setdefault(memory_key, CompactHistory()).append(message_id, role, content)
+            return message_id
+
+    def append_many(self, memory_key: str, messages: Sequence[Tuple[str, str]]) -> List[int]:
+        with self._lock:
+            ids = []
+            for role, content in messages:
+                ids.append(self._next_id)
+                self._messages.setdefault(memory_key, CompactHistory()).append(self._next_id, role, content)
+                self._next_id += 1
+            return ids
+
+    def read_recent(self, memory_key: str, limit: int, after_id: int = 0) -> List[StoredMessage]:
+        with self._lock:
+            history = self._messages.get(memory_key)
+            if history is None:
+                return []
+            if after_id:
+                return history.range(after_id, history.last_id + 1)[-limit:] if limit > 0 else []
+            return history.tail(limit)
+
+    def read_range(self, memory_key: str, after_id: int, before_id: int, limit: int) -> List[StoredMessage]:
+        with self._lock:
+            history = self._messages.get(memory_key)
+            return history.range(after_id, before_id)[:limit] if history is not None else []
+
+    def get_summary(self, memory_key: str) -> Optional[ConversationSummary]:
+        with self._lock:
+            return self._summaries.get(memory_key)
+
+    def save_summary(self, memory_key: str, summary: str, upto_id: int) -> None:
+        with self._lock:
+            current = self._summaries.get(memory_key)
+            if current is None or upto_id > current.upto_id:
+                self._summaries[memory_key] = ConversationSummary(summary, upto_id)
+
+    def clear(self, memory_key: str) -> None:
+        with self._lock:
+            self._messages.pop(memory_key, None)
+            self._summaries.pop(memory_key, None)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    基于 SQLite 的对话存储
+
+    使用 WAL 模式，多个 uvicorn worker 进程可以同时读写同一个数据库文件。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        初始化存储
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # sqlite3 连接不能跨线程共享，每个线程持有自己的连接
+        self._local = threading.local()
+
+        conn = self._get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                memory_key TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_key_id ON messages (memory_key, id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                memory_key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                upto_id INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, memory_key: str, role: str, content: str) -> int:
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO messages (memory_key, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (memory_key, role, content, time.time())
+            )
+        return cursor.lastrowid
+
+    def append_many(self, memory_key: str, messages: Sequence[Tuple[str, str]]) -> List[int]:
+        conn = self._get_connection()
+        ids = []
+        # BEGIN IMMEDIATE 立即获取写锁，其他进程的写入不会插在这批消息中间
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            for role, content in messages:
+                cursor = conn.execute(
+                    "INSERT INTO messages (memory_key, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    (memory_key, role, content, now)
+                )
+                ids.append(cursor.lastrowid)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return ids
+
+    def read_recent(self, memory_key: str, limit: int, after_id: int = 0) -> List[StoredMessage]:
+        if limit <= 0:
+            return []
+        rows = self._get_connection().execute(
+            "SELECT id, role, content FROM messages WHERE memory_key = ? AND id > ? ORDER BY id DESC LIMIT ?",
+            (memory_key, after_id, limit)
+        ).fetchall()
+        return [StoredMessage(*row) for row in reversed(rows)]
+
+    def read_range(self, memory_key: str, after_id: int, before_id: int, limit: int) -> List[StoredMessage]:
+        rows = self._get_connection().execute(
+            "SELECT id, role, content FROM messages WHERE memory_key = ? AND id > ? AND id < ? ORDER BY id LIMIT ?",
+            (memory_key, after_id, before_id, limit)
+        ).fetchall()
+        return [StoredMessage(*row) for row in rows]
+
+    def get_summary(self, memory_key: str) -> Optional[ConversationSummary]:
+        row = self._get_connection().execute(
+            "SELECT summary, upto_id FROM summaries WHERE memory_key = ?",
+            (memory_key,)
+        ).fetchone()
+        return ConversationSummary(*row) if row else None
+
+    def save_summary(self, memory_key: str, summary: str, upto_id: int) -> None:
+        conn = self._get_connection()
+        with conn:
+            # 多个进程可能同时生成摘要，只保留覆盖范围最新的一份
+            conn.execute(
+                """
+                INSERT INTO summaries (memory_key, summary, upto_id, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (memory_key) DO UPDATE SET
+                    summary = excluded.summary,
+                    upto_id = excluded.upto_id,
+                    updated_at = excluded.updated_at
+                WHERE excluded.upto_id > summaries.upto_id
+                """,
+                (memory_key, summary, upto_id, time.time())
+            )
+
+    def clear(self, memory_key: str) -> None:
+        conn = self._get_connection()
+        with conn:
+            conn.execute("DELETE FROM messages WHERE memory_key = ?", (memory_key,))
+            conn.execute("DELETE FROM summaries WHERE memory_key = ?", (memory_key,))
+
+
+class CachedConversationStore(ConversationStore):
+    """
+    带进程内缓存的对话存储
+
+    缓存每个对话最近 window 条消息。读取时只从后端增量拉取缓存之后的新消息，
+    因此其他进程写入的消息也能被及时看到。
+    """
+
+    def __init__(self, backend: ConversationStore, window: int, max_conversations: int):
+        """
+        初始化缓存
+
+        Args:
+            backend: 实际的存储后端
+            window: 每个对话缓存的消息条数
+            max_conversations: 最多缓存的对话数量（LRU 淘汰）
+        """
+        self.backend = backend
+        self.window = window
+        self.max_conversations = max_conversations
+        self._cache: "OrderedDict[str, CompactHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def append(self, memory_key: str, role: str, content: str) -> int:
+        # 只写后端，下一次读取时会增量同步到缓存
+        return self.backend.append(memory_key, role, content)
+
+    def append_many(self, memory_key: str, messages: Sequence[Tuple[str, str]]) -> List[int]:
+        return self.backend.append_many(memory_key, messages)
+
+    def read_recent(self, memory_key: str, limit: int, after_id: int = 0) -> List[StoredMessage]:
+        if limit > self.window or after_id:
+            return self.backend.read_recent(memory_key, limit, after_id)
+
+        with self._lock:
+            cached = self._cache.get(memory_key)
+            last_id = cached.last_id if cached is not None else 0
+
+        new_messages = self.backend.read_recent(memory_key, self.window, after_id=last_id)
+
+        with self._lock:
+            cached = self._cache.get(memory_key)
+            if cached is None:
+                cached = CompactHistory(maxlen=self.window)
+                self._cache[memory_key] = cached
+            for message in new_messages:
+                # 并发读取可能拉到重复的消息，按 ID 去重
+                if message.id > cached.last_id:
+                    cached.append(message.id, message.role, message.content)
+            self._cache.move_to_end(memory_key)
+            while len(self._cache) > self.max_conversations:
+                self._cache.popitem(last=False)
+            return cached.tail(limit)
+
+    def read_range(self, memory_key: str, after_id: int, before_id: int, limit: int) -> List[StoredMessage]:
+        return self.backend.read_range(memory_key, after_id, before_id, limit)
+
+    def get_summary(self, memory_key: str) -> Optional[ConversationSummary]:
+        return self.backend.get_summary(memory_key)
+
+    def save_summary(self, memory_key: str, summary: str, upto_id: int) -> None:
+        self.backend.save_summary(memory_key, summary, upto_id)
+
+    def clear(self, memory_key: str) -> None:
+        self.backend.clear(memory_key)
+        with self._lock:
+            self._cache.pop(memory_key, None)
+
+
+def create_conversation_store() -> ConversationStore:
+    """根据配置创建对话存储"""
+    if settings.conversation_store_backend == "memory":
+        return InMemoryConversationStore()
+    if settings.conversation_store_backend == "sqlite":
+        backend = SQLiteConversationStore(settings.conversation_db_path)
+        # 提示词最多包含“摘要之后尚未折叠”的消息，缓存窗口需要覆盖这部分
+        return CachedConversationStore(
+            backend,
+            window=settings.conversation_history_limit + settings.conversation_summary_trigger,
+            max_conversations=settings.conversation_cache_size
+        )
+    raise ValueError(f"不支持的对话存储后端: {settings.conversation_store_backend}")
@@ -3,10 +3,14 @@ import json
 import os
 from typing import Dict, List, Optional
 from datetime import datetime
-import chromadb
-from chromadb.config import Settings as ChromaSettings
 from backend.config import settings
 from backend.models.schemas import UserProgress, ProgressUpdate
+from backend.utils.lazy import LazySingleton
+from backend.utils.locks import StripedLock
+
+# 进度记录只按用户ID读写，不做相似度检索：写入固定的占位向量，不调用嵌入模型。
+# 维度与早期版本用 ChromaDB 默认嵌入函数（all-MiniLM-L6-v2）写入的数据一致
+_PLACEHOLDER_EMBEDDING = [0.0] * 384
 
 
 class LearningProgressDB:
@@ -14,6 +18,9 @@ class LearningProgressDB:
     
     def __init__(self):
         """初始化数据库"""
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        
         self.client = chromadb.PersistentClient(
             path=settings.learning_progress_db_path,
             settings=ChromaSettings(anonymized_telemetry=False)
@@ -22,6 +29,9 @@ class LearningProgressDB:
             name="user_learning_progress",
             metadata={"description": "用户学习进度存储"}
         )
+        # 进度更新是“读-改-写”操作，同一用户的并发更新需要串行化，否则会丢失更新；
+        # 多个 worker 进程共用同一个数据库，用锁文件在进程之间也互斥
+        self._user_locks = StripedLock(path=os.path.join(settings.learning_progress_db_path, "progress.lock"))
     
     def get_user_progress(self, user_id: str) -> UserProgress:
         """获取用户学习进度"""
@@ -38,6 +48,7 @@ class LearningProgressDB:
                 mastery_level={},
                 weak_points=[],
                 mastered_topics=[],
+                enrolled_courses=[],
                 last_updated=datetime.now()
             )
         
@@ -53,42 +64,52 @@ class LearningProgressDB:
             mastery_level=progress_data.get("mastery_level", {}),
             weak_points=progress_data.get("weak_points", []),
             mastered_topics=progress_data.get("mastered_topics", []),
+            enrolled_courses=progress_data.get("enrolled_courses", []),
             last_updated=datetime.fromisoformat(metadata.get("last_updated", datetime.now().isoformat()))
         )
     
     def update_user_progress(self, user_id: str, update: ProgressUpdate):
         """更新用户学习进度"""
-        progress = self.get_user_progress(user_id)
-        
-        # 更新掌握程度
-        current_level = progress.mastery_level.get(update.topic, 0.0)
-        if update.is_correct:
-            # 答对了，提高掌握程度
-            new_level = min(100.0, current_level + (100 - current_level) * 0.1)
-            progress.mastery_level[update.topic] = new_level
+        with self._user_locks.lock(user_id):
+            progress = self.get_user_progress(user_id)
             
-            # 如果掌握程度超过 80，加入已掌握列表
-            if new_level >= 80 and update.topic not in progress.mastered_topics:
-                progress.mastered_topics.append(update.topic)
-        else:
-            # 答错了，降低掌握程度并记录错题
-            new_level = max(0.0, current_level - 10.0)
-            progress.mastery_level[update.topic] = new_level
+            # 更新掌握程度
+            current_level = progress.mastery_level.get(update.topic, 0.0)
+            if update.is_correct:
+                # 答对了，提高掌握程度
+                new_level = min(100.0, current_level + (100 - current_level) * 0.1)
+                progress.mastery_level[update.topic] = new_level
+                
+                # 如果掌握程度超过 80，加入已掌握列表
+                if new_level >= 80 and update.topic not in progress.mastered_topics:
+                    progress.mastered_topics.append(update.topic)
+            else:
+                # 答错了，降低掌握程度并记录错题
+                new_level = max(0.0, current_level - 10.0)
+                progress.mastery_level[update.topic] = new_level
+                
+                # 记录错题
+                if update.question:
+                    error_record = f"{update.topic}: {update.question} | 正确答案: {update.answer}"
+                    if error_record not in progress.weak_points:
+                        progress.weak_points.append(error_record)
             
-            # 记录错题
-            if update.question:
-                error_record = f"{update.topic}: {update.question} | 正确答案: {update.answer}"
-                if error_record not in progress.weak_points:
-                    progress.weak_points.append(error_record)
-        
-        # 保存到数据库
-        self._save_progress(progress)
+            # 保存到数据库
+            self._save_progress(progress)
     
     def set_current_topic(self, user_id: str, topic: str):
         """设置当前学习主题"""
-        progress = self.get_user_progress(user_id)
-        progress.current_topic = topic
-        self._save_progress(progress)
+        with self._user_locks.lock(user_id):
+            progress = self.get_user_progress(user_id)
+            progress.current_topic = topic
+            self._save_progress(progress)
+    
+    def set_enrolled_courses(self, user_id: str, courses: List[str]):
+        """设置选修的课程命名空间"""
+        with self._user_locks.lock(user_id):
+            progress = self.get_user_progress(user_id)
+            progress.enrolled_courses = list(dict.fromkeys(courses))
+            self._save_progress(progress)
     
     def _save_progress(self, progress: UserProgress):
         """保存进度到数据库"""
@@ -98,12 +119,14 @@ class LearningProgressDB:
         progress_data = {
             "mastery_level": progress.mastery_level,
             "weak_points": progress.weak_points,
-            "mastered_topics": progress.mastered_topics
+            "mastered_topics": progress.mastered_topics,
+            "enrolled_courses": progress.enrolled_courses
         }
         
         self.collection.upsert(
             ids=[progress.user_id],
             documents=[json.dumps(progress_data, ensure_ascii=False)],
+            embeddings=[_PLACEHOLDER_EMBEDDING],
             metadatas=[{
                 "current_topic": progress.current_topic or "",
                 "last_updated": progress.last_updated.isoformat()
@@ -117,5 +140,5 @@ class LearningProgressDB:
 
 
 # 全局数据库实例
-learning_progress_db = LearningProgressDB()
+learning_progress_db = LazySingleton(LearningProgressDB, "learning_progress_db")
 
@@ -1,6 +1,6 @@
 """Pydantic 数据模型"""
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Literal
+from pydantic import BaseModel, Field, confloat, model_validator
 from datetime import datetime
 
 
@@ -33,6 +33,7 @@ class UserProgress(BaseModel):
     mastery_level: Dict[str, float] = Field(default_factory=dict, description="各知识点掌握程度 0-100")
     weak_points: List[str] = Field(default_factory=list, description="错题记录")
     mastered_topics: List[str] = Field(default_factory=list, description="已掌握知识点列表")
+    enrolled_courses: List[str] = Field(default_factory=list, description="选修的课程命名空间（为空时检索默认命名空间）")
     last_updated: Optional[datetime] = None
 
 
@@ -45,12 +46,18 @@ class ProgressUpdate(BaseModel):
     answer: Optional[str] = Field(None, description="用户答案")
 
 
+class CourseEnrollment(BaseModel):
+    """选课更新模型"""
+    courses: List[str] = Field(..., max_length=20, description="选修的课程命名空间")
+
+
 class DocumentUpload(BaseModel):
     """文档上传响应模型"""
     file_id: str = Field(..., description="文件ID")
     filename: str = Field(..., description="文件名")
     status: str = Field(..., description="处理状态")
     chunks_count: int = Field(..., description="文档分块数量")
+    namespace: str = Field(..., description="所属课程命名空间")
 
 
 class IntentResponse(BaseModel):
@@ -71,6 +78,7 @@ class ReindexRequest(BaseModel):
     chunk_size: int = Field(..., ge=100, le=5000, description="新的文档分块大小")
     chunk_overlap: int = Field(..., ge=0, le=1000, description="新的分块重叠大小")
     confirm: bool = Field(False, description="确认重新索引")
+    namespace: Optional[str] = Field(None, description="只重新索引这个课程命名空间（为空时处理所有命名空间）")
 
 
 class ReindexResponse(BaseModel):
@@ -79,3 +87,40 @@ class ReindexResponse(BaseModel):
     message: str = Field(..., description="响应消息")
     stats: Optional[Dict[str, Any]] = Field(None, description="统计信息")
 
+
+# 图表数据值的绝对值上限（超出后坐标轴计算会溢出，也不是有意义的教学数据）
+CHART_VALUE_LIMIT = 1e15
+
+
+class ChartSeries(BaseModel):
+    """图表数据系列"""
+    name: str = Field(..., max_length=50, description="系列名称")
+    values: List[confloat(allow_inf_nan=False, ge=-CHART_VALUE_LIMIT, le=CHART_VALUE_LIMIT)] = Field(
+        ..., min_length=1, max_length=500, description="数据值，与 labels 一一对应"
+    )
+
+
+class ChartSpec(BaseModel):
+    """图表描述（绘图工具的输入）"""
+    chart_type: Literal["line", "bar", "pie"] = Field(..., description="图表类型")
+    title: Optional[str] = Field(None, max_length=100, description="图表标题")
+    labels: List[str] = Field(..., min_length=1, max_length=500, description="横轴标签（饼图为各扇区名称）")
+    series: List[ChartSeries] = Field(..., min_length=1, max_length=10, description="数据系列（饼图只使用第一个）")
+    x_label: Optional[str] = Field(None, max_length=50, description="横轴名称")
+    y_label: Optional[str] = Field(None, max_length=50, description="纵轴名称")
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        """每个系列的数据个数必须与标签个数一致"""
+        for series in self.series:
+            if len(series.values) != len(self.labels):
+                raise ValueError(f"系列 {series.name} 的数据个数与 labels 个数不一致")
+        if self.chart_type == "pie" and any(v < 0 for v in self.series[0].values):
+            raise ValueError("饼图数据不能为负数")
+        return self
+
+
+class ChartResponse(BaseModel):
+    """图表生成响应模型"""
+    url: str = Field(..., description="图表图片地址")
+    cached: bool = Field(..., description="是否命中已渲染的缓存")
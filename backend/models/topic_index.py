@@ -0,0 +1,137 @@
+"""知识点倒排索引（知识点到文档块 ID）"""
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+from backend.utils.keywords import normalize_topic
+
+# SQLite 单条语句的参数数量有限，批量删除时分段
+_QUERY_CHUNK = 500
+
+
+class TopicIndex:
+    """
+    知识点倒排索引
+
+    入库时从每个文档块提取的关键词（见 extract_keywords）作为知识点标签，
+    按标签直接查出文档块 ID，不需要嵌入查询和向量检索。标签命中不足、用语义检索
+    补足的结果连同检索时的距离也记录下来（learned），同一知识点之后直接查表，
+    排在标签命中之后；知识库有任何写入时这些记录全部作废，避免新文档永远不出现在结果中。
+    """
+
+    def __init__(self, path: str):
+        """
+        初始化索引
+
+        Args:
+            path: SQLite 数据库文件路径
+        """
+        self.path = path
+        self._local = threading.local()
+        # SQLite 连接不能跨 fork 使用，子进程重新建立连接
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        conn = self._get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS topics (
+                label TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                weight REAL NOT NULL,
+                learned INTEGER NOT NULL DEFAULT 0,
+                distance REAL,
+                PRIMARY KEY (label, chunk_id)
+            ) WITHOUT ROWID
+        """)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(topics)")]
+        if "distance" not in columns:
+            # 旧版本的语义检索记录没有距离，直接作废
+            conn.execute("ALTER TABLE topics ADD COLUMN distance REAL")
+            conn.execute("DELETE FROM topics WHERE learned = 1")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_topics_chunk ON topics (chunk_id)")
+        conn.commit()
+
+    def _after_fork(self):
+        self._local = threading.local()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            self._local.conn = conn
+        return conn
+
+    def add(self, chunk_ids: List[str], keywords: List[Dict[str, float]]):
+        """
+        记录文档块的知识点标签
+
+        Args:
+            chunk_ids: 文档块 ID
+            keywords: 与 chunk_ids 对应的 {标签: 权重}
+        """
+        rows = [(label, chunk_id, weight)
+                for chunk_id, labels in zip(chunk_ids, keywords) for label, weight in labels.items()]
+        with self._get_connection() as conn:
+            conn.execute("DELETE FROM topics WHERE learned = 1")
+            conn.executemany(
+                "INSERT OR REPLACE INTO topics (label, chunk_id, weight, learned) VALUES (?, ?, ?, 0)", rows
+            )
+
+    def remove(self, chunk_ids: List[str]):
+        """删除文档块的全部标签"""
+        with self._get_connection() as conn:
+            conn.execute("DELETE FROM topics WHERE learned = 1")
+            for start in range(0, len(chunk_ids), _QUERY_CHUNK):
+                part = chunk_ids[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(part))
+                conn.execute(f"DELETE FROM topics WHERE chunk_id IN ({placeholders})", part)
+
+    def remember(self, topic: str, hits: List[Tuple[str, float]]):
+        """
+        记录语义检索的结果（下次写入前有效，已有标签的文档块不重复记录）
+
+        Args:
+            topic: 知识点名称
+            hits: 按相关度排序的 (文档块 ID, 距离)
+        """
+        label = normalize_topic(topic)
+        if not label or not hits:
+            return
+        with self._get_connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO topics (label, chunk_id, weight, learned, distance) VALUES (?, ?, ?, 1, ?)",
+                [(label, chunk_id, 1.0 / (rank + 1), distance) for rank, (chunk_id, distance) in enumerate(hits)]
+            )
+
+    def lookup(self, topic: str, k: int) -> List[Tuple[str, Optional[float]]]:
+        """
+        按知识点查文档块
+
+        Args:
+            topic: 知识点名称（查询前规范化）
+            k: 最多返回数量
+
+        Returns:
+            (文档块 ID, 距离) 列表：先是按权重从高到低的标签命中（距离为 None），
+            再是按距离从小到大的语义检索记录（检索时的距离）；没有命中时为空
+        """
+        label = normalize_topic(topic)
+        if not label:
+            return []
+        rows = self._get_connection().execute(
+            "SELECT chunk_id, learned, distance FROM topics WHERE label = ? "
+            # 多次补足记录的结果按距离合并排序
+            "ORDER BY learned, CASE learned WHEN 0 THEN -weight ELSE distance END, chunk_id LIMIT ?",
+            (label, k)
+        )
+        return [(chunk_id, distance if learned else None) for chunk_id, learned, distance in rows]
+
+    def count(self) -> int:
+        """标签记录数量（不含语义检索结果）"""
+        return self._get_connection().execute("SELECT COUNT(*) FROM topics WHERE learned = 0").fetchone()[0]
+
+    def clear(self):
+        """清空索引"""
+        with self._get_connection() as conn:
+            conn.execute("DELETE FROM topics")
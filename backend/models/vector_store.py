@@ -0,0 +1,947 @@
+"""向量存储模块（知识库检索后端）"""
+import json
+import os
+from abc import ABC, abstractmethod
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple, Optional
+import numpy as np
+from backend.config import settings
+
+try:
+    import hnswlib
+except ImportError:  # 可选依赖，未安装时只使用暴力检索
+    hnswlib = None
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只有进程内加锁
+    fcntl = None
+
+# SQLite 单条语句的参数数量有限，批量查询时分段
+_QUERY_CHUNK = 500
+
+# 暴力检索时每次转换为 float32 计算的行数，避免把整个矩阵复制一份
+_BLOCK_ROWS = 4096
+
+# 已删除的槽位超过这个比例时压缩向量文件
+_COMPACT_DEAD_RATIO = 0.25
+
+
+class SearchHit(NamedTuple):
+    """一条检索结果"""
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+    distance: float  # 越小越相似
+
+
+class VectorStore(ABC):
+    """向量存储接口"""
+
+    @abstractmethod
+    def add(self, ids: List[str], texts: List[str], embeddings: List[List[float]],
+            metadatas: List[Dict[str, Any]]) -> None:
+        """
+        添加文档块（ID 已存在时覆盖）
+
+        Args:
+            ids: 文档块ID
+            texts: 文档块文本
+            embeddings: 文档块向量
+            metadatas: 文档块元数据
+        """
+
+    @abstractmethod
+    def query(self, embeddings: List[List[float]], k: int) -> List[List[SearchHit]]:
+        """
+        多个查询向量的最近邻检索
+
+        Args:
+            embeddings: 查询向量
+            k: 每个查询返回的结果数量
+
+        Returns:
+            每个查询的结果列表（按相似度从高到低）
+        """
+
+    @abstractmethod
+    def get_all(self, include_documents: bool = True) -> List[Dict[str, Any]]:
+        """
+        获取所有文档块
+
+        Returns:
+            {"id", "metadata", "content"} 字典列表
+        """
+
+    @abstractmethod
+    def get(self, ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        按 ID 获取文档块（不存在的 ID 跳过）
+
+        Returns:
+            {"id", "metadata", "content"} 字典列表，顺序与 ids 一致
+        """
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        """删除文档块"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """文档块数量"""
+
+    @abstractmethod
+    def dimension(self) -> Optional[int]:
+        """已存储向量的维度（为空时返回 None）"""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """清空所有数据（包括向量维度）"""
+
+    def drop(self) -> None:
+        """删除存储本身（集合或目录），之后不再使用这个对象"""
+        self.reset()
+
+    @contextmanager
+    def batch(self):
+        """把多次写入合并为一次（默认直接写入）"""
+        yield self
+
+
+class ChromaVectorStore(VectorStore):
+    """基于 ChromaDB 的向量存储"""
+
+    def __init__(self, db_path: str, collection_name: str):
+        """
+        初始化存储
+
+        Args:
+            db_path: ChromaDB 数据目录
+            collection_name: 集合名称
+        """
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(
+            path=db_path,
+            settings=ChromaSettings(anonymized_telemetry=False)
+        )
+        self.collection = self._get_collection()
+
+    def _get_collection(self):
+        """获取或创建集合"""
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"description": "金融经济知识库"}
+        )
+
+    def add(self, ids, texts, embeddings, metadatas):
+        if not ids:
+            return
+        # ChromaDB 不接受空的元数据字典
+        self.collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=[metadata or None for metadata in metadatas]
+        )
+
+    def query(self, embeddings, k):
+        count = self.collection.count()
+        if count == 0 or not embeddings:
+            return [[] for _ in embeddings]
+        results = self.collection.query(
+            query_embeddings=embeddings,
+            n_results=min(k, count),
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [SearchHit(id_, text, metadata or {}, float(distance))
+             for id_, text, metadata, distance in zip(ids, texts, metadatas, distances)]
+            for ids, texts, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"])
+        ]
+
+    def get_all(self, include_documents=True):
+        include = ["metadatas", "documents"] if include_documents else ["metadatas"]
+        results = self.collection.get(include=include)
+        documents = results.get("documents")
+        return [
+            {
+                "id": id_,
+                "metadata": metadata or {},
+                "content": documents[i] if documents else ""
+            }
+            for i, (id_, metadata) in enumerate(zip(results["ids"], results["metadatas"]))
+        ]
+
+    def get(self, ids):
+        if not ids:
+            return []
+        results = self.collection.get(ids=ids, include=["metadatas", "documents"])
+        by_id = {
+            id_: {"id": id_, "metadata": metadata or {}, "content": document}
+            for id_, metadata, document in zip(results["ids"], results["metadatas"], results["documents"])
+        }
+        return [by_id[id_] for id_ in ids if id_ in by_id]
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def count(self):
+        return self.collection.count()
+
+    def dimension(self):
+        results = self.collection.get(limit=1, include=["embeddings"])
+        embeddings = results.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            return None
+        return len(embeddings[0])
+
+    def reset(self):
+        try:
+            self.client.delete_collection(name=self.collection_name)
+        except Exception:
+            pass  # 集合不存在时忽略
+        self.collection = self._get_collection()
+
+    def drop(self):
+        try:
+            self.client.delete_collection(name=self.collection_name)
+        except Exception:
+            pass
+
+
+class LocalVectorStore(VectorStore):
+    """
+    进程内向量存储
+
+    向量归一化后按 float16 或 int8（每行一个缩放系数）写入定长行文件，通过内存映射
+    读取，行号即槽位。ID、文本和元数据保存在 SQLite 中，内存里只保留每个槽位一个
+    字节的存活标记，检索时才按槽位读取命中的几行。
+
+    小规模语料使用 NumPy 分块暴力计算内积取 top-k（精确结果）；文档块数量达到
+    hnsw_threshold 且安装了 hnswlib 时，首次检索在内存中构建 HNSW 索引。
+    距离为余弦距离（1 - 余弦相似度）。
+
+    多个进程可以打开同一个目录：写入通过目录下的文件锁串行化，每次写入递增
+    info 表中的版本号，其他进程在检索前发现版本号变化后重新加载存活标记和向量映射。
+
+    删除只清除存活标记，已删除的槽位超过 _COMPACT_DEAD_RATIO 时把存活的行按顺序写入
+    新的向量文件（vectors.<布局>.<精度>），在同一个事务中重新编号槽位并递增布局号，
+    再删除旧文件。检索结束时布局号变化（槽位已重新编号）则重新检索。
+    """
+
+    DTYPES = {"float16": np.float16, "int8": np.int8}
+
+    def __init__(self, path: str, dtype: str = "float16", hnsw_threshold: int = 0, read_only: bool = False):
+        """
+        初始化存储
+
+        Args:
+            path: 存储目录
+            dtype: 向量存储精度（float16 或 int8）
+            hnsw_threshold: 使用 HNSW 索引的最小文档块数量（0 表示不使用）
+            read_only: 以只读方式打开（用于已发布的快照，不会创建或修改任何文件）
+        """
+        if dtype not in self.DTYPES:
+            raise ValueError(f"不支持的向量存储精度: {dtype}（可选: {', '.join(self.DTYPES)}）")
+        self.path = path
+        self.dtype_name = dtype
+        self.dtype = self.DTYPES[dtype]
+        self.hnsw_threshold = hnsw_threshold
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._index = None
+        self._generation: Optional[int] = 0
+
+        if not read_only:
+            conn = self._get_connection()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS info (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rows (
+                    slot INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+
+        stored_dtype = self._get_info("dtype")
+        if stored_dtype is not None and stored_dtype != dtype:
+            raise ValueError(f"向量存储 {path} 使用 {stored_dtype} 精度，与配置的 {dtype} 不一致")
+        self._load()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            db_path = os.path.join(self.path, "rows.db")
+            # 每个线程只使用自己的连接，close 时由调用线程统一关闭
+            if self.read_only:
+                # 快照发布后不再修改，immutable 模式不加锁也不创建 -wal/-shm 文件
+                conn = sqlite3.connect(f"file:{db_path}?immutable=1", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(db_path, timeout=30.0, check_same_thread=False)
+            with self._connections_lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """
+        关闭所有线程的数据库连接并释放向量映射和 HNSW 索引
+
+        调用方需保证没有进行中的读写；之后再次使用时重新打开。
+        """
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+        with self._lock:
+            self._matrix, self._scales = None, None
+            self._index = None
+            self._generation = None
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"向量存储 {self.path} 是只读快照，不能写入")
+
+    def _get_info(self, key: str) -> Optional[str]:
+        row = self._get_connection().execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _paths(self, layout: int):
+        """某个布局的 (向量文件, 缩放系数文件)（布局 0 沿用原来的文件名）"""
+        suffix = f".{layout}" if layout else ""
+        return (os.path.join(self.path, f"vectors{suffix}.{self.dtype_name}"),
+                os.path.join(self.path, f"scales{suffix}.float32"))
+
+    def _load(self):
+        """从磁盘加载存活标记并映射向量文件"""
+        conn = self._get_connection()
+        while True:
+            # 在同一个读事务中读取，槽位、版本号与布局（向量文件）一致
+            own_transaction = not conn.in_transaction
+            if own_transaction:
+                conn.execute("BEGIN")
+            try:
+                self._generation = int(self._get_info("generation") or 0)
+                self._layout = int(self._get_info("layout") or 0)
+                dim = self._get_info("dim")
+                slots = np.array([row[0] for row in conn.execute("SELECT slot FROM rows")], dtype=np.int64)
+            finally:
+                if own_transaction:
+                    conn.commit()
+            self._dim: Optional[int] = int(dim) if dim is not None else None
+            self.vectors_path, self.scales_path = self._paths(self._layout)
+            self._next_slot = int(slots.max()) + 1 if len(slots) else 0
+            self._alive = np.zeros(self._next_slot, dtype=bool)
+            self._alive[slots] = True
+            self._alive_count = len(slots)
+            self._index = None
+            try:
+                self._map()
+                return
+            except FileNotFoundError:
+                # 读取之后其他进程完成了压缩并删除了这个布局的文件，重新读取
+                if self.read_only:
+                    raise
+
+    def _refresh(self):
+        """其他进程写入或关闭后重新加载（调用方持有 self._lock；只读快照不会变化）"""
+        if self._generation is None:
+            self._load()
+        elif not self.read_only and int(self._get_info("generation") or 0) != self._generation:
+            self._load()
+
+    def _bump_generation(self, conn: sqlite3.Connection):
+        """在写入事务中递增版本号，通知其他进程重新加载"""
+        self._generation += 1
+        conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('generation', ?)", (str(self._generation),))
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        写锁：跨进程的文件锁 + 进程内的锁（同一线程可重入）
+
+        获取后先加载其他进程已经提交的写入，保证新写入的槽位不与之冲突。
+        """
+        depth = getattr(self._local, "write_depth", 0)
+        lock_file = None
+        if depth == 0 and fcntl is not None:
+            # 先在锁外等待文件锁，其他进程写入期间本进程的检索不受影响
+            lock_file = open(os.path.join(self.path, "writer.lock"), "a")
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        self._local.write_depth = depth + 1
+        try:
+            with self._lock:
+                if depth == 0:
+                    self._refresh()
+                yield
+        finally:
+            self._local.write_depth = depth
+            if lock_file is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _map(self):
+        """重新映射向量文件（写入后调用）"""
+        if self._dim is None or self._next_slot == 0:
+            self._matrix, self._scales = None, None
+            return
+        self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(self._next_slot, self._dim))
+        self._scales = None
+        if self.dtype_name == "int8":
+            self._scales = np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(self._next_slot,))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2 归一化（零向量保持不变）"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _encode(self, vectors: np.ndarray):
+        """量化为存储格式，返回 (矩阵, 每行缩放系数或 None)"""
+        if self.dtype_name == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+
+    @staticmethod
+    def _decode(matrix: np.ndarray, scales: Optional[np.ndarray], start: int, end: int) -> np.ndarray:
+        """把一段行还原为 float32"""
+        block = np.asarray(matrix[start:end], dtype=np.float32)
+        if scales is not None:
+            block *= scales[start:end, None]
+        return block
+
+    @staticmethod
+    def _write_at(path: str, data: bytes, offset: int):
+        """在指定偏移处写入（文件不存在时创建）"""
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            f.seek(offset)
+            f.write(data)
+
+    def _slots_of(self, ids: List[str]) -> List[int]:
+        """查询 ID 对应的槽位"""
+        conn = self._get_connection()
+        slots = []
+        for start in range(0, len(ids), _QUERY_CHUNK):
+            part = ids[start:start + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(part))
+            slots.extend(row[0] for row in conn.execute(
+                f"SELECT slot FROM rows WHERE id IN ({placeholders})", part))
+        return slots
+
+    def add(self, ids, texts, embeddings, metadatas):
+        if not ids:
+            return
+        self._check_writable()
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._write_lock():
+            conn = self._get_connection()
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('dim', ?)", (str(self._dim),))
+                    conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('dtype', ?)", (self.dtype_name,))
+            if vectors.shape[1] != self._dim:
+                raise ValueError(f"向量维度不匹配: 期望 {self._dim}，实际 {vectors.shape[1]}")
+
+            # ID 已存在时先删除旧的槽位
+            self.delete(ids)
+
+            first = self._next_slot
+            encoded, scales = self._encode(vectors)
+            # 先写向量再写索引，保证索引引用的槽位都是完整的
+            self._write_at(self.vectors_path, encoded.tobytes(), first * self._dim * encoded.itemsize)
+            if scales is not None:
+                self._write_at(self.scales_path, scales.tobytes(), first * 4)
+            with conn:
+                conn.executemany(
+                    "INSERT INTO rows (slot, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(first + i, id_, text, json.dumps(metadata or {}, ensure_ascii=False))
+                     for i, (id_, text, metadata) in enumerate(zip(ids, texts, metadatas))]
+                )
+                self._bump_generation(conn)
+
+            self._next_slot = first + len(ids)
+            alive = np.zeros(self._next_slot, dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            alive[first:] = True
+            self._alive = alive
+            self._alive_count += len(ids)
+            self._map()
+
+            if self._index is not None:
+                if self._index.get_max_elements() < self._next_slot:
+                    self._index.resize_index(max(self._next_slot, self._index.get_max_elements() * 2))
+                self._index.add_items(self._decode(self._matrix, self._scales, first, self._next_slot),
+                                      np.arange(first, self._next_slot))
+
+    def _use_hnsw(self) -> bool:
+        return hnswlib is not None and self.hnsw_threshold > 0 and self._alive_count >= self.hnsw_threshold
+
+    def _get_index(self):
+        """构建 HNSW 索引（首次使用时，按块读取向量）"""
+        if self._index is None:
+            index = hnswlib.Index(space="ip", dim=self._dim)
+            index.init_index(max_elements=max(self._next_slot, 1), ef_construction=200, M=16)
+            for start in range(0, self._next_slot, _BLOCK_ROWS):
+                end = min(start + _BLOCK_ROWS, self._next_slot)
+                labels = np.arange(start, end)
+                live = self._alive[start:end]
+                if live.any():
+                    index.add_items(self._decode(self._matrix, self._scales, start, end)[live], labels[live])
+            self._index = index
+        return self._index
+
+    def _brute_force(self, queries: np.ndarray, k: int, matrix: np.ndarray,
+                     scales: Optional[np.ndarray], alive: np.ndarray):
+        """精确检索，返回 (槽位矩阵, 相似度矩阵)，形状均为 (查询数, k)"""
+        rows = len(alive)
+        scores = np.empty((len(queries), rows), dtype=np.float32)
+        for start in range(0, rows, _BLOCK_ROWS):
+            end = min(start + _BLOCK_ROWS, rows)
+            scores[:, start:end] = queries @ self._decode(matrix, scales, start, end).T
+        scores[:, ~alive] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def query(self, embeddings, k):
+        if not embeddings:
+            return []
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        while True:
+            layout, results = self._query(queries, k)
+            # 检索期间被压缩时槽位已重新编号，读到的行可能对不上，重新检索
+            if self.read_only or int(self._get_info("layout") or 0) == layout:
+                return results
+
+    def _query(self, queries: np.ndarray, k: int):
+        """检索一次，返回 (检索时的布局号, 结果)"""
+        with self._lock:
+            self._refresh()
+            layout = self._layout
+            if self._alive_count == 0 or k <= 0:
+                return layout, [[] for _ in queries]
+            k = min(k, self._alive_count)
+            snapshot = None
+            if self._use_hnsw():
+                index = self._get_index()
+                index.set_ef(max(64, k * 2))
+                try:
+                    slots, distances = index.knn_query(queries, k=k)
+                    scores = 1.0 - distances
+                except RuntimeError:
+                    # 大量删除后 HNSW 可能凑不满 k 个结果，退回精确检索
+                    snapshot = (self._matrix, self._scales, self._alive.copy())
+            else:
+                # 写入时会替换矩阵对象而不是原地扩展，取出引用后即可在锁外计算
+                snapshot = (self._matrix, self._scales, self._alive.copy())
+        if snapshot is not None:
+            slots, scores = self._brute_force(queries, k, *snapshot)
+
+        # 只读取命中的行
+        wanted = sorted({int(slot) for slot in slots.ravel()})
+        rows = {}
+        conn = self._get_connection()
+        for start in range(0, len(wanted), _QUERY_CHUNK):
+            part = wanted[start:start + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(part))
+            for slot, id_, text, metadata in conn.execute(
+                    f"SELECT slot, id, text, metadata FROM rows WHERE slot IN ({placeholders})", part):
+                rows[slot] = (id_, text, json.loads(metadata))
+
+        results = []
+        for query_slots, query_scores in zip(slots, scores):
+            hits = []
+            for slot, score in zip(query_slots, query_scores):
+                row = rows.get(int(slot))
+                if row is not None:  # 检索后被并发删除的行直接跳过
+                    hits.append(SearchHit(row[0], row[1], row[2], max(0.0, float(1.0 - score))))
+            results.append(hits)
+        return layout, results
+
+    def get_all(self, include_documents=True):
+        column = "text" if include_documents else "''"
+        return [
+            {"id": id_, "metadata": json.loads(metadata), "content": text}
+            for id_, text, metadata in self._get_connection().execute(
+                f"SELECT id, {column}, metadata FROM rows ORDER BY slot")
+        ]
+
+    def get(self, ids):
+        conn = self._get_connection()
+        by_id = {}
+        for start in range(0, len(ids), _QUERY_CHUNK):
+            part = ids[start:start + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(part))
+            for id_, text, metadata in conn.execute(
+                    f"SELECT id, text, metadata FROM rows WHERE id IN ({placeholders})", part):
+                by_id[id_] = {"id": id_, "metadata": json.loads(metadata), "content": text}
+        return [by_id[id_] for id_ in ids if id_ in by_id]
+
+    def delete(self, ids):
+        if not ids:
+            return
+        self._check_writable()
+        with self._write_lock():
+            slots = self._slots_of(ids)
+            if not slots:
+                return
+            conn = self._get_connection()
+            with conn:
+                for start in range(0, len(slots), _QUERY_CHUNK):
+                    part = slots[start:start + _QUERY_CHUNK]
+                    placeholders = ",".join("?" * len(part))
+                    conn.execute(f"DELETE FROM rows WHERE slot IN ({placeholders})", part)
+                self._bump_generation(conn)
+            self._alive[slots] = False
+            self._alive_count -= len(slots)
+            if self._index is not None:
+                for slot in slots:
+                    self._index.mark_deleted(slot)
+            if self._next_slot - self._alive_count > self._next_slot * _COMPACT_DEAD_RATIO:
+                self._compact()
+
+    def _compact(self):
+        """
+        回收已删除的槽位（调用方持有写锁）
+
+        存活的行按原顺序写入新布局的文件，数据库中的槽位在同一个事务中重新编号，
+        提交后才删除旧文件：中途退出时只留下没有引用的新文件。
+        """
+        live = np.flatnonzero(self._alive)
+        layout = self._layout + 1
+        vectors_path, scales_path = self._paths(layout)
+        with open(vectors_path, "wb") as f:
+            for start in range(0, len(live), _BLOCK_ROWS):
+                f.write(np.ascontiguousarray(self._matrix[live[start:start + _BLOCK_ROWS]]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        if self._scales is not None:
+            with open(scales_path, "wb") as f:
+                f.write(np.ascontiguousarray(self._scales[live]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        conn = self._get_connection()
+        with conn:
+            # 新槽位不大于旧槽位，按升序移动不会与尚未移动的行冲突
+            conn.executemany("UPDATE rows SET slot = ? WHERE slot = ?",
+                             [(new, int(old)) for new, old in enumerate(live) if new != old])
+            conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('layout', ?)", (str(layout),))
+            self._bump_generation(conn)
+
+        old_paths = (self.vectors_path, self.scales_path)
+        self._load()
+        # 其他进程已映射的旧文件在取消映射前仍然有效
+        for path in old_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return self._alive_count
+
+    def dimension(self):
+        with self._lock:
+            self._refresh()
+            return self._dim
+
+    def reset(self):
+        self._check_writable()
+        with self._write_lock():
+            conn = self._get_connection()
+            with conn:
+                conn.execute("DELETE FROM rows")
+                conn.execute("DELETE FROM info")
+                self._bump_generation(conn)
+            # 清除所有布局的向量文件（包括压缩中途退出留下的）
+            for name in os.listdir(self.path):
+                if name.startswith(("vectors.", "scales.")):
+                    os.remove(os.path.join(self.path, name))
+            self._load()
+
+    def drop(self):
+        self._check_writable()
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class SnapshotVectorStore(VectorStore):
+    """
+    多进程共享的只读快照存储
+
+    每个版本是一个不可变的 LocalVectorStore 目录（snapshots/v00000001 等），
+    CURRENT 文件指向当前版本。所有 worker 以只读方式内存映射当前版本，
+    向量矩阵在操作系统页缓存中只有一份。
+
+    写入时先获取跨进程的文件锁（同一时刻只有一个写入者），把当前版本复制为新版本、
+    在新版本上执行修改，然后原子替换 CURRENT 发布。读取方每隔 check_interval 秒
+    检查一次 CURRENT，发现新版本后重新映射，本进程中的旧版本在进行中的读取结束后
+    关闭（释放数据库连接和内存映射）。旧版本保留 keep 个，正在使用旧版本的
+    进程不受删除影响（文件在取消映射前仍然有效）。
+    """
+
+    def __init__(self, root: str, dtype: str = "float16", hnsw_threshold: int = 0,
+                 check_interval: float = 1.0, keep: int = 3):
+        """
+        初始化存储
+
+        Args:
+            root: 存储根目录
+            dtype: 向量存储精度（float16 或 int8）
+            hnsw_threshold: 使用 HNSW 索引的最小文档块数量（0 表示不使用）
+            check_interval: 检查新版本的最小间隔（秒）
+            keep: 保留的历史版本数量（包括当前版本）
+        """
+        self.root = root
+        self.dtype_name = dtype
+        self.hnsw_threshold = hnsw_threshold
+        self.check_interval = check_interval
+        self.keep = max(keep, 1)
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self.current_path = os.path.join(root, "CURRENT")
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+        self._reader: Optional[LocalVectorStore] = None
+        self._version: Optional[str] = None
+        # 正在使用的只读存储及使用者数量（替换后最后一个使用者负责关闭）
+        self._users: Dict[LocalVectorStore, int] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def version(self) -> Optional[str]:
+        """当前映射的版本"""
+        return self._version
+
+    def _read_current(self) -> Optional[str]:
+        try:
+            with open(self.current_path, encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _get_reader(self) -> Optional[LocalVectorStore]:
+        """当前版本的只读存储（按间隔检查是否有新版本）"""
+        now = time.monotonic()
+        if self._reader is not None and now - self._checked_at < self.check_interval:
+            return self._reader
+        with self._lock:
+            self._checked_at = now
+            version = self._read_current()
+            if version != self._version:
+                old = self._reader
+                self._reader = None if version is None else LocalVectorStore(
+                    os.path.join(self.snapshots_dir, version),
+                    dtype=self.dtype_name,
+                    hnsw_threshold=self.hnsw_threshold,
+                    read_only=True
+                )
+                self._version = version
+                self._retire(old)
+        return self._reader
+
+    def _retire(self, reader: Optional[LocalVectorStore]):
+        """关闭被替换的只读存储，仍在使用时由最后一个使用者关闭（调用方持有 self._lock）"""
+        if reader is not None and reader not in self._users:
+            reader.close()
+
+    @contextmanager
+    def _use_target(self):
+        """读取对象：批量写入中的线程读自己的新版本，其他情况读当前版本（使用期间不会被关闭）"""
+        writer = getattr(self._local, "writer", None)
+        if writer is not None:
+            yield writer
+            return
+        self._get_reader()
+        with self._lock:
+            reader = self._reader
+            if reader is not None:
+                self._users[reader] = self._users.get(reader, 0) + 1
+        try:
+            yield reader
+        finally:
+            if reader is not None:
+                with self._lock:
+                    self._users[reader] -= 1
+                    if self._users[reader] == 0:
+                        del self._users[reader]
+                        if reader is not self._reader:
+                            self._retire(reader)
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程写锁"""
+        with self._write_lock, open(os.path.join(self.root, "writer.lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _next_version(self) -> str:
+        versions = [int(name[1:]) for name in os.listdir(self.snapshots_dir)
+                    if name.startswith("v") and name[1:].isdigit()]
+        return f"v{max(versions, default=0) + 1:08d}"
+
+    def _copy_version(self, source: Optional[str], target: str):
+        """以当前版本为基础创建新版本目录"""
+        target_dir = os.path.join(self.snapshots_dir, target)
+        os.makedirs(target_dir)
+        if source is None:
+            return
+        source_dir = os.path.join(self.snapshots_dir, source)
+        for name in os.listdir(source_dir):
+            if name not in ("rows.db", "writer.lock"):
+                shutil.copyfile(os.path.join(source_dir, name), os.path.join(target_dir, name))
+        src = sqlite3.connect(f"file:{os.path.join(source_dir, 'rows.db')}?immutable=1", uri=True)
+        dst = sqlite3.connect(os.path.join(target_dir, "rows.db"))
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+
+    def _publish(self, version: str):
+        """原子替换 CURRENT 并清理旧版本"""
+        tmp_path = f"{self.current_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.current_path)
+
+        versions = sorted(name for name in os.listdir(self.snapshots_dir) if name.startswith("v"))
+        for old in versions[:-self.keep]:
+            shutil.rmtree(os.path.join(self.snapshots_dir, old), ignore_errors=True)
+
+        # 本进程立即切换到新版本
+        self._checked_at = 0.0
+        self._get_reader()
+
+    @contextmanager
+    def batch(self):
+        """在同一个新版本中完成多次写入，结束时发布一次"""
+        if getattr(self._local, "writer", None) is not None:
+            yield self  # 已在批量写入中
+            return
+        with self._file_lock():
+            base = self._read_current()
+            version = self._next_version()
+            self._copy_version(base, version)
+            writer = LocalVectorStore(os.path.join(self.snapshots_dir, version), dtype=self.dtype_name)
+            self._local.writer = writer
+            try:
+                yield self
+            except BaseException:
+                writer.close()
+                shutil.rmtree(os.path.join(self.snapshots_dir, version), ignore_errors=True)
+                raise
+            finally:
+                self._local.writer = None
+            # 发布前切回 DELETE 日志模式，读取方才能以 immutable 方式打开
+            writer._get_connection().execute("PRAGMA journal_mode=DELETE")
+            writer.close()
+            self._publish(version)
+
+    def add(self, ids, texts, embeddings, metadatas):
+        if ids:
+            with self.batch():
+                self._local.writer.add(ids, texts, embeddings, metadatas)
+
+    def delete(self, ids):
+        if ids:
+            with self.batch():
+                self._local.writer.delete(ids)
+
+    def reset(self):
+        with self.batch():
+            self._local.writer.reset()
+
+    def drop(self):
+        # 其他进程已映射的版本在取消映射前仍然有效
+        with self._file_lock(), self._lock:
+            old, self._reader, self._version = self._reader, None, None
+            self._retire(old)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def query(self, embeddings, k):
+        with self._use_target() as target:
+            return target.query(embeddings, k) if target is not None else [[] for _ in embeddings]
+
+    def get_all(self, include_documents=True):
+        with self._use_target() as target:
+            return target.get_all(include_documents) if target is not None else []
+
+    def get(self, ids):
+        with self._use_target() as target:
+            return target.get(ids) if target is not None else []
+
+    def count(self):
+        with self._use_target() as target:
+            return target.count() if target is not None else 0
+
+    def dimension(self):
+        with self._use_target() as target:
+            return target.dimension() if target is not None else None
+
+
+def create_vector_store(collection_name: Optional[str] = None) -> VectorStore:
+    """
+    根据配置创建向量存储
+
+    Args:
+        collection_name: 集合名称（None 使用配置的默认集合）
+    """
+    collection_name = collection_name or settings.chroma_collection_name
+    if settings.vector_store_backend == "chroma":
+        return ChromaVectorStore(settings.chroma_db_path, collection_name)
+    if settings.vector_store_backend == "local":
+        return LocalVectorStore(
+            os.path.join(settings.local_vector_store_path, collection_name),
+            dtype=settings.local_vector_dtype,
+            hnsw_threshold=settings.vector_hnsw_threshold
+        )
+    if settings.vector_store_backend == "snapshot":
+        return SnapshotVectorStore(
+            os.path.join(settings.local_vector_store_path, collection_name),
+            dtype=settings.local_vector_dtype,
+            hnsw_threshold=settings.vector_hnsw_threshold,
+            check_interval=settings.vector_snapshot_check_interval,
+            keep=settings.vector_snapshot_keep
+        )
+    raise ValueError(f"不支持的向量存储后端: {settings.vector_store_backend}")
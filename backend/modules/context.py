@@ -0,0 +1,147 @@
+"""按 token 预算组装提示词上下文"""
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+from backend.config import settings
+from backend.utils.tokens import count_tokens, truncate_tokens
+
+# 每条消息的格式开销（角色标记、分隔符）
+MESSAGE_OVERHEAD = 4
+# 检索片段之间的分隔符（"\n\n"）
+KNOWLEDGE_SEPARATOR = "\n\n"
+SEPARATOR_TOKENS = 1
+
+
+class AssembledContext(NamedTuple):
+    """组装结果"""
+    inputs: Dict[str, Any]  # 可直接传给提示词模板的变量
+    tokens: int  # 提示词 token 数（估计值）
+    knowledge_used: int  # 保留的检索片段数（含被截断的一条）
+    history_used: int  # 保留的历史消息数
+
+
+def count_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    """计算消息列表的 token 数"""
+    return sum(count_tokens(str(message.content)) + MESSAGE_OVERHEAD for message in messages)
+
+
+def _fill(texts: Sequence[str], available: int, overhead: int, min_tokens: int) -> Tuple[List[str], int]:
+    """
+    按顺序放入文本，直到预算用完
+
+    放不下的第一条在剩余预算不少于 min_tokens 时截断后放入，之后的全部丢弃。
+
+    Returns:
+        (保留的文本, 使用的 token 数)
+    """
+    kept: List[str] = []
+    used = 0
+    for text in texts:
+        cost = count_tokens(text) + overhead
+        if used + cost <= available:
+            kept.append(text)
+            used += cost
+            continue
+        room = available - used - overhead
+        if room >= min_tokens:
+            text = truncate_tokens(text, room)
+            kept.append(text)
+            used += count_tokens(text) + overhead
+        break
+    return kept, used
+
+
+def _split_history(history: Sequence[BaseMessage]) -> Tuple[List[BaseMessage], List[BaseMessage], List[BaseMessage]]:
+    """拆分对话历史：(之前对话的摘要, 更早的消息, 最新一轮对话（最后一条用户消息及之后的回复）)"""
+    summaries = [message for message in history if isinstance(message, SystemMessage)]
+    dialog = [message for message in history if not isinstance(message, SystemMessage)]
+    start = max((i for i, message in enumerate(dialog) if isinstance(message, HumanMessage)),
+                default=max(len(dialog) - 1, 0))
+    return summaries, dialog[:start], dialog[start:]
+
+
+def _fill_history(history: Sequence[BaseMessage], available: int,
+                  min_tokens: int) -> Tuple[List[BaseMessage], int]:
+    """
+    放入对话历史：先放最新一轮对话和之前对话的摘要，再从新到旧放更早的消息
+
+    Returns:
+        (按原顺序保留的消息（摘要在前）, 使用的 token 数)
+    """
+    summaries, earlier, latest = _split_history(history)
+
+    recent, used = _fill([str(message.content) for message in reversed(latest)], available,
+                         MESSAGE_OVERHEAD, min_tokens)
+    older, older_used = _fill([str(message.content) for message in summaries], available - used,
+                              MESSAGE_OVERHEAD, min_tokens)
+    used += older_used
+    if len(recent) == len(latest):
+        # 最新一轮完整放入后才接着放更早的消息，保留的消息总是连续的
+        more, more_used = _fill([str(message.content) for message in reversed(earlier)], available - used,
+                                MESSAGE_OVERHEAD, min_tokens)
+        recent += more
+        used += more_used
+
+    def rebuild(messages: Sequence[BaseMessage], contents: List[str]) -> List[BaseMessage]:
+        return [
+            message if content == message.content else message.model_copy(update={"content": content})
+            for message, content in zip(messages, contents)
+        ]
+
+    kept_dialog = rebuild(list(reversed(latest)) + list(reversed(earlier)), recent)
+    kept_dialog.reverse()
+    return rebuild(summaries, older) + kept_dialog, used
+
+
+def assemble_context(prompt, inputs: Dict[str, Any], knowledge: Optional[Sequence[str]] = None,
+                     history: Optional[Sequence[BaseMessage]] = None, knowledge_key: str = "knowledge",
+                     history_key: str = "chat_history", budget: Optional[int] = None) -> AssembledContext:
+    """
+    在 token 预算内组装提示词变量
+
+    优先级：系统提示词和用户输入（inputs，总是保留）> 最新一轮对话和之前对话的摘要
+    （至多占 PROMPT_HISTORY_RESERVE_RATIO 的预算）> 检索片段（按相关度顺序）>
+    更早的对话消息（从新到旧）。放不下的内容从低优先级开始丢弃，边界上的一条按 token
+    截断，相同输入总是得到相同的提示词（响应缓存仍能命中）。
+
+    Args:
+        prompt: 提示词模板
+        inputs: 其他模板变量
+        knowledge: 检索片段（按相关度从高到低），None 表示模板没有该变量
+        history: 对话历史（get_prompt_history 的返回值），None 表示模板没有该变量
+        knowledge_key: 检索片段对应的模板变量
+        history_key: 对话历史对应的模板变量
+        budget: token 预算（默认 PROMPT_TOKEN_BUDGET，0 表示不限制）
+
+    Returns:
+        组装结果
+    """
+    budget = settings.prompt_token_budget if budget is None else budget
+    chunks = [text for text in (knowledge or []) if text]
+    messages = list(history or [])
+
+    def build(kept_chunks: List[str], kept_messages: List[BaseMessage]) -> Dict[str, Any]:
+        result = dict(inputs)
+        if knowledge is not None:
+            result[knowledge_key] = KNOWLEDGE_SEPARATOR.join(kept_chunks)
+        if history is not None:
+            result[history_key] = kept_messages
+        return result
+
+    if budget <= 0:
+        full = build(chunks, messages)
+        return AssembledContext(full, count_message_tokens(prompt.format_messages(**full)),
+                                len(chunks), len(messages))
+
+    fixed = count_message_tokens(prompt.format_messages(**build([], [])))
+    available = max(0, budget - fixed)
+    min_tokens = settings.prompt_min_truncated_tokens
+
+    # 为最新一轮对话和摘要预留预算，检索片段不能把对话历史全部挤掉
+    summaries, _, latest = _split_history(messages)
+    reserve = min(count_message_tokens(summaries + latest), int(available * settings.prompt_history_reserve_ratio))
+
+    kept_chunks, used = _fill(chunks, available - reserve, SEPARATOR_TOKENS, min_tokens)
+    kept_messages, history_used = _fill_history(messages, available - used, min_tokens)
+
+    return AssembledContext(build(kept_chunks, kept_messages), fixed + used + history_used,
+                            len(kept_chunks), len(kept_messages))
@@ -1,9 +1,173 @@
 """记忆管理模块"""
-from typing import List, Dict, Optional
+import queue
+import threading
+from typing import List, Optional, Sequence
 from langchain.memory import ConversationBufferMemory
-from langchain.schema import BaseMessage
+from langchain.prompts import ChatPromptTemplate
+from langchain.schema import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.chat_history import BaseChatMessageHistory
+from backend.config import settings
 from backend.models.database import learning_progress_db
+from backend.models.conversation_store import ConversationStore, create_conversation_store
 from backend.models.schemas import UserProgress
+from backend.utils.lazy import LazySingleton
+from backend.utils.locks import StripedLock
+
+# 学习上下文中最多列出的已学知识点数量
+_LEARNED_TOPICS_SHOWN = 10
+
+
+class StoreBackedChatHistory(BaseChatMessageHistory):
+    """基于对话存储的聊天历史（只保留最近 N 条消息用于构建提示词）"""
+    
+    def __init__(self, store: ConversationStore, memory_key: str, limit: int):
+        """
+        初始化聊天历史
+        
+        Args:
+            store: 对话存储
+            memory_key: 对话键
+            limit: 读取的最近消息条数
+        """
+        self.store = store
+        self.memory_key = memory_key
+        self.limit = limit
+    
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """读取最近的消息"""
+        records = self.store.read_recent(self.memory_key, self.limit)
+        return [
+            HumanMessage(content=record.content) if record.role == "human" else AIMessage(content=record.content)
+            for record in records
+        ]
+    
+    def add_message(self, message: BaseMessage) -> None:
+        """追加一条消息"""
+        role = "human" if isinstance(message, HumanMessage) else "ai"
+        self.store.append(self.memory_key, role, message.content)
+    
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """追加多条消息"""
+        for message in messages:
+            self.add_message(message)
+    
+    def clear(self) -> None:
+        """清空对话"""
+        self.store.clear(self.memory_key)
+
+
+class ConversationSummarizer:
+    """
+    对话增量摘要器
+    
+    在后台线程中把滑出窗口的旧消息合并进滚动摘要，不占用请求处理路径。
+    """
+    
+    def __init__(self, store: ConversationStore, window: int, trigger: int):
+        """
+        初始化摘要器
+        
+        Args:
+            store: 对话存储
+            window: 保留原文的最近消息条数
+            trigger: 窗口之外累计多少条未摘要消息后触发一次摘要
+        """
+        self.store = store
+        self.window = window
+        self.trigger = trigger
+        self._llm = None
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        
+        self.prompt_template = ChatPromptTemplate.from_messages([
+            ("system", """你负责维护一段师生对话的摘要。请把新的对话内容合并进已有摘要，输出更新后的完整摘要。
+
+要求：
+1. 保留学生正在学习的主题、提出过的问题、答题情况和仍然存在的疑惑
+2. 删除寒暄和重复内容
+3. 不超过 300 字
+
+已有摘要：
+{summary}"""),
+            ("human", "新的对话内容：\n{messages}")
+        ])
+    
+    def _get_llm(self):
+        """延迟创建摘要模型"""
+        if self._llm is None:
+            from langchain_openai import ChatOpenAI
+            
+            llm_kwargs = {
+                "model": settings.conversation_summary_model,
+                "temperature": 0.0,
+                "openai_api_key": settings.openai_api_key
+            }
+            if settings.openai_base_url:
+                llm_kwargs["base_url"] = settings.openai_base_url
+            self._llm = ChatOpenAI(**llm_kwargs)
+        return self._llm
+    
+    def schedule(self, memory_key: str):
+        """
+        提交摘要任务（同一对话的重复任务会被合并）
+        
+        Args:
+            memory_key: 对话键
+        """
+        with self._pending_lock:
+            if memory_key in self._pending:
+                return
+            self._pending.add(memory_key)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="conversation-summarizer", daemon=True)
+                self._worker.start()
+        self._queue.put(memory_key)
+    
+    def _run(self):
+        """后台线程主循环"""
+        while True:
+            memory_key = self._queue.get()
+            with self._pending_lock:
+                self._pending.discard(memory_key)
+            try:
+                self.summarize(memory_key)
+            except Exception as e:
+                print(f"生成对话摘要时出错: {e}")
+    
+    def summarize(self, memory_key: str) -> bool:
+        """
+        将窗口之外、尚未摘要的消息合并进摘要
+        
+        Args:
+            memory_key: 对话键
+            
+        Returns:
+            是否更新了摘要
+        """
+        window = self.store.read_recent(memory_key, self.window)
+        if not window:
+            return False
+        
+        current = self.store.get_summary(memory_key)
+        upto_id = current.upto_id if current else 0
+        
+        # 只折叠滑出窗口的消息，窗口内的消息保留原文
+        older = self.store.read_range(memory_key, after_id=upto_id, before_id=window[0].id, limit=self.trigger * 5)
+        if len(older) < self.trigger:
+            return False
+        
+        lines = [f"{'学生' if m.role == 'human' else '导师'}: {m.content}" for m in older]
+        chain = self.prompt_template | self._get_llm()
+        response = chain.invoke({
+            "summary": current.summary if current else "（暂无）",
+            "messages": "\n".join(lines)
+        })
+        
+        self.store.save_summary(memory_key, response.content.strip(), older[-1].id)
+        return True
 
 
 class MemoryManager:
@@ -11,8 +175,23 @@ class MemoryManager:
     
     def __init__(self):
         """初始化记忆管理器"""
-        # 存储每个用户的对话记忆
-        self.conversation_memories: Dict[str, ConversationBufferMemory] = {}
+        # 对话消息持久化在共享存储中，多个 worker 进程可以服务同一个用户
+        self.conversation_store = create_conversation_store()
+        # 同一对话的并发请求在进程内按对话键串行化；进程之间由 append_many 的单个事务保证一轮问答不被拆开
+        self._conversation_locks = StripedLock()
+        
+        self.summarizer: Optional[ConversationSummarizer] = None
+        if settings.conversation_summary_enabled and settings.openai_api_key:
+            self.summarizer = ConversationSummarizer(
+                self.conversation_store,
+                window=settings.conversation_history_limit,
+                trigger=settings.conversation_summary_trigger
+            )
+    
+    @staticmethod
+    def _memory_key(user_id: str, conversation_id: Optional[str]) -> str:
+        """生成对话键"""
+        return f"{user_id}_{conversation_id or 'default'}"
     
     def get_conversation_memory(self, user_id: str, conversation_id: Optional[str] = None) -> ConversationBufferMemory:
         """
@@ -25,15 +204,75 @@ class MemoryManager:
         Returns:
             对话记忆对象
         """
-        memory_key = f"{user_id}_{conversation_id or 'default'}"
+        memory_key = self._memory_key(user_id, conversation_id)
+        
+        # 记忆对象只是对存储的轻量包装，按需创建，不常驻内存
+        chat_history = StoreBackedChatHistory(
+            self.conversation_store,
+            memory_key,
+            limit=settings.conversation_history_limit
+        )
+        return ConversationBufferMemory(
+            chat_memory=chat_history,
+            return_messages=True,
+            memory_key="chat_history"
+        )
+    
+    def get_prompt_history(self, user_id: str, conversation_id: Optional[str] = None) -> List[BaseMessage]:
+        """
+        获取用于构建提示词的对话历史：滚动摘要 + 尚未被摘要的最近消息
         
-        if memory_key not in self.conversation_memories:
-            self.conversation_memories[memory_key] = ConversationBufferMemory(
-                return_messages=True,
-                memory_key="chat_history"
+        提示词大小与对话总长度无关。
+        
+        Args:
+            user_id: 用户ID
+            conversation_id: 对话ID（可选）
+            
+        Returns:
+            消息列表
+        """
+        memory_key = self._memory_key(user_id, conversation_id)
+        
+        if self.summarizer is None:
+            records = self.conversation_store.read_recent(memory_key, settings.conversation_history_limit)
+            summary = None
+        else:
+            # 摘要在后台生成，可能略微落后；窗口外尚未折叠的消息也一并带上
+            summary = self.conversation_store.get_summary(memory_key)
+            records = self.conversation_store.read_recent(
+                memory_key,
+                settings.conversation_history_limit + settings.conversation_summary_trigger
             )
+            if summary:
+                records = [record for record in records if record.id > summary.upto_id]
+        
+        messages: List[BaseMessage] = []
+        if summary:
+            messages.append(SystemMessage(content=f"之前对话的摘要：\n{summary.summary}"))
+        for record in records:
+            if record.role == "human":
+                messages.append(HumanMessage(content=record.content))
+            else:
+                messages.append(AIMessage(content=record.content))
+        return messages
+    
+    def save_turn(self, user_id: str, conversation_id: Optional[str], user_message: str, ai_message: str):
+        """
+        保存一轮对话，并在后台触发增量摘要
+        
+        Args:
+            user_id: 用户ID
+            conversation_id: 对话ID（可选）
+            user_message: 用户消息
+            ai_message: AI 回复
+        """
+        memory_key = self._memory_key(user_id, conversation_id)
+        # 一轮问答作为整体写入，避免并发请求的消息交错
+        with self._conversation_locks.lock(memory_key):
+            self.conversation_store.append_many(memory_key, [("human", user_message), ("ai", ai_message)])
         
-        return self.conversation_memories[memory_key]
+        if self.summarizer is not None:
+            self.summarizer.schedule(memory_key)
     
     def get_user_progress(self, user_id: str) -> UserProgress:
         """
@@ -98,7 +337,12 @@ class MemoryManager:
         context += f"- 当前学习主题: {progress.current_topic or '未设置'}\n"
         
         if progress.mastery_level:
-            context += f"- 已学习知识点: {', '.join(progress.mastery_level.keys())}\n"
+            # 知识点列表随学习不断变长，只列出最近的几个，控制系统提示词大小
+            learned = list(progress.mastery_level.keys())
+            shown = ", ".join(learned[-_LEARNED_TOPICS_SHOWN:])
+            if len(learned) > _LEARNED_TOPICS_SHOWN:
+                shown += f" 等 {len(learned)} 个"
+            context += f"- 已学习知识点: {shown}\n"
             context += f"- 掌握程度: {', '.join([f'{k}({v:.1f}%)' for k, v in list(progress.mastery_level.items())[:5]])}\n"
         
         if progress.mastered_topics:
@@ -111,5 +355,5 @@ class MemoryManager:
 
 
 # 全局记忆管理器实例
-memory_manager = MemoryManager()
+memory_manager = LazySingleton(MemoryManager, "memory_manager")
 
@@ -1,9 +1,10 @@
 """意图识别模块（Planner/Router）"""
 from typing import Dict
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
 from backend.config import settings
 from backend.models.schemas import IntentResponse
+from backend.modules.prompts import INTENT_PROMPT
+from backend.utils.lazy import LazySingleton
+from backend.utils.llm_cache import llm_response_cache
 
 
 class IntentPlanner:
@@ -11,6 +12,8 @@ class IntentPlanner:
     
     def __init__(self):
         """初始化意图识别器"""
+        from langchain_openai import ChatOpenAI
+        
         # 优先使用意图识别模型的独立配置，如果没有则使用 OpenAI 配置
         api_key = settings.intent_model_api_key or settings.openai_api_key
         model_name = settings.intent_model_name
@@ -33,23 +36,9 @@ class IntentPlanner:
         # 使用配置的模型进行意图识别
         self.llm = ChatOpenAI(**llm_kwargs)
         
-        self.prompt_template = ChatPromptTemplate.from_messages([
-            ("system", """你是一个意图识别助手。根据用户的输入，判断用户的意图。
-
-可能的意图类型：
-1. learn - 用户想学习新知识（如："什么是GDP？"、"给我讲讲货币政策"）
-2. review - 用户想复习已学内容（如："帮我复习一下"、"我之前学的什么？"）
-3. answer - 用户正在回答问题（如："答案是A"、"我认为是..."）
-4. chat - 闲聊或其他（如："你好"、"今天天气怎么样？"、"最近国际经济形势怎么样？"）
-
-请只返回JSON格式：
-{{
-    "intent": "learn|review|answer|chat",
-    "confidence": 0.0-1.0,
-    "topic": "相关主题（如果有）"
-}}"""),
-            ("human", "{user_input}")
-        ])
+        self.prompt_template = INTENT_PROMPT
+        # 预编译意图识别链，所有请求复用（相同输入可命中响应缓存）
+        self.chain = llm_response_cache.wrap("intent", self.prompt_template, self.llm)
     
     def identify_intent(self, user_input: str, user_progress: Dict = None) -> IntentResponse:
         """
@@ -67,10 +56,8 @@ class IntentPlanner:
         if user_progress:
             context += f"\n当前学习主题: {user_progress.get('current_topic', '无')}"
         
-        chain = self.prompt_template | self.llm
-        
         try:
-            response = chain.invoke({"user_input": context})
+            response = self.chain.invoke({"user_input": context})
             content = response.content.strip()
             
             # 解析 JSON 响应
@@ -101,5 +88,5 @@ class IntentPlanner:
 
 
 # 全局意图识别器实例
-intent_planner = IntentPlanner()
+intent_planner = LazySingleton(IntentPlanner, "intent_planner")
 
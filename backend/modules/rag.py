@@ -1,40 +1,206 @@
 """RAG 知识库模块"""
 import os
+import re
 import json
-from typing import List, Optional, Dict
+import glob
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional, Dict, NamedTuple
 from pathlib import Path
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-# from langchain_community.vectorstores import Chroma
-from langchain_chroma import Chroma
 from backend.config import settings
-from backend.utils.embeddings import embedding_manager
+from backend.models.topic_index import TopicIndex
+from backend.models.vector_store import SearchHit, VectorStore, create_vector_store
+from backend.utils.embeddings import (
+    EmbeddingManager, current_model_config, get_embedding_manager,
+    model_id_of, release_embedding_manager
+)
 from backend.utils.document_loader import DocumentLoader
+from backend.utils.keywords import extract_keywords
+from backend.utils.lazy import LazySingleton
+from backend.utils.locks import SingleFlight
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只有进程内互斥
+    fcntl = None
+
+# 检查其他进程是否已切换索引的最小间隔（秒）
+_STATE_CHECK_INTERVAL = 1.0
+
+# 切换前追赶迁移期间新写入的轮数（之后暂停写入完成最后一轮）
+_CATCH_UP_ROUNDS = 3
+
+# 相同的并发检索（同一集合、同样的查询和 k）只嵌入和检索一次
+_retrieval_flight = SingleFlight("retrieval", enabled=settings.single_flight_enabled)
+
+# 课程命名空间名称（会成为集合名称的一部分，ChromaDB 集合名称只允许 ASCII 且不超过 63 个字符）
+_NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,19}$")
+
+
+def normalize_namespace(namespace: Optional[str]) -> str:
+    """
+    校验课程命名空间名称
+
+    Args:
+        namespace: 命名空间（为空时使用默认命名空间）
+
+    Returns:
+        命名空间名称
+    """
+    if not namespace:
+        return settings.default_namespace
+    if not _NAMESPACE_PATTERN.match(namespace):
+        raise ValueError(f"无效的课程命名空间: {namespace}（只能包含字母、数字、下划线和连字符，最长 20 个字符）")
+    return namespace
+
+
+def collection_name_for(namespace: str) -> str:
+    """命名空间对应的集合基础名称（默认命名空间沿用原有集合）"""
+    if namespace == settings.default_namespace:
+        return settings.chroma_collection_name
+    return f"{settings.chroma_collection_name}__{namespace}"
+
+
+def merge_hits(per_query: List[List[SearchHit]]) -> List[SearchHit]:
+    """
+    合并多条查询（或多个命名空间）的检索结果并去重
+    
+    按名次轮流取各查询的结果（先取每条查询的第一名，再取第二名……），
+    每条查询最相关的文档块都排在前面，不会被其他查询的结果挤掉。
+    只比较名次不比较距离，不同嵌入模型（距离尺度不同）的结果也能合并。
+    
+    Args:
+        per_query: 每条查询的结果（按距离升序）
+        
+    Returns:
+        去重后的结果
+    """
+    merged, seen = [], set()
+    for rank in range(max((len(hits) for hits in per_query), default=0)):
+        for hits in per_query:
+            if rank < len(hits) and hits[rank].text not in seen:
+                seen.add(hits[rank].text)
+                merged.append(hits[rank])
+    return merged
+
+
+def _state_dir() -> str:
+    """知识库状态文件所在目录"""
+    if settings.vector_store_backend == "chroma":
+        return settings.chroma_db_path
+    return settings.local_vector_store_path
+
+
+class ActiveIndex(NamedTuple):
+    """正在提供检索的向量集合"""
+    collection: str
+    model: Dict[str, str]  # 生成这些向量的嵌入模型配置
+    store: VectorStore
 
 
 class RAGKnowledgeBase:
-    """RAG 知识库"""
+    """
+    RAG 知识库（一个课程命名空间）
     
-    def __init__(self):
-        """初始化知识库"""
-        # 创建 ChromaDB 客户端
-        self.client = chromadb.PersistentClient(
-            path=settings.chroma_db_path,
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
-        
-        # 获取或创建集合
-        self.collection = self.client.get_or_create_collection(
-            name=settings.chroma_collection_name,
-            metadata={"description": "金融经济知识库"}
-        )
-        
-        # 创建 LangChain Chroma 向量存储
-        self.vectorstore = Chroma(
-            client=self.client,
-            collection_name=settings.chroma_collection_name,
-            embedding_function=embedding_manager.embeddings
-        )
+    每个嵌入模型的向量保存在各自带版本号的集合中，当前提供检索的集合及其模型
+    记录在状态文件里。配置的嵌入模型变化后，迁移任务在后台用新模型把全部文档块
+    嵌入到新集合（限速，不影响在线请求），期间旧模型和旧集合继续提供检索；
+    完成后原子替换状态文件切换，其他进程在下一次检查时跟随切换。
+    """
+    
+    def __init__(self, namespace: Optional[str] = None):
+        """
+        初始化知识库
+        
+        Args:
+            namespace: 课程命名空间（None 使用默认命名空间）
+        """
+        self.namespace = normalize_namespace(namespace)
+        self.base_name = collection_name_for(self.namespace)
+        state_dir = _state_dir()
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_path = os.path.join(state_dir, f"{self.base_name}.active.json")
+        self.migration_lock_path = os.path.join(state_dir, f"{self.base_name}.migrate.lock")
+        
+        self._active: Optional[ActiveIndex] = None
+        self._state_mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._state_lock = threading.RLock()
+        # 写入（上传、删除、重新索引）与迁移的最后一轮同步互斥
+        self._write_lock = threading.RLock()
+        self._migration_thread: Optional[threading.Thread] = None
+        self.migration: Dict = {"state": "idle"}
+        
+        # 知识点倒排索引（按文档块 ID 记录，迁移嵌入模型时 ID 不变，索引继续有效）
+        self.topic_index: Optional[TopicIndex] = None
+        if settings.topic_index_enabled:
+            self.topic_index = TopicIndex(os.path.join(state_dir, f"{self.base_name}.topics.db"))
+        
+        state = self._read_state()
+        if state is None:
+            # 第一次运行：沿用原有（不带版本号）的集合，记为当前配置的模型生成
+            state = {"collection": self.base_name, "model": current_model_config()}
+            self._write_state(state)
+        self._apply_state(state)
+        
+        if settings.embedding_migration_auto and self.needs_migration():
+            self.start_migration()
+    
+    def _read_state(self) -> Optional[Dict]:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def _write_state(self, state: Dict):
+        """原子替换状态文件"""
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+    
+    def _apply_state(self, state: Dict):
+        """切换到状态文件记录的集合"""
+        with self._state_lock:
+            self._state_mtime = os.stat(self.state_path).st_mtime_ns
+            old = self._active
+            if old is not None and old.collection == state["collection"]:
+                return
+            self._active = ActiveIndex(state["collection"], state["model"], create_vector_store(state["collection"]))
+        if old is not None and model_id_of(old.model) != model_id_of(state["model"]):
+            release_embedding_manager(model_id_of(old.model))
+            print(f"知识库已切换到集合 {state['collection']}（嵌入模型 {model_id_of(state['model'])}）")
+    
+    def _get_active(self) -> ActiveIndex:
+        """当前集合（按间隔检查其他进程是否已切换）"""
+        now = time.monotonic()
+        if now - self._checked_at >= _STATE_CHECK_INTERVAL:
+            self._checked_at = now
+            try:
+                changed = os.stat(self.state_path).st_mtime_ns != self._state_mtime
+            except FileNotFoundError:
+                changed = False
+            if changed:
+                state = self._read_state()
+                if state is not None:
+                    self._apply_state(state)
+        return self._active
+    
+    @property
+    def store(self) -> VectorStore:
+        """当前集合的向量存储"""
+        return self._get_active().store
+    
+    @property
+    def embedder(self) -> EmbeddingManager:
+        """当前集合对应的嵌入模型"""
+        return get_embedding_manager(self._get_active().model)
     
     def add_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None):
         """
@@ -46,8 +212,16 @@ class RAGKnowledgeBase:
         """
         if metadatas is None:
             metadatas = [{}] * len(texts)
-        
-        self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
+        if not texts:
+            return
+        
+        with self._write_lock:
+            active = self._get_active()
+            embeddings = get_embedding_manager(active.model).embed_documents(texts)
+            ids = [str(uuid.uuid4()) for _ in texts]
+            active.store.add(ids, texts, embeddings, metadatas)
+            if self.topic_index is not None:
+                self.topic_index.add(ids, [extract_keywords(text, settings.topic_keywords_per_chunk) for text in texts])
     
     def add_document_from_file(self, file_path: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None):
         """
@@ -76,6 +250,31 @@ class RAGKnowledgeBase:
         
         return len(chunks)
     
+    def _query(self, queries: List[str], k: int) -> List[List[SearchHit]]:
+        """
+        嵌入查询并检索（查询向量必须由生成当前集合的模型计算）
+        
+        Args:
+            queries: 查询文本列表
+            k: 每条查询返回的结果数量
+            
+        Returns:
+            每条查询的结果
+        """
+        active = self._get_active()
+        
+        def run() -> List[List[SearchHit]]:
+            embedder = get_embedding_manager(active.model)
+            if len(queries) == 1:
+                embeddings = [embedder.embed_query(queries[0])]
+            else:
+                embeddings = embedder.embed_queries(queries)
+            return active.store.query(embeddings, k)
+        
+        key = json.dumps([active.collection, k, queries], ensure_ascii=False)
+        # 结果可能与其他请求共享，复制外层列表后再交给调用方
+        return [list(hits) for hits in _retrieval_flight.do(key, run)]
+    
     def search(self, query: str, k: int = 5, user_progress: Optional[dict] = None) -> List[str]:
         """
         在知识库中搜索相关内容
@@ -92,10 +291,10 @@ class RAGKnowledgeBase:
         # 例如：如果用户是初学者，优先检索基础内容
         
         # 执行相似度搜索
-        results = self.vectorstore.similarity_search(query, k=k)
+        hits = self._query([query], k)[0]
         
         # 提取文本内容
-        texts = [doc.page_content for doc in results]
+        texts = [hit.text for hit in hits]
         
         return texts
     
@@ -108,17 +307,145 @@ class RAGKnowledgeBase:
             k: 返回结果数量
             
         Returns:
-            (文档内容, 相似度分数) 元组列表
+            (文档内容, 距离) 元组列表，距离越小越相似
+        """
+        hits = self._query([query], k)[0]
+        return [(hit.text, hit.distance) for hit in hits]
+    
+    def search_many_hits(self, queries: List[str], k: int = 3) -> List[List[SearchHit]]:
+        """
+        一次检索多条查询（批量嵌入 + 一次多查询向量检索）
+        
+        Args:
+            queries: 查询文本列表
+            k: 每条查询返回的结果数量
+            
+        Returns:
+            每条查询的结果
+        """
+        if not queries:
+            return []
+        return self._query(queries, k)
+    
+    def search_many(self, queries: List[str], k: int = 3) -> List[str]:
+        """
+        一次检索多条查询，合并去重
+        
+        Args:
+            queries: 查询文本列表（例如多个复习知识点）
+            k: 每条查询返回的结果数量
+            
+        Returns:
+            相关文档片段列表（见 merge_hits）
+        """
+        return [hit.text for hit in merge_hits(self.search_many_hits(queries, k))]
+    
+    def lookup_topics(self, topics: List[str], k: int = 3) -> List[List[SearchHit]]:
+        """
+        按知识点查倒排索引（不经过嵌入模型）
+        
+        Args:
+            topics: 知识点名称列表
+            k: 每个知识点返回的结果数量
+            
+        Returns:
+            每个知识点的结果（没有命中的知识点为空列表）。标签命中在前，distance 为 0；
+            之后是记录的语义检索结果，distance 为检索时的距离
+        """
+        if self.topic_index is None:
+            return [[] for _ in topics]
+        rows_per_topic = [self.topic_index.lookup(topic, k) for topic in topics]
+        wanted = list(dict.fromkeys(id_ for rows in rows_per_topic for id_, _ in rows))
+        docs = {doc["id"]: doc for doc in self.store.get(wanted)} if wanted else {}
+        return [
+            [SearchHit(id_, docs[id_]["content"], docs[id_]["metadata"], 0.0 if distance is None else distance)
+             for id_, distance in rows if id_ in docs]
+            for rows in rows_per_topic
+        ]
+    
+    def search_topics(self, topics: List[str], k: int = 3, fallback_queries: Optional[List[str]] = None,
+                      remember: bool = True) -> List[List[SearchHit]]:
+        """
+        按知识点检索：先查倒排索引，命中不足 k 个的知识点一次批量语义检索补足
+        
+        标签命中和记录的语义检索结果排在前面，新的语义检索结果去重后补足剩余的名额。
+        
+        Args:
+            topics: 知识点名称列表
+            k: 每个知识点返回的结果数量
+            fallback_queries: 语义检索使用的查询（与 topics 对应，默认为知识点名称本身）
+            remember: 是否把语义检索的结果记入索引（查询不是知识点名称本身时应关闭）
+            
+        Returns:
+            每个知识点的结果
+        """
+        per_topic = self.lookup_topics(topics, k)
+        # 记录的结果也可能不足 k 个（记录时文档块不够或之后被删除），同样补足
+        short = [i for i, hits in enumerate(per_topic) if len(hits) < k]
+        if short:
+            queries = [(fallback_queries or topics)[i] for i in short]
+            for i, hits in zip(short, self.search_many_hits(queries, k)):
+                seen = {hit.id for hit in per_topic[i]}
+                per_topic[i] += [hit for hit in hits if hit.id not in seen][:k - len(per_topic[i])]
+                if remember and self.topic_index is not None:
+                    self.topic_index.remember(topics[i], [(hit.id, hit.distance) for hit in hits])
+        return per_topic
+    
+    def rebuild_topic_index(self) -> int:
+        """
+        从已有文档块重建知识点索引
+        
+        Returns:
+            处理的文档块数量
         """
-        results = self.vectorstore.similarity_search_with_score(query, k=k)
-        return [(doc.page_content, score) for doc, score in results]
+        if self.topic_index is None:
+            return 0
+        with self._write_lock:
+            docs = self.store.get_all()
+            self.topic_index.clear()
+            for start in range(0, len(docs), 500):
+                part = docs[start:start + 500]
+                self.topic_index.add(
+                    [doc["id"] for doc in part],
+                    [extract_keywords(doc["content"], settings.topic_keywords_per_chunk) for doc in part]
+                )
+        return len(docs)
+    
+    def warm_up(self, queries: List[str]):
+        """
+        预热嵌入模型和向量索引
+        
+        第一次推理会触发计算内核初始化，第一次查询会把向量索引从磁盘载入内存，
+        在接收流量前执行可以避免第一个真实请求的延迟尖峰。
+        
+        Args:
+            queries: 有代表性的查询文本
+        """
+        if not queries:
+            return
+        active = self._get_active()
+        embedder = get_embedding_manager(active.model)
+        # 批量和单条两种输入形状都跑一遍
+        embedder.embed_documents(queries)
+        embeddings = [embedder.embed_query(query) for query in queries]
+        
+        if active.store.count() > 0:
+            active.store.query(embeddings, 1)
+            # 升级前入库的文档块还没有知识点标签
+            if self.topic_index is not None and self.topic_index.count() == 0:
+                print(f"为 {active.store.count()} 个文档块建立知识点索引")
+                self.rebuild_topic_index()
     
     def get_collection_info(self) -> dict:
         """获取知识库信息"""
-        count = self.collection.count()
+        active = self._get_active()
         return {
-            "collection_name": settings.chroma_collection_name,
-            "document_count": count
+            "namespace": self.namespace,
+            "collection_name": active.collection,
+            "vector_store_backend": settings.vector_store_backend,
+            "document_count": active.store.count(),
+            "embedding_model": model_id_of(active.model),
+            "migration": self.migration_status()
         }
     
     def get_all_documents(self) -> List[Dict]:
@@ -128,17 +455,7 @@ class RAGKnowledgeBase:
         Returns:
             文档元数据列表
         """
-        results = self.collection.get(include=["metadatas", "documents"])
-        
-        documents = []
-        for i, metadata in enumerate(results["metadatas"]):
-            documents.append({
-                "id": results["ids"][i],
-                "metadata": metadata,
-                "content": results["documents"][i] if results["documents"] else ""
-            })
-        
-        return documents
+        return self.store.get_all()
     
     def get_unique_sources(self) -> List[str]:
         """
@@ -147,12 +464,11 @@ class RAGKnowledgeBase:
         Returns:
             文档来源列表
         """
-        results = self.collection.get(include=["metadatas"])
         sources = set()
         
-        for metadata in results["metadatas"]:
-            if "source" in metadata:
-                sources.add(metadata["source"])
+        for doc in self.store.get_all(include_documents=False):
+            if "source" in doc["metadata"]:
+                sources.add(doc["metadata"]["source"])
         
         return list(sources)
     
@@ -163,116 +479,160 @@ class RAGKnowledgeBase:
         Args:
             source: 文档来源（文件名）
         """
-        results = self.collection.get(include=["metadatas"])
-        ids_to_delete = []
-        
-        for i, metadata in enumerate(results["metadatas"]):
-            if metadata.get("source") == source:
-                ids_to_delete.append(results["ids"][i])
-        
-        if ids_to_delete:
-            self.collection.delete(ids=ids_to_delete)
+        with self._write_lock:
+            store = self.store
+            ids_to_delete = [
+                doc["id"] for doc in store.get_all(include_documents=False)
+                if doc["metadata"].get("source") == source
+            ]
+            
+            if ids_to_delete:
+                store.delete(ids_to_delete)
+                if self.topic_index is not None:
+                    self.topic_index.remove(ids_to_delete)
         
         return len(ids_to_delete)
     
-    def _check_and_fix_embedding_dimension(self) -> bool:
+    def needs_migration(self) -> bool:
+        """当前集合是否由其他嵌入模型生成（配置的模型已经变化）"""
+        return model_id_of(self._get_active().model) != model_id_of(current_model_config())
+    
+    def migration_status(self) -> Dict:
+        """迁移状态（进度只在执行迁移的进程中可见）"""
+        status = dict(self.migration)
+        status["active_model"] = model_id_of(self._get_active().model)
+        status["configured_model"] = model_id_of(current_model_config())
+        return status
+    
+    def start_migration(self) -> Dict:
         """
-        检查当前嵌入模型的维度是否与集合的维度匹配
-        如果不匹配，删除旧集合并创建新集合
+        在后台线程中把知识库迁移到当前配置的嵌入模型
         
         Returns:
-            True 如果维度匹配或已修复，False 如果出错
+            迁移状态
         """
-        try:
-            # 获取当前嵌入模型的维度
-            current_dim = embedding_manager.get_embedding_dimension()
-            print(f"当前嵌入模型维度: {current_dim}")
-            
-            # 检查集合中是否有数据
-            collection_count = self.collection.count()
-            
-            if collection_count > 0:
-                # 如果集合中有数据，尝试添加一个测试文档来检查维度
-                # ChromaDB 在添加时会自动检查维度，如果维度不匹配会抛出异常
-                test_text = "dimension_test"
-                test_embedding = embedding_manager.embed_query(test_text)
-                
-                try:
-                    # 尝试添加测试项
-                    self.collection.add(
-                        ids=["__dimension_test__"],
-                        embeddings=[test_embedding],
-                        documents=[test_text],
-                        metadatas=[{"test": True}]
-                    )
-                    # 如果成功，删除测试项
-                    self.collection.delete(ids=["__dimension_test__"])
-                    print("嵌入维度匹配，无需重建集合")
-                    return True
-                except Exception as e:
-                    error_msg = str(e).lower()
-                    # 检查是否是维度不匹配错误
-                    if "dimension" in error_msg or "expecting" in error_msg:
-                        print(f"检测到嵌入维度不匹配: {error_msg}")
-                        print("正在删除旧集合并创建新集合...")
-                        
-                        # 删除旧集合
-                        try:
-                            self.client.delete_collection(name=settings.chroma_collection_name)
-                        except Exception as delete_error:
-                            print(f"删除旧集合时出错: {delete_error}")
-                        
-                        # 创建新集合
-                        self.collection = self.client.get_or_create_collection(
-                            name=settings.chroma_collection_name,
-                            metadata={"description": "金融经济知识库"}
-                        )
-                        
-                        # 重新创建 LangChain Chroma 向量存储
-                        self.vectorstore = Chroma(
-                            client=self.client,
-                            collection_name=settings.chroma_collection_name,
-                            embedding_function=embedding_manager.embeddings
-                        )
-                        
-                        print(f"已创建新集合，维度: {current_dim}")
-                        return True
-                    else:
-                        # 其他错误，记录并返回False
-                        print(f"检查维度时发生其他错误: {e}")
-                        return False
-            else:
-                # 集合为空，可以安全地重新创建以确保维度正确
-                print(f"集合为空，重新创建集合以确保维度正确（维度: {current_dim}）")
-                try:
-                    self.client.delete_collection(name=settings.chroma_collection_name)
-                except Exception:
-                    pass  # 如果集合不存在，忽略错误
-                
-                # 创建新集合
-                self.collection = self.client.get_or_create_collection(
-                    name=settings.chroma_collection_name,
-                    metadata={"description": "金融经济知识库"}
-                )
-                
-                # 重新创建 LangChain Chroma 向量存储
-                self.vectorstore = Chroma(
-                    client=self.client,
-                    collection_name=settings.chroma_collection_name,
-                    embedding_function=embedding_manager.embeddings
+        with self._state_lock:
+            running = self._migration_thread is not None and self._migration_thread.is_alive()
+            if not running and self.needs_migration():
+                self.migration = {"state": "starting"}
+                self._migration_thread = threading.Thread(
+                    target=self._run_migration, name="embedding-migration", daemon=True
                 )
-                
-                return True
-                
+                self._migration_thread.start()
+        return self.migration_status()
+    
+    def _versioned_name(self, model_config: Dict[str, str]) -> str:
+        """模型对应的集合名称"""
+        digest = hashlib.sha1(model_id_of(model_config).encode("utf-8")).hexdigest()[:10]
+        return f"{self.base_name}_{digest}"
+    
+    @contextmanager
+    def _migration_lock(self):
+        """跨进程迁移锁（多个 worker 只有一个执行迁移），返回是否获得"""
+        with open(self.migration_lock_path, "a") as f:
+            if fcntl is None:
+                yield True
+                return
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    
+    def _run_migration(self):
+        """迁移线程"""
+        target_model = current_model_config()
+        target_name = self._versioned_name(target_model)
+        self.migration = {
+            "state": "running",
+            "target_collection": target_name,
+            "total": 0,
+            "embedded": 0,
+            "started_at": time.time()
+        }
+        print(f"开始迁移知识库到嵌入模型 {model_id_of(target_model)}（集合 {target_name}）")
+        try:
+            with self._migration_lock() as acquired:
+                if not acquired:
+                    self.migration["state"] = "running_elsewhere"
+                    print("其他进程正在执行迁移，完成后自动切换")
+                    return
+                # 获得锁之前其他进程可能已经完成了同一次迁移
+                if self._get_active().collection != target_name:
+                    self._migrate(target_model, target_name)
+            self.migration.update(state="done", finished_at=time.time())
         except Exception as e:
-            print(f"检查嵌入维度时出错: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+            self.migration.update(state="failed", error=str(e), finished_at=time.time())
+            print(f"迁移嵌入模型时出错: {e}")
+    
+    def _migrate(self, target_model: Dict[str, str], target_name: str):
+        """嵌入全部文档块到新集合，追上期间的写入后切换"""
+        state = self._read_state() or {}
+        # 上一次切换前的集合已经没有进程在用，删除
+        previous = state.get("previous")
+        if previous and previous.get("collection") not in (None, target_name, state.get("collection")):
+            create_vector_store(previous["collection"]).drop()
+        
+        manager = get_embedding_manager(target_model)
+        target = create_vector_store(target_name)
+        with target.batch():
+            for _ in range(_CATCH_UP_ROUNDS):
+                if self._sync_collection(target, manager, throttle=True) == 0:
+                    break
+        
+        # 最后一轮暂停写入，保证切换时两个集合内容一致
+        with self._write_lock:
+            with target.batch():
+                self._sync_collection(target, manager, throttle=False)
+            state = self._read_state() or {}
+            new_state = {
+                "collection": target_name,
+                "model": target_model,
+                "previous": {"collection": state.get("collection"), "model": state.get("model")}
+            }
+            self._write_state(new_state)
+            self._apply_state(new_state)
+    
+    def _sync_collection(self, target: VectorStore, manager: EmbeddingManager, throttle: bool) -> int:
+        """
+        让目标集合与当前集合的文档块一致（沿用相同的 ID，中断后再次迁移只补齐缺少的部分）
+        
+        Returns:
+            本轮新增和删除的文档块数量
+        """
+        source_docs = self._get_active().store.get_all()
+        source_ids = {doc["id"] for doc in source_docs}
+        target_ids = {doc["id"] for doc in target.get_all(include_documents=False)}
+        
+        stale = list(target_ids - source_ids)
+        if stale:
+            target.delete(stale)
+        missing = [doc for doc in source_docs if doc["id"] not in target_ids]
+        self.migration["total"] = len(source_docs)
+        self.migration["embedded"] = len(source_docs) - len(missing)
+        
+        batch_size = max(settings.embedding_migration_batch_size, 1)
+        duty_cycle = settings.embedding_migration_duty_cycle
+        for start in range(0, len(missing), batch_size):
+            part = missing[start:start + batch_size]
+            began = time.perf_counter()
+            texts = [doc["content"] for doc in part]
+            target.add([doc["id"] for doc in part], texts, manager.embed_documents(texts),
+                       [doc["metadata"] for doc in part])
+            self.migration["embedded"] += len(part)
+            if throttle and 0 < duty_cycle < 1:
+                # 按占空比休眠：迁移最多占用 duty_cycle 比例的时间，其余留给在线请求
+                elapsed = time.perf_counter() - began
+                time.sleep(elapsed * (1 - duty_cycle) / duty_cycle)
+        return len(stale) + len(missing)
     
     def reindex_all_documents(self, chunk_size: int, chunk_overlap: int, upload_dir: str = "uploads") -> Dict:
         """
-        重新分片和索引所有文档
+        重新分片和索引所有文档（使用当前集合的嵌入模型；切换模型由后台迁移完成）
         
         Args:
             chunk_size: 新的文档分块大小
@@ -282,35 +642,12 @@ class RAGKnowledgeBase:
         Returns:
             重新索引结果统计
         """
-        # 在检查维度之前，先保存所有文档的元数据（以防维度不匹配导致集合被删除）
         try:
             all_docs = self.get_all_documents()
         except Exception as e:
             print(f"获取文档列表时出错: {e}")
             all_docs = []
         
-        # 检查并修复嵌入维度不匹配问题
-        # 注意：如果维度不匹配，集合会被删除并重建，所以需要重新获取文档列表
-        dimension_fixed = self._check_and_fix_embedding_dimension()
-        
-        # 如果维度被修复（集合被重建），文档列表会为空，使用之前保存的元数据
-        if dimension_fixed:
-            # 重新获取文档列表（如果集合被重建，这会返回空列表）
-            try:
-                current_docs = self.get_all_documents()
-                # 如果当前文档列表为空但之前有文档，使用之前保存的元数据
-                if len(current_docs) == 0 and len(all_docs) > 0:
-                    print("集合已重建，使用之前保存的文档元数据")
-                    # all_docs 已经包含了之前的元数据，继续使用
-                elif len(current_docs) > 0:
-                    # 如果集合没有被重建，使用当前的文档列表
-                    all_docs = current_docs
-            except Exception as e:
-                print(f"重新获取文档列表时出错: {e}")
-                # 如果出错，继续使用之前保存的 all_docs
-        else:
-            raise ValueError("无法检查或修复嵌入维度，请检查嵌入模型配置")
-        
         # 按来源分组
         sources_map = {}
         for doc in all_docs:
@@ -333,10 +670,26 @@ class RAGKnowledgeBase:
             "total_chunks_after": 0
         }
         
+        # 记录嵌入缓存计数，统计本次复用了多少向量
+        cache = self.embedder.cache
+        cache_before = cache.stats() if cache is not None else None
+        
         # 创建新的文档加载器
         loader = DocumentLoader(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         
-        # 对每个来源的文档进行重新索引
+        # 对每个来源的文档进行重新索引（快照存储只发布一个新版本）
+        with self._write_lock, self.store.batch():
+            self._reindex_sources(sources_map, loader, upload_dir, stats)
+        
+        if cache_before is not None:
+            cache_after = cache.stats()
+            stats["embeddings_reused"] = cache_after["hits"] - cache_before["hits"]
+            stats["embeddings_computed"] = cache_after["misses"] - cache_before["misses"]
+        
+        return stats
+    
+    def _reindex_sources(self, sources_map: Dict, loader: DocumentLoader, upload_dir: str, stats: Dict):
+        """逐个来源删除旧文档块并重新分片、索引"""
         for source, info in sources_map.items():
             try:
                 # 删除旧的文档块
@@ -370,10 +723,188 @@ class RAGKnowledgeBase:
             except Exception as e:
                 stats["failed_sources"].append(source)
                 print(f"重新索引 {source} 时出错: {e}")
+
+
+class KnowledgeBaseRouter:
+    """
+    课程命名空间路由
+    
+    每门课程的文档保存在各自的集合中，检索只扫描用户选修课程的集合，
+    上传、删除和重新索引也只影响一门课程。
+    """
+    
+    def __init__(self):
+        """初始化路由"""
+        self._bases: Dict[str, RAGKnowledgeBase] = {}
+        self._lock = threading.Lock()
+    
+    def exists(self, namespace: Optional[str]) -> bool:
+        """命名空间是否已创建（可能由其他进程创建）"""
+        namespace = normalize_namespace(namespace)
+        if namespace == settings.default_namespace or namespace in self._bases:
+            return True
+        return os.path.exists(os.path.join(_state_dir(), f"{collection_name_for(namespace)}.active.json"))
+    
+    def for_namespace(self, namespace: Optional[str] = None, create: bool = True) -> RAGKnowledgeBase:
+        """
+        获取命名空间的知识库
         
-        return stats
+        Args:
+            namespace: 课程命名空间（None 使用默认命名空间）
+            create: 不存在时是否创建（否则抛出 ValueError）
+        """
+        namespace = normalize_namespace(namespace)
+        base = self._bases.get(namespace)
+        if base is None:
+            if not create and not self.exists(namespace):
+                raise ValueError(f"课程命名空间不存在: {namespace}")
+            with self._lock:
+                base = self._bases.get(namespace)
+                if base is None:
+                    base = RAGKnowledgeBase(namespace)
+                    self._bases[namespace] = base
+        return base
+    
+    def namespaces(self) -> List[str]:
+        """所有命名空间（包括其他进程创建的）"""
+        prefix = f"{settings.chroma_collection_name}__"
+        found = {settings.default_namespace, *self._bases}
+        for path in glob.glob(os.path.join(_state_dir(), f"{glob.escape(prefix)}*.active.json")):
+            name = os.path.basename(path)[len(prefix):-len(".active.json")]
+            if _NAMESPACE_PATTERN.match(name):
+                found.add(name)
+        return sorted(found)
+    
+    def search(self, query: str, k: int = 5, namespaces: Optional[List[str]] = None,
+               user_progress: Optional[dict] = None) -> List[str]:
+        """
+        在一个或多个命名空间中搜索
+        
+        Args:
+            query: 查询文本
+            k: 返回结果数量
+            namespaces: 要检索的命名空间（为空时只检索默认命名空间）
+            user_progress: 用户学习进度（用于个性化检索）
+            
+        Returns:
+            相关文档片段列表（多个命名空间的结果按名次轮流合并，见 merge_hits）
+        """
+        namespaces = self._existing(namespaces)
+        if not namespaces:
+            return []
+        if len(namespaces) == 1:
+            return self.for_namespace(namespaces[0]).search(query, k=k, user_progress=user_progress)
+        
+        per_namespace = [self.for_namespace(namespace).search_many_hits([query], k)[0] for namespace in namespaces]
+        return [hit.text for hit in merge_hits(per_namespace)[:k]]
+    
+    def search_many(self, queries: List[str], k: int = 3, namespaces: Optional[List[str]] = None) -> List[str]:
+        """
+        在一个或多个命名空间中一次检索多条查询
+        
+        Args:
+            queries: 查询文本列表
+            k: 每条查询返回的结果数量
+            namespaces: 要检索的命名空间（为空时只检索默认命名空间）
+            
+        Returns:
+            合并去重后的文档片段列表（见 merge_hits）
+        """
+        namespaces = self._existing(namespaces)
+        if not namespaces or not queries:
+            return []
+        if len(namespaces) == 1:
+            return self.for_namespace(namespaces[0]).search_many(queries, k=k)
+        
+        per_namespace = [self.for_namespace(namespace).search_many_hits(queries, k) for namespace in namespaces]
+        return [hit.text for hit in merge_hits(self._merge_namespaces(per_namespace, k))]
+    
+    def search_topics(self, topics: List[str], k: int = 3, namespaces: Optional[List[str]] = None,
+                      fallback_queries: Optional[List[str]] = None, remember: bool = True) -> List[str]:
+        """
+        在一个或多个命名空间中按知识点检索（见 RAGKnowledgeBase.search_topics）
+        
+        Args:
+            topics: 知识点名称列表
+            k: 每个知识点返回的结果数量
+            namespaces: 要检索的命名空间（为空时只检索默认命名空间）
+            fallback_queries: 标签命中不足时使用的语义检索查询
+            remember: 是否把语义检索的结果记入索引
+            
+        Returns:
+            合并去重后的文档片段列表（见 merge_hits）
+        """
+        namespaces = self._existing(namespaces)
+        if not namespaces or not topics:
+            return []
+        
+        per_namespace = [
+            self.for_namespace(namespace).search_topics(topics, k, fallback_queries, remember)
+            for namespace in namespaces
+        ]
+        return [hit.text for hit in merge_hits(self._merge_namespaces(per_namespace, k))]
+    
+    @staticmethod
+    def _merge_namespaces(per_namespace: List[List[List[SearchHit]]], k: int) -> List[List[SearchHit]]:
+        """
+        按查询合并各命名空间的结果
+        
+        迁移期间各命名空间可能由不同的嵌入模型服务，距离不可比较，
+        按名次轮流合并（见 merge_hits），每条查询保留前 k 个。
+        
+        Args:
+            per_namespace: 每个命名空间中每条查询的结果
+            k: 每条查询保留的结果数量
+            
+        Returns:
+            每条查询的结果
+        """
+        return [merge_hits(list(per_query))[:k] for per_query in zip(*per_namespace)]
+    
+    def _existing(self, namespaces: Optional[List[str]]) -> List[str]:
+        """规范化命名空间列表，跳过还没有上传过文档（没有集合）的课程"""
+        namespaces = list(dict.fromkeys(normalize_namespace(ns) for ns in namespaces or [None]))
+        return [ns for ns in namespaces if self.exists(ns)]
+    
+    def warm_up(self, queries: List[str]):
+        """预热所有命名空间"""
+        for namespace in self.namespaces():
+            self.for_namespace(namespace).warm_up(queries)
+    
+    def reindex(self, chunk_size: int, chunk_overlap: int, upload_dir: str = "uploads",
+                namespace: Optional[str] = None) -> Dict:
+        """
+        重新索引一个或所有命名空间
+        
+        Args:
+            chunk_size: 新的文档分块大小
+            chunk_overlap: 新的分块重叠大小
+            upload_dir: 上传文件目录
+            namespace: 只处理这个命名空间（None 处理所有命名空间）
+            
+        Returns:
+            合计的重新索引统计（namespaces 字段为各命名空间的统计）
+        """
+        namespaces = [normalize_namespace(namespace)] if namespace else self.namespaces()
+        total: Dict = {"namespaces": {}}
+        for name in namespaces:
+            stats = self.for_namespace(name, create=False).reindex_all_documents(chunk_size, chunk_overlap, upload_dir)
+            total["namespaces"][name] = stats
+            for key, value in stats.items():
+                if isinstance(value, list):
+                    total.setdefault(key, []).extend(f"{name}/{item}" for item in value)
+                else:
+                    total[key] = total.get(key, 0) + value
+        return total
+    
+    def get_namespaces_info(self) -> List[dict]:
+        """所有命名空间的集合信息"""
+        return [self.for_namespace(namespace).get_collection_info() for namespace in self.namespaces()]
+
 
+# 全局知识库路由
+knowledge_bases = LazySingleton(KnowledgeBaseRouter, "knowledge_bases")
 
-# 全局知识库实例
-rag_knowledge_base = RAGKnowledgeBase()
+# 默认命名空间的知识库
+rag_knowledge_base = LazySingleton(lambda: knowledge_bases.for_namespace(), "rag_knowledge_base")
 
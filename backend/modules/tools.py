@@ -1,8 +1,17 @@
 """工具模块"""
-import httpx
-from typing import List, Dict, Optional
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, NamedTuple, Optional
+from pydantic import ValidationError
 from langchain.tools import Tool
 from backend.config import settings
+from backend.models.schemas import ChartSpec
+from backend.utils.cache import TTLCache
+from backend.utils.http_client import post_json, apost_json
+from backend.utils.locks import SingleFlight
+from backend.utils.charts import chart_renderer
 
 
 class WebSearchTool:
@@ -11,7 +20,38 @@ class WebSearchTool:
     def __init__(self):
         """初始化搜索工具"""
         self.api_key = settings.tavily_api_key
-        self.base_url = "https://api.tavily.com/search"
+        self.base_url = settings.tavily_base_url
+        # 相同查询在短时间内的结果基本一致，缓存以避免重复请求
+        self.cache = TTLCache(max_entries=settings.search_cache_size, ttl=settings.search_cache_ttl)
+        # 缓存未命中时，相同查询的并发请求只向 Tavily 发一次
+        self.flight = SingleFlight("web_search", enabled=settings.single_flight_enabled)
+    
+    @staticmethod
+    def _cache_key(query: str, max_results: int) -> str:
+        """规范化查询作为缓存键（忽略大小写和多余空白）"""
+        return f"{max_results}:{' '.join(query.lower().split())}"
+    
+    def _build_payload(self, query: str, max_results: int) -> Dict:
+        """构建 Tavily 请求体"""
+        return {
+            "api_key": self.api_key,
+            "query": query,
+            "max_results": max_results,
+            "search_depth": "basic"
+        }
+    
+    @staticmethod
+    def _parse_results(data: Dict) -> List[Dict]:
+        """解析 Tavily 响应"""
+        results = []
+        for result in data.get("results", []):
+            results.append({
+                "title": result.get("title", ""),
+                "url": result.get("url", ""),
+                "content": result.get("content", ""),
+                "score": result.get("score", 0.0)
+            })
+        return results
     
     def search(self, query: str, max_results: int = 5) -> List[Dict]:
         """
@@ -27,34 +67,53 @@ class WebSearchTool:
         if not self.api_key:
             return [{"error": "Tavily API key 未配置"}]
         
+        cache_key = self._cache_key(query, max_results)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        def fetch() -> List[Dict]:
+            response = post_json(self.base_url, self._build_payload(query, max_results))
+            results = self._parse_results(response.json())
+            self.cache.set(cache_key, results)
+            return results
+        
         try:
-            response = httpx.post(
-                self.base_url,
-                json={
-                    "api_key": self.api_key,
-                    "query": query,
-                    "max_results": max_results,
-                    "search_depth": "basic"
-                },
-                timeout=10.0
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            for result in data.get("results", []):
-                results.append({
-                    "title": result.get("title", ""),
-                    "url": result.get("url", ""),
-                    "content": result.get("content", ""),
-                    "score": result.get("score", 0.0)
-                })
-            
+            return self.flight.do(cache_key, fetch)
+        except Exception as e:
+            print(f"搜索错误: {e}")
+            return [{"error": f"搜索失败: {str(e)}"}]
+    
+    async def asearch(self, query: str, max_results: int = 5) -> List[Dict]:
+        """search 的异步版本"""
+        if not self.api_key:
+            return [{"error": "Tavily API key 未配置"}]
+        
+        cache_key = self._cache_key(query, max_results)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        async def fetch() -> List[Dict]:
+            response = await apost_json(self.base_url, self._build_payload(query, max_results))
+            results = self._parse_results(response.json())
+            self.cache.set(cache_key, results)
             return results
+        
+        try:
+            return await self.flight.ado(cache_key, fetch)
         except Exception as e:
             print(f"搜索错误: {e}")
             return [{"error": f"搜索失败: {str(e)}"}]
     
+    def run(self, query: str) -> str:
+        """搜索并返回格式化后的结果（供 Agent 工具调用）"""
+        return self.format_results(self.search(query))
+    
+    async def arun(self, query: str) -> str:
+        """run 的异步版本"""
+        return self.format_results(await self.asearch(query))
+    
     def format_results(self, results: List[Dict]) -> str:
         """格式化搜索结果"""
         if not results or "error" in results[0]:
@@ -70,22 +129,45 @@ class WebSearchTool:
 
 
 class DrawingTool:
-    """绘图工具（示例：可以扩展为调用图表生成 API）"""
+    """绘图工具（渲染 SVG 图表）"""
     
-    def generate_chart(self, chart_type: str, data: Dict) -> str:
+    def generate_chart(self, spec: ChartSpec) -> str:
         """
-        生成图表描述（实际实现可以调用图表生成服务）
+        生成图表
         
         Args:
-            chart_type: 图表类型（line, bar, pie 等）
-            data: 图表数据
+            spec: 图表描述
             
         Returns:
-            图表描述或 URL
+            图表 URL 说明
         """
-        # 这里是一个示例实现
-        # 实际可以集成 matplotlib、plotly 等库或调用图表生成 API
-        return f"已生成 {chart_type} 图表，数据: {data}"
+        url, _ = chart_renderer.render(spec)
+        return f"已生成 {spec.chart_type} 图表: {url}"
+    
+    def run(self, args: str) -> str:
+        """解析 Agent 传入的 JSON 参数并生成图表（供 Agent 工具调用）"""
+        try:
+            spec = ChartSpec.model_validate_json(args)
+        except ValidationError as e:
+            return f"图表参数无效: {e}"
+        try:
+            return self.generate_chart(spec)
+        except Exception as e:
+            print(f"图表渲染失败: {e}")
+            return f"图表生成失败: {e}"
+    
+    async def arun(self, args: str) -> str:
+        """run 的异步版本（渲染在进程池中执行）"""
+        try:
+            spec = ChartSpec.model_validate_json(args)
+        except ValidationError as e:
+            return f"图表参数无效: {e}"
+        try:
+            url, _ = await chart_renderer.arender(spec)
+        except Exception as e:
+            print(f"图表渲染失败: {e}")
+            return f"图表生成失败: {e}"
+        return f"已生成 {spec.chart_type} 图表: {url}"
 
 
 # 创建工具实例
@@ -93,6 +175,49 @@ web_search_tool = WebSearchTool()
 drawing_tool = DrawingTool()
 
 
+class ToolRegistry:
+    """工具注册表（工具对象只创建一次，各请求复用）"""
+    
+    def __init__(self):
+        """初始化注册表"""
+        self._tools: Dict[str, Tool] = {}
+    
+    def register(self, tool: Tool):
+        """注册工具"""
+        self._tools[tool.name] = tool
+    
+    def get(self, name: str) -> Tool:
+        """按名称获取工具"""
+        if name not in self._tools:
+            raise KeyError(f"未注册的工具: {name}")
+        return self._tools[name]
+    
+    def all(self) -> List[Tool]:
+        """获取所有工具"""
+        return list(self._tools.values())
+
+
+# 全局工具注册表
+tool_registry = ToolRegistry()
+tool_registry.register(Tool(
+    name="web_search",
+    func=web_search_tool.run,
+    coroutine=web_search_tool.arun,
+    description="使用此工具搜索最新的金融经济新闻、案例和数据。输入应该是搜索查询。"
+))
+tool_registry.register(Tool(
+    name="draw_chart",
+    func=drawing_tool.run,
+    coroutine=drawing_tool.arun,
+    description=(
+        "生成图表（如供需曲线、GDP 序列）。输入必须是 JSON，例如："
+        '{"chart_type": "line", "title": "GDP", "labels": ["2021", "2022"], '
+        '"series": [{"name": "GDP", "values": [114.9, 121.0]}], "x_label": "年份", "y_label": "万亿元"}。'
+        "chart_type 可选 line、bar、pie。"
+    )
+))
+
+
 def get_tools() -> List[Tool]:
     """
     获取所有可用工具
@@ -100,18 +225,115 @@ def get_tools() -> List[Tool]:
     Returns:
         工具列表
     """
-    tools = [
-        Tool(
-            name="web_search",
-            func=lambda q: web_search_tool.format_results(web_search_tool.search(q)),
-            description="使用此工具搜索最新的金融经济新闻、案例和数据。输入应该是搜索查询。"
-        ),
-        Tool(
-            name="draw_chart",
-            func=lambda args: drawing_tool.generate_chart(**eval(args)),
-            description="生成图表。输入应该是包含 chart_type 和 data 的字典字符串。"
-        )
-    ]
-    
-    return tools
+    return tool_registry.all()
+
+
+class ToolCall(NamedTuple):
+    """一次工具调用"""
+    name: str
+    input: str
+    timeout: Optional[float] = None  # 秒，None 使用默认超时
+
+
+class ToolResult(NamedTuple):
+    """工具调用结果"""
+    name: str
+    output: Optional[str]
+    error: Optional[str]
+    elapsed: float
+
+
+class ToolExecutor:
+    """
+    工具执行器
+    
+    并发执行互不依赖的工具调用，每个调用有独立的超时，
+    总耗时约为最慢的那个调用，而不是所有调用之和。
+    
+    同步接口（run_all）在线程池中执行：超时从调用真正开始执行时计算，在线程池中排队的时间
+    不计入。排队也最多等待同样长的时间，仍未开始的调用会被取消（正在执行的线程无法中断，
+    超时后只是不再等待其结果）。异步接口（arun_all）在事件循环中执行工具的协程版本，
+    超时的调用会被取消。
+    """
+    
+    def __init__(self, registry: ToolRegistry, default_timeout: float, max_workers: int = 40):
+        """
+        初始化执行器
+        
+        Args:
+            registry: 工具注册表
+            default_timeout: 默认超时（秒）
+            max_workers: 最大线程数（应不少于同时处理的请求数）
+        """
+        self.registry = registry
+        self.default_timeout = default_timeout
+        self._thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+    
+    def _run_one(self, call: ToolCall, started: threading.Event, started_at: List[float]) -> str:
+        """在线程池中执行单个调用，记录开始时间"""
+        started_at.append(time.perf_counter())
+        started.set()
+        return self.registry.get(call.name).invoke(call.input)
+    
+    async def _arun_one(self, call: ToolCall) -> ToolResult:
+        """异步执行单个调用，超时会取消该调用"""
+        start = time.perf_counter()
+        try:
+            tool = self.registry.get(call.name)
+            output = await asyncio.wait_for(tool.ainvoke(call.input), timeout=call.timeout or self.default_timeout)
+            return ToolResult(call.name, output, None, time.perf_counter() - start)
+        except asyncio.TimeoutError:
+            return ToolResult(call.name, None, "工具调用超时", time.perf_counter() - start)
+        except Exception as e:
+            return ToolResult(call.name, None, str(e), time.perf_counter() - start)
+    
+    async def arun_all(self, calls: List[ToolCall]) -> List[ToolResult]:
+        """
+        并发执行多个工具调用（异步接口）
+        
+        arun_all 本身被取消时（如客户端断开），仍在执行的调用一并取消。
+        
+        Args:
+            calls: 工具调用列表
+            
+        Returns:
+            与 calls 顺序一致的结果列表
+        """
+        return list(await asyncio.gather(*(self._arun_one(call) for call in calls)))
+    
+    def run_all(self, calls: List[ToolCall]) -> List[ToolResult]:
+        """
+        并发执行多个工具调用（同步接口，在线程池中执行）
+        
+        Args:
+            calls: 工具调用列表
+            
+        Returns:
+            与 calls 顺序一致的结果列表
+        """
+        start = time.perf_counter()
+        pending = []
+        for call in calls:
+            started, started_at = threading.Event(), []
+            pending.append((call, started, started_at, self._thread_pool.submit(self._run_one, call, started, started_at)))
+        
+        results = []
+        for call, started, started_at, future in pending:
+            timeout = call.timeout or self.default_timeout
+            # 排队等待（与其他调用的等待时间重叠）
+            if not started.wait(timeout=max(0.0, start + timeout - time.perf_counter())) and future.cancel():
+                results.append(ToolResult(call.name, None, "工具繁忙，调用未执行", time.perf_counter() - start))
+                continue
+            started.wait()
+            try:
+                output = future.result(timeout=max(0.0, started_at[0] + timeout - time.perf_counter()))
+                results.append(ToolResult(call.name, output, None, time.perf_counter() - start))
+            except FutureTimeoutError:
+                results.append(ToolResult(call.name, None, "工具调用超时", time.perf_counter() - start))
+            except Exception as e:
+                results.append(ToolResult(call.name, None, str(e), time.perf_counter() - start))
+        return results
+
 
+# 全局工具执行器
+tool_executor = ToolExecutor(tool_registry, default_timeout=settings.tool_timeout, max_workers=settings.tool_workers)
@@ -1,15 +1,17 @@
 """核心工作流模块"""
+import threading
 from typing import Dict, List, Optional
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import initialize_agent, AgentType
 from langchain.schema import AIMessage
 from backend.config import settings
 from backend.modules.planner import intent_planner
-from backend.modules.rag import rag_knowledge_base
+from backend.modules.rag import knowledge_bases
 from backend.modules.memory import memory_manager
-from backend.modules.tools import get_tools
+from backend.modules.context import assemble_context
+from backend.modules.tools import get_tools, tool_executor, ToolCall
+from backend.modules.prompts import LEARN_PROMPT, REVIEW_PROMPT, GRADING_PROMPT, CHAT_PROMPT
 from backend.models.schemas import ChatResponse, IntentResponse
+from backend.utils.lazy import LazySingleton
+from backend.utils.llm_cache import llm_response_cache
 
 
 class TeachingWorkflow:
@@ -17,6 +19,8 @@ class TeachingWorkflow:
     
     def __init__(self):
         """初始化工作流"""
+        from langchain_openai import ChatOpenAI
+        
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY 未设置")
         
@@ -44,14 +48,37 @@ class TeachingWorkflow:
         # 评分模型（用于判卷）
         self.grading_llm = ChatOpenAI(**grading_kwargs)
         
-        # 初始化 Agent（带工具）
-        self.agent = initialize_agent(
-            tools=get_tools(),
-            llm=self.llm,
-            agent=AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,
-            verbose=True,
-            memory=None  # 我们手动管理记忆
-        )
+        # 预编译各意图的处理链，所有请求复用
+        # 判卷和复习的输入经常完全相同（同一道题、同一个答案），可按配置启用响应缓存
+        self.learn_chain = LEARN_PROMPT | self.llm
+        self.review_chain = llm_response_cache.wrap("review", REVIEW_PROMPT, self.llm)
+        self.grading_chain = llm_response_cache.wrap("grading", GRADING_PROMPT, self.grading_llm)
+        self.chat_chain = CHAT_PROMPT | self.llm
+        
+        # Agent 只在真正需要工具推理时才创建
+        self._agent = None
+        self._agent_lock = threading.Lock()
+    
+    @property
+    def agent(self):
+        """带工具的 ReAct Agent（首次访问时创建）"""
+        if self._agent is None:
+            with self._agent_lock:
+                if self._agent is None:
+                    from langchain.agents import initialize_agent, AgentType
+                    
+                    self._agent = initialize_agent(
+                        tools=get_tools(),
+                        llm=self.llm,
+                        agent=AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,
+                        verbose=False,
+                        memory=None  # 我们手动管理记忆
+                    )
+        return self._agent
+    
+    def warm_up(self):
+        """预热意图识别模型客户端（不调用 LLM）"""
+        intent_planner.get()
     
     def process_message(self, user_id: str, message: str, conversation_id: Optional[str] = None) -> ChatResponse:
         """
@@ -97,55 +124,40 @@ class TeachingWorkflow:
             "mastery_level": user_progress.mastery_level,
             "mastered_topics": user_progress.mastered_topics
         }
-        knowledge = rag_knowledge_base.search(message, k=3, user_progress=progress_dict)
+        if intent.topic:
+            # 知识点在索引中时直接查表，否则用用户原话做语义检索
+            knowledge = knowledge_bases.search_topics([intent.topic], k=3, namespaces=user_progress.enrolled_courses,
+                                                      fallback_queries=[message], remember=False)
+        else:
+            knowledge = knowledge_bases.search(message, k=3, namespaces=user_progress.enrolled_courses,
+                                               user_progress=progress_dict)
         
         # 2. 设置当前主题
         if intent.topic:
             memory_manager.set_current_topic(user_id, intent.topic)
         
-        # 3. 构建教学提示词
+        # 3. 构建教学上下文
         learning_context = memory_manager.get_learning_context(user_id)
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """你是一位苏格拉底式的金融经济导师。你的教学风格是：
-
-1. **引导式提问**：不要直接给出答案，而是通过提问引导学生思考
-2. **循序渐进**：根据学生的掌握程度调整讲解深度
-3. **联系实际**：用生活中的例子解释抽象概念
-4. **鼓励思考**：当学生回答正确时给予鼓励，错误时引导纠正             
-
-当前学生信息：
-{learning_context}
-
-知识库内容：
-{knowledge}
-
-请基于以上信息，用引导式的方式帮助学生理解。如果学生是初学者，使用通俗易懂的语言；如果学生已有基础，可以深入讲解。如果知识库中有相关的信息，请额外引用原文。"""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{user_input}")
-        ])
-        
-        # 4. 获取对话历史
-        memory = memory_manager.get_conversation_memory(user_id, conversation_id)
-        chat_history = memory.chat_memory.messages
+        # 4. 获取对话历史（摘要 + 最近消息）
+        chat_history = memory_manager.get_prompt_history(user_id, conversation_id)
         
-        # 5. 生成回复
-        chain = prompt | self.llm
-        response = chain.invoke({
-            "learning_context": learning_context,
-            "knowledge": "\n\n".join(knowledge),
-            "chat_history": chat_history,
-            "user_input": message
-        })
+        # 5. 在 token 预算内组装上下文并生成回复
+        context = assemble_context(
+            LEARN_PROMPT,
+            {"learning_context": learning_context, "user_input": message},
+            knowledge=knowledge,
+            history=chat_history
+        )
+        response = self.learn_chain.invoke(context.inputs)
         
         # 6. 保存对话
-        memory.chat_memory.add_user_message(message)
-        memory.chat_memory.add_ai_message(response.content)
+        memory_manager.save_turn(user_id, conversation_id, message, response.content)
         
         return ChatResponse(
             response=response.content,
             intent="learn",
-            sources=[f"知识库: {len(knowledge)} 个相关片段"],
+            sources=[f"知识库: {context.knowledge_used} 个相关片段"],
             conversation_id=conversation_id or f"{user_id}_default"
         )
     
@@ -158,38 +170,23 @@ class TeachingWorkflow:
         if not topics:
             response_text = "你还没有学习任何知识点。让我们开始学习吧！你想了解哪个金融经济概念？"
         else:
-            # 从知识库检索复习内容
-            review_query = f"复习 {' '.join(topics[:3])}"
-            knowledge = rag_knowledge_base.search(review_query, k=3)
+            # 从知识库检索复习内容：每个知识点先查索引，其余一次批量语义检索，合并后各知识点的最佳结果排在前面
+            knowledge = knowledge_bases.search_topics(topics[:3], k=3, namespaces=user_progress.enrolled_courses)[:3]
             
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是一位金融经济导师，正在帮助学生复习。
-
-学生已学知识点：
-{topics}
-
-掌握程度：
-{mastery_levels}
-
-错题记录：
-{weak_points}
-
-请帮助学生复习这些内容，重点关注掌握程度较低的知识点。"""),
-                ("human", "{user_input}")
-            ])
-            
-            chain = prompt | self.llm
-            response = chain.invoke({
-                "topics": ", ".join(topics),
-                "mastery_levels": str(user_progress.mastery_level),
-                "weak_points": "\n".join(user_progress.weak_points[-5:]) if user_progress.weak_points else "无",
-                "user_input": message
-            })
+            context = assemble_context(
+                REVIEW_PROMPT,
+                {
+                    "topics": ", ".join(topics),
+                    "mastery_levels": str(user_progress.mastery_level),
+                    "weak_points": "\n".join(user_progress.weak_points[-5:]) if user_progress.weak_points else "无",
+                    "user_input": message
+                },
+                knowledge=knowledge
+            )
+            response = self.review_chain.invoke(context.inputs)
             response_text = response.content
         
-        memory = memory_manager.get_conversation_memory(user_id, conversation_id)
-        memory.chat_memory.add_user_message(message)
-        memory.chat_memory.add_ai_message(response_text)
+        memory_manager.save_turn(user_id, conversation_id, message, response_text)
         
         return ChatResponse(
             response=response_text,
@@ -204,22 +201,6 @@ class TeachingWorkflow:
         # 获取当前主题
         current_topic = user_progress.current_topic or "未知主题"
         
-        # 使用 LLM 判卷
-        grading_prompt = ChatPromptTemplate.from_messages([
-            ("system", """你是一位严格的判卷老师。请评估学生的答案。
-
-当前主题：{topic}
-
-请返回 JSON 格式：
-{{
-    "score": 0-100,
-    "is_correct": true/false,
-    "feedback": "评语",
-    "correct_answer": "正确答案"
-}}"""),
-            ("human", "学生答案：{answer}")
-        ])
-        
         # 获取对话历史以了解问题
         memory = memory_manager.get_conversation_memory(user_id, conversation_id)
         chat_history = memory.chat_memory.messages
@@ -232,8 +213,8 @@ class TeachingWorkflow:
                     question = msg.content[:200]
                     break
         
-        chain = grading_prompt | self.grading_llm
-        grading_response = chain.invoke({
+        # 使用 LLM 判卷
+        grading_response = self.grading_chain.invoke({
             "topic": current_topic,
             "answer": message
         })
@@ -270,7 +251,8 @@ class TeachingWorkflow:
         # 生成反馈回复
         if score < 60:
             # 触发补习模式
-            knowledge = rag_knowledge_base.search(f"{current_topic} 基础概念", k=2)
+            knowledge = knowledge_bases.search_topics([current_topic], k=2, namespaces=user_progress.enrolled_courses,
+                                                      fallback_queries=[f"{current_topic} 基础概念"], remember=False)
             response_text = f"""评分：{score:.1f} 分
 
 {feedback}
@@ -289,8 +271,7 @@ class TeachingWorkflow:
 
 {"你已经掌握了这个知识点！" if is_correct else "继续加油，你正在进步！"}"""
         
-        memory.chat_memory.add_user_message(message)
-        memory.chat_memory.add_ai_message(response_text)
+        memory_manager.save_turn(user_id, conversation_id, message, response_text)
         
         return ChatResponse(
             response=response_text,
@@ -301,44 +282,33 @@ class TeachingWorkflow:
     
     def _handle_chat_intent(self, user_id: str, message: str, conversation_id: Optional[str]) -> ChatResponse:
         """处理闲聊意图"""
-        # 使用工具（如联网搜索）获取最新信息
-        tools = get_tools()
-        web_search = tools[0]  # web_search 工具
-        
         # 判断是否需要搜索
         search_keywords = ["最新", "新闻", "最近", "现在", "当前"]
         need_search = any(keyword in message for keyword in search_keywords)
         
+        # 使用工具（如联网搜索）获取最新信息，超时则不带搜索结果继续回答
+        search_results = None
         if need_search:
             search_query = f"金融经济 {message}"
-            search_results = web_search.func(search_query)
-        else:
-            search_results = None
-        
-        # 构建回复
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """你是一位友好的金融经济教学助手。你可以：
-1. 回答金融经济相关问题
-2. 进行友好的对话
-3. 如果涉及最新信息，可以使用搜索结果
-
-{search_results}"""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{user_input}")
-        ])
+            result = tool_executor.run_all([ToolCall("web_search", search_query)])[0]
+            if result.error:
+                print(f"联网搜索失败: {result.error}")
+            else:
+                search_results = result.output
         
-        memory = memory_manager.get_conversation_memory(user_id, conversation_id)
-        chat_history = memory.chat_memory.messages
+        # 构建回复（搜索结果与检索片段同一优先级）
+        chat_history = memory_manager.get_prompt_history(user_id, conversation_id)
         
-        chain = prompt | self.llm
-        response = chain.invoke({
-            "search_results": search_results or "",
-            "chat_history": chat_history,
-            "user_input": message
-        })
+        context = assemble_context(
+            CHAT_PROMPT,
+            {"user_input": message},
+            knowledge=[search_results] if search_results else [],
+            history=chat_history,
+            knowledge_key="search_results"
+        )
+        response = self.chat_chain.invoke(context.inputs)
         
-        memory.chat_memory.add_user_message(message)
-        memory.chat_memory.add_ai_message(response.content)
+        memory_manager.save_turn(user_id, conversation_id, message, response.content)
         
         return ChatResponse(
             response=response.content,
@@ -349,5 +319,5 @@ class TeachingWorkflow:
 
 
 # 全局工作流实例
-teaching_workflow = TeachingWorkflow()
+teaching_workflow = LazySingleton(TeachingWorkflow, "teaching_workflow")
 
@@ -0,0 +1,141 @@
+"""
+多进程服务入口（pre-fork）
+
+master 进程先导入应用并加载嵌入模型，再 fork 出多个 worker 共同监听同一个端口。
+模型权重和已导入的模块在 worker 之间以写时复制方式共享，内存不随 worker 数线性增长。
+
+运行方式（仅 Linux / macOS）：
+    python -m backend.serve --workers 4
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+from typing import Dict
+from backend.config import settings
+
+
+def preload():
+    """在 master 中导入应用并加载嵌入模型"""
+    from backend.main import WARMUP_QUERIES
+    import backend.modules.workflow  # noqa: F401  提前导入 LangChain 等重量级模块
+
+    if not settings.use_local_embedding:
+        return
+    if settings.embedding_backend != "torch":
+        # ONNX Runtime 会话创建时就会启动线程池，fork 后不可用，由各 worker 自行加载
+        print(f"推理后端 {settings.embedding_backend} 不支持在 fork 前加载，嵌入模型由各 worker 加载")
+        return
+
+    import torch
+    from backend.utils.embeddings import embedding_manager
+
+    # master 只用单线程推理：用过 OpenMP 线程池的进程 fork 后，子进程可能卡死
+    torch.set_num_threads(1)
+    manager = embedding_manager.get()
+    # 直接调用模型（不经过微批处理线程和嵌入缓存），让权重和计算内核在 fork 前就绪
+    manager.model.embed_documents(WARMUP_QUERIES or ["warmup"])
+    print(f"嵌入模型已在 master 中加载: {settings.local_embedding_model}")
+
+
+def create_socket(host: str, port: int) -> socket.socket:
+    """创建所有 worker 共享的监听套接字"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, workers: int):
+    """worker 进程：恢复推理线程数后在共享套接字上运行 uvicorn"""
+    import uvicorn
+    from backend.main import app
+
+    if settings.use_local_embedding and settings.embedding_backend == "torch":
+        import torch
+        torch.set_num_threads(settings.embedding_threads or max(1, (os.cpu_count() or 1) // workers))
+
+    config = uvicorn.Config(app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(sock: socket.socket, workers: int) -> int:
+    """fork 一个 worker，返回子进程 PID"""
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            run_worker(sock, workers)
+        except BaseException as e:
+            print(f"worker {os.getpid()} 异常退出: {e}")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程服务入口（pre-fork）")
+    parser.add_argument("--host", default=settings.api_host, help="监听地址")
+    parser.add_argument("--port", type=int, default=settings.api_port, help="监听端口")
+    parser.add_argument("--workers", type=int, default=settings.api_workers, help="worker 进程数")
+    parser.add_argument("--no-preload", action="store_true", help="不在 master 中预加载（用于对比内存）")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("当前平台不支持 fork，请使用 python -m uvicorn backend.main:app")
+
+    if not args.no_preload:
+        preload()
+    sock = create_socket(args.host, args.port)
+
+    # 把 master 中已有的对象移出分代回收，worker 中的 GC 不再扫描（写入）这些对象所在的页面
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, float] = {}
+    for _ in range(args.workers):
+        children[spawn_worker(sock, args.workers)] = time.monotonic()
+    print(f"master {os.getpid()} 监听 {args.host}:{args.port}，启动 {args.workers} 个 worker: {sorted(children)}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started_at = children.pop(pid, None)
+        if started_at is None or stopping:
+            continue
+        print(f"worker {pid} 退出（状态 {status}），重新启动")
+        if time.monotonic() - started_at < 1.0:
+            time.sleep(1.0)  # 启动即崩溃时避免频繁重启
+        children[spawn_worker(sock, args.workers)] = time.monotonic()
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
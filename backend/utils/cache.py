@@ -0,0 +1,208 @@
+"""缓存工具"""
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# SQLite 缓存每写入多少次清理一次过期和超量的条目
+_PURGE_EVERY = 256
+
+
+class CacheBackend(ABC):
+    """缓存后端接口"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，不存在或已过期时返回 None"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 过期时间（秒），None 表示使用默认值
+        """
+
+
+class TTLCache(CacheBackend):
+    """进程内 LRU 缓存，支持过期时间"""
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大条目数，超过后淘汰最久未使用的条目
+            ttl: 默认过期时间（秒），None 表示永不过期
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    基于 SQLite 的磁盘缓存（只能存储字符串），可被多个进程共享
+
+    过期条目在读取时跳过，并在打开时和每写入一定次数后批量删除；超过最大条目数时
+    删除最早写入的条目，文件大小不会无限增长。
+    """
+
+    def __init__(self, db_path: str, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite 数据库文件路径
+            ttl: 默认过期时间（秒），None 表示永不过期
+            max_entries: 最大条目数，None 表示不限制
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._local = threading.local()
+        conn = self._get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL
+            )
+        """)
+        conn.commit()
+        self.prune()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._get_connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?",
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        conn = self._get_connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % _PURGE_EVERY == 0
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        删除过期条目，并在超过最大条目数时删除最早写入的条目
+
+        Returns:
+            删除数量
+        """
+        removed = self.purge_expired()
+        if self.max_entries is None:
+            return removed
+        conn = self._get_connection()
+        with conn:
+            # INSERT OR REPLACE 会分配新的 rowid，rowid 顺序即写入顺序
+            cursor = conn.execute(
+                """
+                DELETE FROM cache WHERE rowid IN (
+                    SELECT rowid FROM cache ORDER BY rowid
+                    LIMIT max(0, (SELECT COUNT(*) FROM cache) - ?)
+                )
+                """,
+                (self.max_entries,)
+            )
+        return removed + cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """删除已过期的条目，返回删除数量"""
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?",
+                (time.time(),)
+            )
+        return cursor.rowcount
+
+
+class CacheStats:
+    """按名称统计缓存命中情况"""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, hit: bool):
+        """记录一次命中或未命中"""
+        with self._lock:
+            counts = self._counts.setdefault(name, {"hits": 0, "misses": 0})
+            counts["hits" if hit else "misses"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """获取统计快照（含命中率）"""
+        with self._lock:
+            result = {}
+            for name, counts in self._counts.items():
+                total = counts["hits"] + counts["misses"]
+                result[name] = {
+                    "hits": counts["hits"],
+                    "misses": counts["misses"],
+                    "hit_rate": counts["hits"] / total if total else 0.0
+                }
+            return result
@@ -0,0 +1,252 @@
+"""图表渲染（纯 SVG，带内容哈希缓存）"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+from backend.config import settings
+from backend.models.schemas import ChartSpec
+
+WIDTH = 640
+HEIGHT = 400
+MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 64, 24, 48, 64
+COLORS = ["#4e79a7", "#f28e2b", "#e15759", "#76b7b2", "#59a14f",
+          "#edc948", "#b07aa1", "#ff9da7", "#9c755f", "#bab0ac"]
+
+
+def _nice_ticks(low: float, high: float, count: int = 5) -> List[float]:
+    """计算坐标轴刻度（1/2/5 × 10^n 步长）"""
+    if not all(math.isfinite(value) for value in (low, high, high - low)):
+        raise ValueError("数据超出可绘制的范围")
+    # 跨度为 0 或小到无法区分（包括非规格化的极小值）时，按 [low, low + 1] 的量级绘制
+    if high - low <= max(abs(low), abs(high), 1e-3) * 1e-6:
+        high = low + max(abs(low) * 0.1, 1.0)
+    raw_step = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw_step)
+    # 刻度取步长的整数倍，避免累加误差；容差防止浮点误差多出一个刻度
+    first = math.floor(low / step + 1e-9)
+    last = math.ceil(high / step - 1e-9)
+    return [i * step for i in range(first, last + 1)]
+
+
+def _format_number(value: float) -> str:
+    """刻度数字格式"""
+    return f"{value:g}"
+
+
+def _text(x: float, y: float, content: str, size: int = 12, anchor: str = "middle", extra: str = "") -> str:
+    """生成文本元素"""
+    return (f'<text x="{x:.1f}" y="{y:.1f}" font-size="{size}" text-anchor="{anchor}" '
+            f'font-family="sans-serif" fill="#333"{extra}>{escape(content)}</text>')
+
+
+def _render_axes_chart(spec: Dict) -> List[str]:
+    """渲染折线图和柱状图"""
+    labels = spec["labels"]
+    series = spec["series"]
+    values = [v for s in series for v in s["values"]]
+    ticks = _nice_ticks(min(0.0, min(values)), max(0.0, max(values)))
+    y_min, y_max = ticks[0], ticks[-1]
+
+    plot_w = WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    plot_h = HEIGHT - MARGIN_TOP - MARGIN_BOTTOM
+
+    def y_of(value: float) -> float:
+        return MARGIN_TOP + plot_h * (1 - (value - y_min) / (y_max - y_min))
+
+    slot = plot_w / len(labels)
+
+    def x_of(index: int) -> float:
+        return MARGIN_LEFT + slot * (index + 0.5)
+
+    parts = []
+    # 网格线和纵轴刻度
+    for tick in ticks:
+        y = y_of(tick)
+        parts.append(f'<line x1="{MARGIN_LEFT}" y1="{y:.1f}" x2="{WIDTH - MARGIN_RIGHT}" y2="{y:.1f}" stroke="#e5e5e5"/>')
+        parts.append(_text(MARGIN_LEFT - 6, y + 4, _format_number(tick), size=11, anchor="end"))
+    parts.append(f'<line x1="{MARGIN_LEFT}" y1="{y_of(0):.1f}" x2="{WIDTH - MARGIN_RIGHT}" y2="{y_of(0):.1f}" stroke="#666"/>')
+    parts.append(f'<line x1="{MARGIN_LEFT}" y1="{MARGIN_TOP}" x2="{MARGIN_LEFT}" y2="{HEIGHT - MARGIN_BOTTOM}" stroke="#666"/>')
+
+    # 横轴标签（过多时抽稀）
+    step = max(1, math.ceil(len(labels) / 12))
+    for i in range(0, len(labels), step):
+        parts.append(_text(x_of(i), HEIGHT - MARGIN_BOTTOM + 16, labels[i], size=11))
+
+    if spec["chart_type"] == "bar":
+        bar_w = slot * 0.8 / len(series)
+        for s_index, s in enumerate(series):
+            color = COLORS[s_index % len(COLORS)]
+            for i, value in enumerate(s["values"]):
+                x = MARGIN_LEFT + slot * i + slot * 0.1 + bar_w * s_index
+                top, bottom = sorted((y_of(value), y_of(0)))
+                parts.append(f'<rect x="{x:.1f}" y="{top:.1f}" width="{bar_w:.1f}" height="{bottom - top:.1f}" fill="{color}"/>')
+    else:
+        for s_index, s in enumerate(series):
+            color = COLORS[s_index % len(COLORS)]
+            points = " ".join(f"{x_of(i):.1f},{y_of(v):.1f}" for i, v in enumerate(s["values"]))
+            parts.append(f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="2"/>')
+            if len(labels) <= 50:
+                for i, value in enumerate(s["values"]):
+                    parts.append(f'<circle cx="{x_of(i):.1f}" cy="{y_of(value):.1f}" r="3" fill="{color}"/>')
+
+    # 坐标轴名称
+    if spec.get("x_label"):
+        parts.append(_text(MARGIN_LEFT + plot_w / 2, HEIGHT - 16, spec["x_label"]))
+    if spec.get("y_label"):
+        parts.append(_text(16, MARGIN_TOP + plot_h / 2, spec["y_label"],
+                           extra=f' transform="rotate(-90 16 {MARGIN_TOP + plot_h / 2:.1f})"'))
+
+    # 图例
+    if len(series) > 1:
+        for s_index, s in enumerate(series):
+            x = MARGIN_LEFT + s_index * 110
+            color = COLORS[s_index % len(COLORS)]
+            parts.append(f'<rect x="{x}" y="{MARGIN_TOP - 22}" width="12" height="12" fill="{color}"/>')
+            parts.append(_text(x + 16, MARGIN_TOP - 12, s["name"], size=11, anchor="start"))
+    return parts
+
+
+def _render_pie_chart(spec: Dict) -> List[str]:
+    """渲染饼图（使用第一个数据系列）"""
+    labels = spec["labels"]
+    values = spec["series"][0]["values"]
+    total = sum(values)
+    cx, cy, r = WIDTH * 0.38, MARGIN_TOP + (HEIGHT - MARGIN_TOP - 16) / 2, (HEIGHT - MARGIN_TOP - 32) / 2
+
+    parts = []
+    angle = -math.pi / 2
+    for i, (label, value) in enumerate(zip(labels, values)):
+        color = COLORS[i % len(COLORS)]
+        share = value / total if total else 0
+        if share >= 0.999999:
+            parts.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{r:.1f}" fill="{color}"/>')
+        elif share > 0:
+            end = angle + share * 2 * math.pi
+            x1, y1 = cx + r * math.cos(angle), cy + r * math.sin(angle)
+            x2, y2 = cx + r * math.cos(end), cy + r * math.sin(end)
+            large_arc = 1 if share > 0.5 else 0
+            parts.append(f'<path d="M{cx:.1f},{cy:.1f} L{x1:.1f},{y1:.1f} '
+                         f'A{r:.1f},{r:.1f} 0 {large_arc} 1 {x2:.1f},{y2:.1f} Z" fill="{color}" stroke="#fff"/>')
+            angle = end
+        legend_y = MARGIN_TOP + 8 + i * 20
+        if legend_y < HEIGHT - 8:
+            parts.append(f'<rect x="{WIDTH * 0.72:.1f}" y="{legend_y - 10}" width="12" height="12" fill="{color}"/>')
+            parts.append(_text(WIDTH * 0.72 + 16, legend_y, f"{label} ({share * 100:.1f}%)", size=11, anchor="start"))
+    return parts
+
+
+def render_svg(spec: Dict) -> str:
+    """
+    将图表描述渲染为 SVG（纯函数，可在子进程中执行）
+
+    Args:
+        spec: 已校验的 ChartSpec 字典
+
+    Returns:
+        SVG 文本
+    """
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" '
+             f'viewBox="0 0 {WIDTH} {HEIGHT}">',
+             f'<rect width="{WIDTH}" height="{HEIGHT}" fill="#fff"/>']
+    if spec.get("title"):
+        parts.append(_text(WIDTH / 2, 24, spec["title"], size=16, extra=' font-weight="bold"'))
+    if spec["chart_type"] == "pie":
+        parts.extend(_render_pie_chart(spec))
+    else:
+        parts.extend(_render_axes_chart(spec))
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+class ChartRenderer:
+    """
+    图表渲染器
+
+    渲染结果按图表描述的内容哈希保存为静态文件，相同的图表只渲染一次。
+    渲染在进程池中执行，不占用 Web 进程的 CPU 和事件循环。
+    """
+
+    def __init__(self, output_dir: str, url_prefix: str = "/charts", max_workers: int = 2):
+        """
+        初始化渲染器
+
+        Args:
+            output_dir: 图片输出目录
+            url_prefix: 静态文件访问路径前缀
+            max_workers: 渲染进程数
+        """
+        self.output_dir = output_dir
+        self.url_prefix = url_prefix
+        self.max_workers = max_workers
+        os.makedirs(output_dir, exist_ok=True)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """首次渲染时才启动进程池"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    @staticmethod
+    def chart_id(spec: ChartSpec) -> str:
+        """图表内容哈希"""
+        canonical = json.dumps(spec.model_dump(), ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:24]
+
+    def _paths(self, spec: ChartSpec) -> Tuple[str, str]:
+        """返回 (文件路径, 访问 URL)"""
+        filename = f"{self.chart_id(spec)}.svg"
+        return os.path.join(self.output_dir, filename), f"{self.url_prefix}/{filename}"
+
+    def _save(self, file_path: str, svg: str):
+        """原子写入，避免并发请求读到半个文件"""
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(svg)
+        os.replace(tmp_path, file_path)
+
+    def render(self, spec: ChartSpec) -> Tuple[str, bool]:
+        """
+        渲染图表（同步接口）
+
+        Args:
+            spec: 图表描述
+
+        Returns:
+            (图片 URL, 是否命中缓存)
+        """
+        file_path, url = self._paths(spec)
+        if os.path.exists(file_path):
+            return url, True
+        svg = self._get_pool().submit(render_svg, spec.model_dump()).result()
+        self._save(file_path, svg)
+        return url, False
+
+    async def arender(self, spec: ChartSpec) -> Tuple[str, bool]:
+        """render 的异步版本"""
+        file_path, url = self._paths(spec)
+        if os.path.exists(file_path):
+            return url, True
+        loop = asyncio.get_running_loop()
+        svg = await loop.run_in_executor(self._get_pool(), render_svg, spec.model_dump())
+        self._save(file_path, svg)
+        return url, False
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# 全局图表渲染器实例
+chart_renderer = ChartRenderer(settings.chart_output_dir, max_workers=settings.chart_render_workers)
@@ -1,14 +1,117 @@
 """文档加载和处理"""
+import gzip
+import hashlib
+import json
 import os
-from typing import List
+import threading
+from typing import List, Optional
 from pathlib import Path
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredWordDocumentLoader,
-    UnstructuredPowerPointLoader
-)
+from backend.utils.lazy import LazySingleton
+
+# 解析结果格式版本，解析逻辑变化时递增以废弃旧缓存
+PARSED_CACHE_VERSION = 1
+
+
+class ParsedTextCache:
+    """
+    文档解析结果缓存
+
+    以文件内容哈希为键，把解析出的各页文本保存为 gzip 压缩的 JSON 文件。
+    文件内容不变时，重新分片只需要读取缓存，不再运行 PDF/Word/PPT 解析器。
+
+    缓存文件的修改时间记录最近一次使用，总大小超过上限时删除最久未使用的文件
+    （已删除或替换的文档不会再被读取，最终会被淘汰）。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存文件总大小上限（字节），None 或 0 表示不限制
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prune()
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        """计算文件内容哈希"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _path(self, content_hash: str, file_ext: str) -> str:
+        """缓存文件路径（扩展名不同时使用的解析器不同）"""
+        return os.path.join(self.cache_dir, f"{content_hash}{file_ext}.json.gz")
+
+    def get(self, content_hash: str, file_ext: str) -> Optional[List[str]]:
+        """
+        读取解析结果
+
+        Returns:
+            各页文本，不存在或版本不符时返回 None
+        """
+        path = self._path(content_hash, file_ext)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != PARSED_CACHE_VERSION:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return payload["pages"]
+
+    def set(self, content_hash: str, file_ext: str, pages: List[str]):
+        """保存解析结果（原子写入）"""
+        path = self._path(content_hash, file_ext)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"version": PARSED_CACHE_VERSION, "pages": pages}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.prune()
+
+    def prune(self) -> int:
+        """
+        总大小超过上限时删除最久未使用的缓存文件
+
+        Returns:
+            删除的文件数
+        """
+        if not self.max_bytes:
+            return 0
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json.gz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:  # 其他进程已删除
+                pass
+            total -= size
+        return removed
 
 
 class DocumentLoader:
@@ -26,6 +129,9 @@ class DocumentLoader:
         
         self.chunk_size = chunk_size or settings.default_chunk_size
         self.chunk_overlap = chunk_overlap or settings.default_chunk_overlap
+        self.parsed_cache = ParsedTextCache(
+            settings.parsed_text_cache_dir, max_bytes=settings.parsed_text_cache_max_mb * 1024 * 1024
+        ) if settings.parsed_text_cache_enabled else None
         
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
@@ -61,7 +167,44 @@ class DocumentLoader:
         Returns:
             文档块列表
         """
+        # 合并所有页面内容
+        full_text = "\n\n".join(self.load_pages(file_path))
+        
+        # 分块
+        chunks = self.text_splitter.split_text(full_text)
+        
+        return chunks
+    
+    def load_pages(self, file_path: str) -> List[str]:
+        """
+        解析文档，返回各页文本（文件内容不变时直接使用缓存的解析结果）
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            各页文本列表
+        """
         file_ext = Path(file_path).suffix.lower()
+        if self.parsed_cache is None:
+            return self._parse_pages(file_path, file_ext)
+        
+        content_hash = self.parsed_cache.file_hash(file_path)
+        pages = self.parsed_cache.get(content_hash, file_ext)
+        if pages is None:
+            pages = self._parse_pages(file_path, file_ext)
+            self.parsed_cache.set(content_hash, file_ext, pages)
+        return pages
+    
+    def _parse_pages(self, file_path: str, file_ext: str) -> List[str]:
+        """使用对应的解析器解析文档"""
+        # 各类文档解析库较重，只在需要解析文件时才导入
+        from langchain_community.document_loaders import (
+            PyPDFLoader,
+            TextLoader,
+            UnstructuredWordDocumentLoader,
+            UnstructuredPowerPointLoader
+        )
         
         # 根据文件类型选择加载器
         if file_ext == ".pdf":
@@ -78,13 +221,7 @@ class DocumentLoader:
         # 加载文档
         documents = loader.load()
         
-        # 合并所有页面内容
-        full_text = "\n\n".join([doc.page_content for doc in documents])
-        
-        # 分块
-        chunks = self.text_splitter.split_text(full_text)
-        
-        return chunks
+        return [doc.page_content for doc in documents]
     
     def load_text(self, text: str) -> List[str]:
         """
@@ -100,5 +237,5 @@ class DocumentLoader:
 
 
 # 全局文档加载器实例
-document_loader = DocumentLoader()
+document_loader = LazySingleton(DocumentLoader, "document_loader")
 
@@ -0,0 +1,347 @@
+"""文档块嵌入缓存（按模型和文本哈希缓存向量）"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Set
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只有进程内加锁
+    fcntl = None
+
+# SQLite 单条语句的参数数量有限，批量查询时分段
+_QUERY_CHUNK = 500
+
+# 超过大小上限后淘汰到上限的这个比例，避免每次写入都重写文件
+_PRUNE_TARGET = 0.8
+
+# 压缩时每次复制的行数
+_COPY_ROWS = 4096
+
+
+class EmbeddingCache:
+    """
+    文档块嵌入缓存
+
+    向量按追加方式写入每个模型一个的 float32 文件（行号即槽位），通过内存映射读取；
+    (模型 ID, 文本 SHA-256) 到槽位的索引保存在 SQLite 中。重新索引时内容没有变化的
+    文档块直接复用已有向量，只有新的或修改过的文档块才需要经过模型。
+
+    索引记录每个向量最近一次使用的时间。所有向量文件的总大小超过 max_bytes 时，
+    按最近使用时间淘汰（包括已经不用的旧模型），把保留的向量重写到新一代文件
+    （{模型哈希}.{代}.f32）并在同一个事务中更新槽位和代号，再删除旧文件。
+    其他进程按查询到的代号映射文件，已映射的旧文件在取消映射前仍然有效。
+    """
+
+    def __init__(self, cache_dir: str, model_id: str, max_bytes: Optional[int] = None):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            model_id: 嵌入模型标识（模型名称、推理后端等，不同模型的向量互不复用）
+            max_bytes: 向量文件总大小上限（字节），None 或 0 表示不限制
+        """
+        self.cache_dir = cache_dir
+        self.model_id = model_id
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, "index.db")
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._map: Optional[np.memmap] = None
+        self._map_generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        # SQLite 连接不能跨 fork 使用，子进程重新建立连接
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        conn = self._get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                slot INTEGER NOT NULL,
+                used_at REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+        """)
+        # 旧版本创建的索引没有代号和使用时间
+        if "generation" not in [row[1] for row in conn.execute("PRAGMA table_info(models)")]:
+            conn.execute("ALTER TABLE models ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+        if "used_at" not in [row[1] for row in conn.execute("PRAGMA table_info(vectors)")]:
+            conn.execute("ALTER TABLE vectors ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+        conn.commit()
+        row = conn.execute("SELECT dim FROM models WHERE model = ?", (model_id,)).fetchone()
+        self.dim: Optional[int] = row[0] if row else None
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30.0)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        """文档块文本的哈希"""
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def _vector_path(self, model_id: str, generation: int) -> str:
+        """模型某一代的向量文件（第 0 代沿用旧的文件名）"""
+        model_hash = hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+        suffix = f".{generation}" if generation else ""
+        return os.path.join(self.cache_dir, f"{model_hash}{suffix}.f32")
+
+    @staticmethod
+    def _generation(conn: sqlite3.Connection, model_id: str) -> int:
+        row = conn.execute("SELECT generation FROM models WHERE model = ?", (model_id,)).fetchone()
+        return row[0] if row else 0
+
+    @contextmanager
+    def _model_lock(self, model_id: str):
+        """跨进程锁：分配槽位和压缩同一个模型的向量文件时互斥"""
+        model_hash = hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+        with open(os.path.join(self.cache_dir, f"{model_hash}.lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _rows(self, slots: List[int], generation: int) -> Optional[np.ndarray]:
+        """按槽位读取向量（文件增长或压缩后重新映射），文件已被压缩删除时返回 None"""
+        with self._lock:
+            if self._map is None or self._map_generation != generation or max(slots) >= self._map.shape[0]:
+                path = self._vector_path(self.model_id, generation)
+                try:
+                    rows = os.path.getsize(path) // (self.dim * 4)
+                    self._map = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+                except (FileNotFoundError, ValueError):  # 其他进程刚刚压缩，按未命中处理
+                    self._map, self._map_generation = None, None
+                    return None
+                self._map_generation = generation
+            if max(slots) >= self._map.shape[0]:
+                return None
+            return np.array(self._map[slots])
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        批量读取缓存
+
+        Args:
+            texts: 文档块文本
+
+        Returns:
+            与 texts 对应的向量列表，未命中的位置为 None
+        """
+        if self.dim is None or not texts:
+            return [None] * len(texts)
+
+        hashes = [self.text_hash(text) for text in texts]
+        # 同一代的槽位才能一起读取，分段查询中途遇到压缩时以最后一代为准
+        slots_by_generation: Dict[int, Dict[bytes, int]] = {}
+        conn = self._get_connection()
+        unique = list(set(hashes))
+        for start in range(0, len(unique), _QUERY_CHUNK):
+            part = unique[start:start + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(part))
+            # 槽位和代号在同一条语句中读取，压缩在一个事务中同时修改两者
+            rows = conn.execute(
+                f"SELECT v.text_hash, v.slot, m.generation FROM vectors v JOIN models m ON m.model = v.model "
+                f"WHERE v.model = ? AND v.text_hash IN ({placeholders})",
+                [self.model_id, *part]
+            ).fetchall()
+            for h, slot, generation in rows:
+                slots_by_generation.setdefault(generation, {})[bytes(h)] = slot
+
+        if not slots_by_generation:
+            return [None] * len(texts)
+        found = list(slots_by_generation[max(slots_by_generation)].items())
+        vectors = self._rows([slot for _, slot in found], max(slots_by_generation))
+        if vectors is None:
+            return [None] * len(texts)
+        self._touch([h for h, _ in found])
+        vector_by_hash = {h: vectors[i].tolist() for i, (h, _) in enumerate(found)}
+        return [vector_by_hash.get(h) for h in hashes]
+
+    def _touch(self, hashes: List[bytes]):
+        """记录命中的向量最近一次使用的时间"""
+        if not self.max_bytes:
+            return
+        now = time.time()
+        with self._get_connection() as conn:
+            for start in range(0, len(hashes), _QUERY_CHUNK):
+                part = hashes[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(part))
+                conn.execute(f"UPDATE vectors SET used_at = ? WHERE model = ? AND text_hash IN ({placeholders})",
+                             [now, self.model_id, *part])
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """
+        批量写入缓存
+
+        Args:
+            texts: 文档块文本
+            vectors: 对应的向量
+        """
+        if not texts:
+            return
+        array = np.asarray(vectors, dtype=np.float32)
+        conn = self._get_connection()
+        if self.dim is None:
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO models (model, dim) VALUES (?, ?)", (self.model_id, array.shape[1]))
+            self.dim = conn.execute("SELECT dim FROM models WHERE model = ?", (self.model_id,)).fetchone()[0]
+        if array.shape[1] != self.dim:
+            print(f"嵌入缓存维度不一致（{array.shape[1]} != {self.dim}），跳过写入")
+            return
+
+        row_bytes = self.dim * 4
+        now = time.time()
+        # 多个进程同时追加时用文件锁分配槽位（也与压缩互斥）
+        with self._lock, self._model_lock(self.model_id):
+            generation = self._generation(conn, self.model_id)
+            with open(self._vector_path(self.model_id, generation), "ab") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size % row_bytes:
+                    # 上次写入中途退出留下的半行，索引中没有引用，直接截掉
+                    size -= size % row_bytes
+                    os.ftruncate(f.fileno(), size)
+                first_slot = size // row_bytes
+                f.write(array.tobytes())
+                f.flush()
+            # 向量落盘后再写索引，保证索引引用的槽位都是完整的
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO vectors (model, text_hash, slot, used_at) VALUES (?, ?, ?, ?)",
+                    [(self.model_id, self.text_hash(text), first_slot + i, now) for i, text in enumerate(texts)]
+                )
+        if self.max_bytes and self.size() > self.max_bytes:
+            self.prune()
+
+    def size(self) -> int:
+        """所有模型当前向量文件的总大小（字节）"""
+        total = 0
+        for model_id, generation in self._get_connection().execute("SELECT model, generation FROM models"):
+            try:
+                total += os.path.getsize(self._vector_path(model_id, generation))
+            except FileNotFoundError:
+                pass
+        return total
+
+    def prune(self) -> int:
+        """
+        按最近使用时间淘汰向量，使总大小降到上限的 80% 以下
+
+        所有模型一起排序（旧模型的向量不再被使用，最先淘汰），保留的向量重写到新文件，
+        同一文本重复写入留下的无用行也一并清除。
+
+        Returns:
+            淘汰的向量数
+        """
+        if not self.max_bytes:
+            return 0
+        conn = self._get_connection()
+        dims = dict(conn.execute("SELECT model, dim FROM models").fetchall())
+        budget = self.max_bytes * _PRUNE_TARGET
+        keep: Dict[str, Set[bytes]] = {model_id: set() for model_id in dims}
+        used = 0
+        removed = 0
+        for model_id, text_hash in conn.execute("SELECT model, text_hash FROM vectors ORDER BY used_at DESC"):
+            row_bytes = dims[model_id] * 4
+            if used + row_bytes <= budget:
+                keep[model_id].add(bytes(text_hash))
+                used += row_bytes
+            else:
+                removed += 1
+        for model_id, hashes in keep.items():
+            self._compact(model_id, dims[model_id], hashes)
+        return removed
+
+    def _compact(self, model_id: str, dim: int, keep: Set[bytes]):
+        """把保留的向量按顺序写入新一代文件，在同一个事务中更新槽位和代号"""
+        conn = self._get_connection()
+        with self._model_lock(model_id):
+            generation = self._generation(conn, model_id)
+            rows = [(bytes(h), slot, used_at) for h, slot, used_at in conn.execute(
+                "SELECT text_hash, slot, used_at FROM vectors WHERE model = ? ORDER BY slot", (model_id,))
+                if bytes(h) in keep]
+            old_path = self._vector_path(model_id, generation)
+            new_path = self._vector_path(model_id, generation + 1)
+            try:
+                old_rows = os.path.getsize(old_path) // (dim * 4)
+            except FileNotFoundError:
+                old_rows = 0
+            if old_rows == len(rows):
+                return  # 没有可以回收的行
+
+            with open(new_path, "wb") as f:
+                if rows:
+                    source = np.memmap(old_path, dtype=np.float32, mode="r", shape=(old_rows, dim))
+                    for start in range(0, len(rows), _COPY_ROWS):
+                        slots = [slot for _, slot, _ in rows[start:start + _COPY_ROWS]]
+                        f.write(np.asarray(source[slots], dtype=np.float32).tobytes())
+                    del source
+                f.flush()
+                os.fsync(f.fileno())
+            with conn:
+                conn.execute("DELETE FROM vectors WHERE model = ?", (model_id,))
+                conn.executemany(
+                    "INSERT INTO vectors (model, text_hash, slot, used_at) VALUES (?, ?, ?, ?)",
+                    [(model_id, h, i, used_at) for i, (h, _, used_at) in enumerate(rows)]
+                )
+                conn.execute("UPDATE models SET generation = ? WHERE model = ?", (generation + 1, model_id))
+            # 其他进程已映射的旧文件在取消映射前仍然有效
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+    def embed_documents(self, texts: List[str], embed: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        嵌入文档块，只对未缓存的文本调用模型
+
+        Args:
+            texts: 文档块文本
+            embed: 批量嵌入函数
+
+        Returns:
+            与 texts 对应的向量列表
+        """
+        results = self.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, results) if vector is None))
+        with self._lock:
+            self.hits += len(texts) - sum(1 for vector in results if vector is None)
+            self.misses += len(missing)
+        if missing:
+            computed = embed(missing)
+            self.put_many(missing, computed)
+            vector_by_text = dict(zip(missing, computed))
+            results = [vector if vector is not None else list(vector_by_text[text])
+                       for text, vector in zip(texts, results)]
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        """命中统计（进程内累计）"""
+        return {"hits": self.hits, "misses": self.misses}
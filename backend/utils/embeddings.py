@@ -1,41 +1,313 @@
 """嵌入模型管理"""
-from typing import List
-from langchain_openai import OpenAIEmbeddings
-# from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
 from backend.config import settings
+from backend.utils.embedding_cache import EmbeddingCache
+from backend.utils.lazy import LazySingleton
+
+# 本地嵌入推理后端：torch（sentence-transformers 默认）、onnx（ONNX Runtime）、
+# onnx-int8（ONNX Runtime + int8 动态量化模型，CPU 上最快）
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# onnx-int8 未指定模型文件时使用的量化模型（sentence-transformers 官方仓库自带）
+DEFAULT_INT8_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+def current_model_config() -> Dict[str, str]:
+    """
+    当前配置的嵌入模型
+
+    Returns:
+        模型配置（provider 为 local 或 openai）
+    """
+    if settings.use_local_embedding:
+        return {
+            "provider": "local",
+            "model": settings.local_embedding_model,
+            "backend": settings.embedding_backend,
+            "onnx_file": settings.embedding_onnx_file
+        }
+    return {"provider": "openai", "model": settings.openai_embedding_model}
+
+
+def model_id_of(model_config: Dict[str, str]) -> str:
+    """模型配置对应的标识（推理后端不同，向量也有细微差异，因此也算作不同模型）"""
+    if model_config["provider"] == "local":
+        return f"{model_config['model']}|{model_config.get('backend', 'torch')}|{model_config.get('onnx_file', '')}"
+    return f"openai|{model_config['model']}"
+
+
+def resolve_device(device: str, backend: str = "torch") -> str:
+    """
+    确认推理设备可用，CUDA 不可用时回退到 CPU
+
+    Args:
+        device: 配置的设备（cuda、cuda:0、cpu 等）
+        backend: 推理后端
+
+    Returns:
+        实际使用的设备
+    """
+    if not device.startswith("cuda"):
+        return device
+
+    if backend == "torch":
+        try:
+            import torch
+            available = torch.cuda.is_available()
+        except ImportError:
+            available = False
+    else:
+        try:
+            import onnxruntime
+            available = "CUDAExecutionProvider" in onnxruntime.get_available_providers()
+        except ImportError:
+            available = False
+
+    if not available:
+        print(f"设备 {device} 不可用（后端 {backend}），回退到 CPU")
+        return "cpu"
+    return device
+
+
+def create_local_embeddings(model_name: str, backend: str = "torch", device: str = "cpu",
+                            threads: int = 0, onnx_file: str = ""):
+    """
+    创建本地嵌入模型
+
+    Args:
+        model_name: sentence-transformers 模型名称或路径
+        backend: 推理后端（见 EMBEDDING_BACKENDS）
+        device: 推理设备（CUDA 不可用时自动回退到 CPU）
+        threads: 推理线程数（0 表示使用库的默认值）
+        onnx_file: ONNX 模型文件（相对模型仓库的路径，留空使用默认文件）
+
+    Returns:
+        LangChain Embeddings 对象
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"不支持的嵌入推理后端: {backend}（可选: {', '.join(EMBEDDING_BACKENDS)}）")
+
+    device = resolve_device(device, backend)
+    model_kwargs = {"device": device, "trust_remote_code": True}
+
+    if backend == "torch":
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+    else:
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        if threads > 0:
+            session_options.intra_op_num_threads = threads
+        ort_kwargs = {"session_options": session_options}
+        if backend == "onnx-int8" and not onnx_file:
+            onnx_file = DEFAULT_INT8_ONNX_FILE
+        if onnx_file:
+            ort_kwargs["file_name"] = onnx_file
+        model_kwargs["backend"] = "onnx"
+        model_kwargs["model_kwargs"] = ort_kwargs
+
+    print(f"local_embedding_model {model_name} (backend={backend}, device={device})")
+    return HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs)
+
+
+class MicroBatcher:
+    """
+    查询嵌入微批处理
+
+    并发请求各自调用 embed_query 时，模型会连续执行多次批大小为 1 的前向计算。
+    微批处理把几毫秒内到达的查询收集起来（最多 max_batch_size 条），执行一次
+    批量前向计算后再把结果分发给各个调用方。
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]],
+                 max_batch_size: int = 32, max_wait: float = 0.002):
+        """
+        初始化微批处理器
+
+        Args:
+            embed_batch: 批量嵌入函数
+            max_batch_size: 单批最多条数
+            max_wait: 收到第一条查询后最多等待的秒数
+        """
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        # pre-fork 模式下子进程没有父进程的后台线程，需要重新启动
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        """首次提交时启动后台线程"""
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _collect(self) -> List[tuple]:
+        """阻塞等待第一条查询，再在等待窗口内尽量凑满一批"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """后台线程：取一批、嵌入、分发结果"""
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.embed_batch(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def submit(self, text: str) -> Future:
+        """
+        提交一条查询
+
+        Args:
+            text: 查询文本
+
+        Returns:
+            嵌入向量的 Future
+        """
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def stats(self) -> dict:
+        """批处理统计"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
+
+
+class ManagedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings 适配器
+
+    查询嵌入经过微批处理，文档嵌入经过嵌入缓存，与直接调用 EmbeddingManager 一致。
+    """
+
+    def __init__(self, manager: "EmbeddingManager"):
+        self.manager = manager
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.manager.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.manager.embed_query(text)
 
 
 class EmbeddingManager:
     """嵌入模型管理器"""
     
-    def __init__(self):
-        """初始化嵌入模型"""
-        if settings.use_local_embedding:
-            # encode_kwargs = {'normalize_embeddings': True}
+    def __init__(self, model_config: Optional[Dict[str, str]] = None):
+        """
+        初始化嵌入模型
+        
+        Args:
+            model_config: 模型配置（None 使用当前配置的模型，见 current_model_config）
+        """
+        self.model_config = model_config or current_model_config()
+        self.model_id = model_id_of(self.model_config)
+        # 模型库较重，在真正创建实例时才导入
+        if self.model_config["provider"] == "local":
             # 使用本地模型
-            print('local_embedding_model', settings.local_embedding_model)
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=settings.local_embedding_model,
-                model_kwargs={'device': settings.infer_device, 'trust_remote_code': True},
-                # encode_kwargs=encode_kwargs
+            self.model = create_local_embeddings(
+                self.model_config["model"],
+                backend=self.model_config.get("backend", "torch"),
+                device=settings.infer_device,
+                threads=settings.embedding_threads,
+                onnx_file=self.model_config.get("onnx_file", "")
             )
         else:
             # 使用 OpenAI 模型
+            from langchain_openai import OpenAIEmbeddings
+            
             if not settings.openai_api_key:
                 raise ValueError("OPENAI_API_KEY 未设置，无法使用 OpenAI 嵌入模型")
-            self.embeddings = OpenAIEmbeddings(
-                model=settings.openai_embedding_model,
+            self.model = OpenAIEmbeddings(
+                model=self.model_config["model"],
                 openai_api_key=settings.openai_api_key
             )
+        
+        # 并发的查询嵌入合并为一次批量前向计算（批大小 <= 1 时关闭）
+        self.batcher = None
+        if settings.embedding_batch_max_size > 1:
+            self.batcher = MicroBatcher(
+                self.model.embed_documents,
+                max_batch_size=settings.embedding_batch_max_size,
+                max_wait=settings.embedding_batch_max_wait_ms / 1000
+            )
+        
+        # 文档块嵌入缓存：内容没有变化的文档块直接复用向量
+        self.cache = None
+        if settings.embedding_cache_enabled:
+            self.cache = EmbeddingCache(settings.embedding_cache_dir, self.model_id,
+                                        max_bytes=settings.embedding_cache_max_bytes)
+        
+        # 需要 LangChain Embeddings 对象的地方使用这个适配器
+        self.embeddings = ManagedEmbeddings(self)
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """对文档列表进行嵌入"""
-        return self.embeddings.embed_documents(texts)
+        """对文档列表进行嵌入（优先使用嵌入缓存）"""
+        if self.cache is None:
+            return self.model.embed_documents(texts)
+        return self.cache.embed_documents(texts, self.model.embed_documents)
     
     def embed_query(self, text: str) -> List[float]:
         """对查询文本进行嵌入"""
-        return self.embeddings.embed_query(text)
+        if self.batcher is None:
+            return self.model.embed_query(text)
+        return self.batcher.submit(text).result()
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量嵌入多条查询（一次前向计算，不经过微批处理和文档块缓存）
+        
+        Args:
+            texts: 查询文本列表
+            
+        Returns:
+            与 texts 对应的向量列表
+        """
+        if not texts:
+            return []
+        return self.model.embed_documents(texts)
     
     def get_embedding_dimension(self) -> int:
         """
@@ -50,6 +322,39 @@ class EmbeddingManager:
         return len(embedding)
 
 
-# 全局嵌入模型实例
-embedding_manager = EmbeddingManager()
+# 全局嵌入模型实例（当前配置的模型）
+embedding_manager = LazySingleton(EmbeddingManager, "embedding_manager")
+
+# 其他模型的实例（切换模型期间，旧模型继续为已有的向量集合生成查询向量）
+_other_managers: Dict[str, EmbeddingManager] = {}
+_other_managers_lock = threading.Lock()
+
+
+def get_embedding_manager(model_config: Dict[str, str]) -> EmbeddingManager:
+    """
+    获取指定模型的嵌入管理器
+
+    Args:
+        model_config: 模型配置
+
+    Returns:
+        当前配置的模型返回全局实例，其他模型按需加载并复用
+    """
+    model_id = model_id_of(model_config)
+    if model_id == model_id_of(current_model_config()):
+        manager = embedding_manager.get()
+        if manager.model_id == model_id:
+            return manager
+    with _other_managers_lock:
+        manager = _other_managers.get(model_id)
+        if manager is None:
+            manager = EmbeddingManager(model_config)
+            _other_managers[model_id] = manager
+        return manager
+
+
+def release_embedding_manager(model_id: str):
+    """释放不再使用的其他模型"""
+    with _other_managers_lock:
+        _other_managers.pop(model_id, None)
 
@@ -0,0 +1,121 @@
+"""共享 HTTP 客户端（连接池 + 重试）"""
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+import httpx
+from backend.config import settings
+
+# 这些状态码通常是临时性错误，值得重试
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_sync_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_client_lock = threading.Lock()
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    """连接池和超时配置"""
+    return {
+        "timeout": httpx.Timeout(settings.http_timeout, connect=min(5.0, settings.http_timeout)),
+        "limits": httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_connections
+        )
+    }
+
+
+def get_http_client() -> httpx.Client:
+    """获取进程内共享的同步客户端（复用 TCP/TLS 连接）"""
+    global _sync_client
+    if _sync_client is None:
+        with _client_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(**_client_kwargs())
+    return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """获取进程内共享的异步客户端（复用 TCP/TLS 连接）"""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = httpx.AsyncClient(**_client_kwargs())
+    return _async_client
+
+
+async def close_http_clients():
+    """关闭共享客户端（应用退出时调用）"""
+    global _sync_client, _async_client
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def _backoff_delay(attempt: int) -> float:
+    """指数退避 + 随机抖动"""
+    return settings.http_retry_backoff * (2 ** attempt) * (0.5 + random.random())
+
+
+def _should_retry(response: Optional[httpx.Response], error: Optional[Exception]) -> bool:
+    """判断是否需要重试"""
+    if error is not None:
+        return isinstance(error, httpx.TransportError)
+    return response.status_code in RETRYABLE_STATUS_CODES
+
+
+def post_json(url: str, payload: Dict[str, Any], max_retries: Optional[int] = None) -> httpx.Response:
+    """
+    发送 JSON POST 请求，遇到网络错误或临时性错误时重试
+
+    Args:
+        url: 请求地址
+        payload: JSON 请求体
+        max_retries: 最大重试次数（None 使用配置值）
+
+    Returns:
+        响应对象（已检查状态码）
+    """
+    max_retries = settings.http_max_retries if max_retries is None else max_retries
+    client = get_http_client()
+
+    for attempt in range(max_retries + 1):
+        response, error = None, None
+        try:
+            response = client.post(url, json=payload)
+        except httpx.HTTPError as e:
+            error = e
+
+        if attempt < max_retries and _should_retry(response, error):
+            time.sleep(_backoff_delay(attempt))
+            continue
+        if error is not None:
+            raise error
+        response.raise_for_status()
+        return response
+
+
+async def apost_json(url: str, payload: Dict[str, Any], max_retries: Optional[int] = None) -> httpx.Response:
+    """post_json 的异步版本"""
+    max_retries = settings.http_max_retries if max_retries is None else max_retries
+    client = get_async_http_client()
+
+    for attempt in range(max_retries + 1):
+        response, error = None, None
+        try:
+            response = await client.post(url, json=payload)
+        except httpx.HTTPError as e:
+            error = e
+
+        if attempt < max_retries and _should_retry(response, error):
+            await asyncio.sleep(_backoff_delay(attempt))
+            continue
+        if error is not None:
+            raise error
+        response.raise_for_status()
+        return response
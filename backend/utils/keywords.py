@@ -0,0 +1,104 @@
+"""知识点关键词提取与规范化"""
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict
+
+try:
+    import jieba.analyse
+except ImportError:  # 可选依赖，未安装时使用内置的高频词提取
+    jieba = None
+
+# 知识点名称常见的前后缀（"什么是 GDP"、"通货膨胀基础概念" 都归一为同一个知识点）
+_TOPIC_PREFIXES = ("什么是", "复习", "学习", "关于")
+_TOPIC_SUFFIXES = ("的基础概念", "基础概念", "的基本概念", "基本概念", "的概念", "概念", "的定义", "定义", "是什么")
+
+# 不能出现在词首或词尾的常用字（虚词、代词、量词等）
+_STOP_CHARS = set("的了是在和与及或等这那一个我你他她它们中对为以上下而也就都其之将会被由从把并还又所可能有不要如该此各每些")
+
+_ASCII_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "were", "will", "can",
+    "not", "but", "has", "have", "had", "its", "into", "than", "then", "also", "such", "which"
+}
+
+_ASCII_TERM = re.compile(r"[a-z][a-z0-9\-]{1,30}")
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]{2,}")
+_NON_WORD = re.compile(r"[\s\W_]+")
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    规范化知识点名称（全角转半角、小写、去掉空白标点和常见前后缀）
+
+    Args:
+        topic: 知识点名称或关键词
+
+    Returns:
+        规范化后的名称（可能为空字符串）
+    """
+    label = _NON_WORD.sub("", unicodedata.normalize("NFKC", topic).lower())
+    for prefix in _TOPIC_PREFIXES:
+        if label.startswith(prefix) and len(label) > len(prefix):
+            label = label[len(prefix):]
+    for suffix in _TOPIC_SUFFIXES:
+        if label.endswith(suffix) and len(label) > len(suffix):
+            label = label[:-len(suffix)]
+    return label
+
+
+def _frequent_terms(text: str, top_k: int) -> Dict[str, float]:
+    """
+    不分词的高频词提取
+
+    英文按单词计数；中文统计连续汉字中 2-4 字的片段，保留在文档块中至少出现两次的片段，
+    被同样频繁的更长片段包含的短片段（"货膨" 之于 "通货膨胀"）去掉。
+    """
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    counts: Counter = Counter(
+        term for term in _ASCII_TERM.findall(normalized) if term not in _ASCII_STOPWORDS
+    )
+    for run in _CJK_RUN.findall(normalized):
+        for n in range(2, 5):
+            for i in range(len(run) - n + 1):
+                gram = run[i:i + n]
+                if gram[0] not in _STOP_CHARS and gram[-1] not in _STOP_CHARS:
+                    counts[gram] += 1
+
+    candidates = {term: count for term, count in counts.items() if count >= 2}
+    subsumed = set()
+    for term, count in candidates.items():
+        for n in range(2, len(term)):
+            for i in range(len(term) - n + 1):
+                part = term[i:i + n]
+                if candidates.get(part, 0) <= count:
+                    subsumed.add(part)
+    kept = {term: count for term, count in candidates.items() if term not in subsumed}
+    ranked = sorted(kept.items(), key=lambda item: (-item[1] * len(item[0]), item[0]))[:top_k]
+    if not ranked:
+        return {}
+    top = ranked[0][1] * len(ranked[0][0])
+    return {term: round(count * len(term) / top, 4) for term, count in ranked}
+
+
+def extract_keywords(text: str, top_k: int = 8) -> Dict[str, float]:
+    """
+    提取文档块的知识点关键词
+
+    Args:
+        text: 文档块文本
+        top_k: 最多返回的关键词数量
+
+    Returns:
+        规范化关键词到权重（0-1）的映射
+    """
+    if jieba is not None:
+        terms = jieba.analyse.extract_tags(text, topK=top_k, withWeight=True)
+    else:
+        terms = _frequent_terms(text, top_k).items()
+
+    keywords: Dict[str, float] = {}
+    for term, weight in terms:
+        label = normalize_topic(term)
+        if len(label) >= 2:
+            keywords[label] = max(keywords.get(label, 0.0), float(weight))
+    return keywords
@@ -0,0 +1,74 @@
+"""延迟初始化工具"""
+import importlib
+import threading
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LazySingleton(Generic[T]):
+    """
+    延迟初始化的全局单例代理
+
+    第一次访问属性时才调用工厂函数创建实例（线程安全），之后所有属性访问
+    都转发给该实例。模块可以照常导出全局实例，导入模块本身不再加载模型、
+    打开数据库或检查 API Key。
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str):
+        """
+        初始化代理
+
+        Args:
+            factory: 创建实例的函数
+            name: 单例名称（用于日志和就绪检查）
+        """
+        self._factory = factory
+        self._name = name
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        """单例名称"""
+        return self._name
+
+    @property
+    def initialized(self) -> bool:
+        """实例是否已创建"""
+        return self._instance is not None
+
+    def get(self) -> T:
+        """获取实例，不存在时创建"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.get(), item)
+
+    def __repr__(self) -> str:
+        state = "initialized" if self.initialized else "pending"
+        return f"<LazySingleton {self._name} ({state})>"
+
+
+def lazy_import(module_name: str, attr: str) -> LazySingleton:
+    """
+    延迟导入模块中的全局实例
+
+    连模块本身（及其依赖的 LangChain、ChromaDB 等库）都推迟到第一次使用时才导入。
+
+    Args:
+        module_name: 模块路径
+        attr: 模块中的全局实例名称
+
+    Returns:
+        实例代理
+    """
+    def factory():
+        value = getattr(importlib.import_module(module_name), attr)
+        return value.get() if isinstance(value, LazySingleton) else value
+
+    return LazySingleton(factory, attr)
@@ -0,0 +1,134 @@
+"""LLM 响应缓存"""
+import hashlib
+import json
+from typing import Any, Dict, Set
+from langchain.schema import AIMessage
+from backend.config import settings
+from backend.utils.cache import CacheBackend, CacheStats, SQLiteCache, TTLCache
+from backend.utils.locks import SingleFlight
+
+
+class CachedChain:
+    """
+    带响应缓存的 提示词 | LLM 链
+
+    与 prompt | llm 用法相同。缓存键由模型、参数和格式化后的完整提示词组成，
+    因此只有输入完全相同的调用才会命中缓存。启用请求合并的调用点，
+    同一个缓存键同时只请求一次 LLM。
+    """
+
+    def __init__(self, cache: "LLMResponseCache", site: str, prompt, llm):
+        """
+        初始化缓存链
+
+        Args:
+            cache: LLM 响应缓存
+            site: 调用点名称（用于启用配置和命中统计）
+            prompt: 提示词模板
+            llm: 聊天模型
+        """
+        self.cache = cache
+        self.site = site
+        self.prompt = prompt
+        self.llm = llm
+        self.chain = prompt | llm
+
+    def _cache_key(self, messages) -> str:
+        """计算缓存键"""
+        payload = {
+            "model": getattr(self.llm, "model_name", None),
+            "temperature": getattr(self.llm, "temperature", None),
+            "base_url": getattr(self.llm, "openai_api_base", None),
+            "messages": [(message.type, message.content) for message in messages]
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return f"{self.site}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def invoke(self, inputs: Dict[str, Any]):
+        """调用链，命中缓存时不请求 LLM"""
+        cache_enabled = self.cache.is_enabled(self.site)
+        coalesce = self.cache.is_coalesced(self.site)
+        if not cache_enabled and not coalesce:
+            return self.chain.invoke(inputs)
+
+        messages = self.prompt.invoke(inputs).to_messages()
+        key = self._cache_key(messages)
+
+        if cache_enabled:
+            cached = self.cache.backend.get(key)
+            if cached is not None:
+                self.cache.stats.record(self.site, hit=True)
+                return AIMessage(content=cached)
+            self.cache.stats.record(self.site, hit=False)
+
+        def call():
+            response = self.llm.invoke(messages)
+            if cache_enabled:
+                self.cache.backend.set(key, response.content)
+            return response
+
+        if coalesce:
+            return self.cache.flight.do(key, call)
+        return call()
+
+
+class LLMResponseCache:
+    """LLM 响应缓存（按调用点启用）"""
+
+    def __init__(self, backend: CacheBackend, enabled_sites: Set[str], coalesced_sites: Set[str] = frozenset()):
+        """
+        初始化缓存
+
+        Args:
+            backend: 缓存后端
+            enabled_sites: 启用缓存的调用点名称
+            coalesced_sites: 合并相同并发请求的调用点名称
+        """
+        self.backend = backend
+        self.enabled_sites = enabled_sites
+        self.coalesced_sites = coalesced_sites
+        self.stats = CacheStats()
+        self.flight = SingleFlight("llm")
+
+    def is_enabled(self, site: str) -> bool:
+        """某个调用点是否启用缓存"""
+        return site in self.enabled_sites
+
+    def is_coalesced(self, site: str) -> bool:
+        """某个调用点是否合并相同的并发请求"""
+        return site in self.coalesced_sites
+
+    def wrap(self, site: str, prompt, llm) -> CachedChain:
+        """
+        创建带缓存的链
+
+        Args:
+            site: 调用点名称
+            prompt: 提示词模板
+            llm: 聊天模型
+
+        Returns:
+            可替代 prompt | llm 的链
+        """
+        return CachedChain(self, site, prompt, llm)
+
+
+def create_llm_response_cache() -> LLMResponseCache:
+    """根据配置创建 LLM 响应缓存"""
+    ttl = settings.llm_cache_ttl if settings.llm_cache_ttl > 0 else None
+    if settings.llm_cache_backend == "sqlite":
+        backend = SQLiteCache(settings.llm_cache_path, ttl=ttl, max_entries=settings.llm_cache_max_entries)
+    elif settings.llm_cache_backend == "memory":
+        backend = TTLCache(max_entries=settings.llm_cache_max_entries, ttl=ttl)
+    else:
+        raise ValueError(f"不支持的 LLM 缓存后端: {settings.llm_cache_backend}")
+
+    enabled_sites = {site.strip() for site in settings.llm_cache_sites.split(",") if site.strip()}
+    coalesced_sites = set()
+    if settings.single_flight_enabled:
+        coalesced_sites = {site.strip() for site in settings.single_flight_llm_sites.split(",") if site.strip()}
+    return LLMResponseCache(backend, enabled_sites, coalesced_sites)
+
+
+# 全局 LLM 响应缓存实例
+llm_response_cache = create_llm_response_cache()
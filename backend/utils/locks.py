@@ -0,0 +1,221 @@
+"""并发控制工具"""
+import asyncio
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只有进程内互斥
+    fcntl = None
+
+T = TypeVar("T")
+
+
+class StripedLock:
+    """
+    分段锁
+
+    按键的哈希把锁分散到固定数量的分段上：同一个键的操作互斥，
+    不同键的操作大概率落在不同分段上，可以并行执行。
+
+    指定锁文件时同时在进程之间互斥（多 worker 部署）：每个分段对应锁文件中的一个字节，
+    用 fcntl 记录锁锁定。没有 fcntl 的平台（Windows）只在进程内互斥。
+    """
+
+    def __init__(self, stripes: int = 64, path: Optional[str] = None):
+        """
+        初始化分段锁
+
+        Args:
+            stripes: 分段数量
+            path: 锁文件路径（可选，不指定时只在进程内互斥）
+        """
+        self._stripes = stripes
+        self._locks: List[threading.Lock] = [threading.Lock() for _ in range(stripes)]
+        self.path = path if fcntl is not None else None
+        self._fd: Optional[int] = None
+        self._fd_lock = threading.Lock()
+        # fork 时其他线程可能持有分段锁，子进程重新创建（记录锁本身不会被子进程继承）
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._locks = [threading.Lock() for _ in range(self._stripes)]
+        self._fd_lock = threading.Lock()
+
+    def _get_stripe(self, key: str) -> int:
+        """获取键对应的分段（crc32 在各进程间稳定，不同进程的同一个键落在同一个分段上）"""
+        return zlib.crc32(key.encode("utf-8")) % self._stripes
+
+    def _get_fd(self) -> int:
+        """打开锁文件（进程内只打开一次）"""
+        with self._fd_lock:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            return self._fd
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """
+        锁定某个键
+
+        Args:
+            key: 需要互斥访问的键（如用户ID、对话键）
+        """
+        stripe = self._get_stripe(key)
+        # 记录锁属于整个进程，先用线程锁让进程内同一分段只有一个线程去争用
+        with self._locks[stripe]:
+            if self.path is None:
+                yield
+                return
+            fd = self._get_fd()
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, 1, stripe)
+
+
+# 进程内所有 SingleFlight 实例（用于统计）
+_single_flights: List["SingleFlight"] = []
+
+
+class _Flight:
+    """一次进行中的调用"""
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    请求合并（single-flight）
+
+    同一个键同时只执行一次调用：调用进行中时到达的相同请求不再重复执行，
+    等待并共享这次调用的结果（或异常）。调用结束后立即忘记这个键，
+    之后的请求重新执行（结果缓存由调用方另行负责）。
+
+    共享的结果是同一个对象，调用方不应修改。
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        """
+        初始化
+
+        Args:
+            name: 名称（用于统计）
+            enabled: 是否启用，关闭时每次调用都直接执行
+        """
+        self.name = name
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.executed = 0
+        self.shared = 0
+        # fork 时其他线程可能持有锁或有进行中的调用，子进程重新初始化
+        os.register_at_fork(after_in_child=self._after_fork)
+        _single_flights.append(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}
+
+    def do(self, key: str, func: Callable[[], T]) -> T:
+        """
+        执行调用，相同键的并发调用只执行一次
+
+        Args:
+            key: 调用键（参数完全相同的调用应得到相同的键）
+            func: 实际执行的函数
+
+        Returns:
+            func 的返回值（可能来自其他线程的调用）
+        """
+        if not self.enabled:
+            return func()
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def ado(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        do 的异步版本（在同一个事件循环内合并）
+
+        执行调用的协程被取消时，等待它的请求也会收到 CancelledError。
+
+        Args:
+            key: 调用键
+            func: 返回协程的函数
+
+        Returns:
+            协程的返回值
+        """
+        if not self.enabled:
+            return await func()
+
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        future = self._async_flights.get(flight_key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        # 没有其他请求等待时，异常不会被取出，避免事件循环打印警告
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._async_flights[flight_key] = future
+        self.executed += 1
+        try:
+            result = await func()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._async_flights.get(flight_key) is future:
+                del self._async_flights[flight_key]
+
+    def snapshot(self) -> Dict[str, int]:
+        """统计快照：实际执行次数和共享结果的请求数"""
+        return {"executed": self.executed, "shared": self.shared}
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """各 SingleFlight 实例的统计"""
+    return {flight.name: flight.snapshot() for flight in _single_flights}
@@ -0,0 +1,89 @@
+"""Token 计数与截断（提示词预算用）"""
+import math
+from functools import lru_cache
+from backend.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # 随 langchain-openai 安装，缺失时按字符数估算
+    tiktoken = None
+
+# 没有分词器时的估算：ASCII 约 4 个字符一个 token，其他字符（中文等）一个字符一个 token
+_ASCII_TOKENS_PER_CHAR = 0.25
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """
+    获取分词器（进程内只加载一次）
+
+    按 OPENAI_MODEL 选择编码，非 OpenAI 模型使用 cl100k_base。编码文件首次使用时需要下载，
+    下载失败（离线环境）或未安装 tiktoken 时返回 None，改用字符估算。
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(settings.openai_model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"加载分词器失败，按字符数估算 token: {e}")
+        return None
+
+
+def _estimate_tokens(text: str) -> int:
+    """按字符估算 token 数"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return len(text) - ascii_chars + math.ceil(ascii_chars * _ASCII_TOKENS_PER_CHAR)
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """
+    计算文本的 token 数
+
+    检索片段和对话历史在相邻几轮对话中反复出现，结果按文本缓存。
+
+    Args:
+        text: 文本
+
+    Returns:
+        token 数
+    """
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return _estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    截断文本，保留开头不超过 max_tokens 个 token 的部分
+
+    同样的输入总是得到同样的结果。
+
+    Args:
+        text: 文本
+        max_tokens: 最多保留的 token 数
+
+    Returns:
+        截断后的文本
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        used = 0.0
+        for i, ch in enumerate(text):
+            used += _ASCII_TOKENS_PER_CHAR if ord(ch) < 128 else 1
+            if math.ceil(used) > max_tokens:
+                return text[:i]
+        return text
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    # 截断位置可能落在多字节字符中间，去掉解码出的残缺字符
+    return encoding.decode(tokens[:max_tokens]).rstrip("\ufffd")
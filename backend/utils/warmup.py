@@ -0,0 +1,102 @@
+"""服务启动预热"""
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+
+class Warmup:
+    """
+    启动预热
+
+    按注册顺序在后台线程中执行预热步骤并记录每一步的状态。所有步骤都成功后
+    才算就绪，供 /readyz 使用；有步骤失败时保持未就绪，避免负载均衡把流量
+    转给无法正常服务的实例。失败的步骤（如依赖的服务暂时不可用）按指数退避
+    不断重试，成功后实例自动变为就绪。
+    """
+
+    def __init__(self, retry_interval: float = 5.0, max_retry_interval: float = 300.0):
+        """
+        初始化预热任务
+
+        Args:
+            retry_interval: 失败步骤第一次重试前等待的秒数，之后每次翻倍（0 表示不重试）
+            max_retry_interval: 重试间隔上限（秒）
+        """
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self._steps: List[Tuple[str, Callable[[], None]]] = []
+        self._status: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+
+    def add_step(self, name: str, func: Callable[[], None]):
+        """
+        注册预热步骤
+
+        Args:
+            name: 步骤名称
+            func: 预热函数
+        """
+        self._steps.append((name, func))
+        self._status[name] = {"status": "pending"}
+
+    def _run_step(self, name: str, func: Callable[[], None]):
+        """执行单个步骤并记录状态"""
+        with self._lock:
+            attempts = self._status[name].get("attempts", 0) + 1
+            self._status[name] = {"status": "running", "attempts": attempts}
+        start = time.perf_counter()
+        try:
+            func()
+            status = {"status": "done"}
+        except Exception as e:
+            print(f"预热 {name} 失败（第 {attempts} 次）: {e}")
+            status = {"status": "failed", "error": str(e)}
+        status["attempts"] = attempts
+        status["seconds"] = round(time.perf_counter() - start, 3)
+        with self._lock:
+            self._status[name] = status
+
+    def _failed_steps(self) -> List[Tuple[str, Callable[[], None]]]:
+        with self._lock:
+            return [(name, func) for name, func in self._steps if self._status[name]["status"] == "failed"]
+
+    def run(self):
+        """依次执行所有预热步骤，之后按指数退避重试失败的步骤直到全部成功"""
+        for name, func in self._steps:
+            self._run_step(name, func)
+        self._done.set()
+
+        delay = self.retry_interval
+        failed = self._failed_steps()
+        while failed and delay > 0:
+            print(f"服务预热部分步骤失败，{delay:g} 秒后重试: {', '.join(name for name, _ in failed)}")
+            time.sleep(delay)
+            # 按注册顺序重试，依赖的步骤先恢复
+            for name, func in failed:
+                self._run_step(name, func)
+            failed = self._failed_steps()
+            delay = min(delay * 2, self.max_retry_interval)
+        print("服务预热完成" if not failed else "服务预热结束，部分步骤失败")
+
+    def start(self):
+        """在后台线程中执行预热（重复调用无效）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    @property
+    def done(self) -> bool:
+        """第一轮预热是否已结束（无论成功与否，失败的步骤之后仍会重试）"""
+        return self._done.is_set()
+
+    @property
+    def ready(self) -> bool:
+        """预热是否已全部成功"""
+        return self.done and all(step["status"] == "done" for step in self.snapshot().values())
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """各步骤状态"""
+        with self._lock:
+            return {name: dict(status) for name, status in self._status.items()}
@@ -0,0 +1,69 @@
+"""
+查询嵌入微批处理基准：并发逐条嵌入 vs 微批处理
+
+运行方式（在项目根目录，首次运行会下载模型）：
+    python -m benchmarks.bench_embed_batching --concurrency 16 --queries 50 --max-wait-ms 2
+"""
+import argparse
+import statistics
+import threading
+import time
+
+
+def run_load(embed_query, concurrency: int, queries: int):
+    """concurrency 个线程各发起 queries 次查询嵌入，返回 (总耗时, 每次延迟列表)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(worker_id: int):
+        local = []
+        for i in range(queries):
+            start = time.perf_counter()
+            embed_query(f"用户 {worker_id} 的第 {i} 个问题：利率上升对债券价格有什么影响？")
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+
+def report(name: str, elapsed: float, latencies):
+    """打印吞吐和延迟分位数"""
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{name:8s} {len(latencies) / elapsed:9.1f} queries/sec  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询嵌入微批处理基准")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="模型名称")
+    parser.add_argument("--backend", default="torch", help="推理后端")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发线程数")
+    parser.add_argument("--queries", type=int, default=50, help="每个线程的查询数")
+    parser.add_argument("--max-wait-ms", type=float, default=2, help="微批等待时间（毫秒）")
+    parser.add_argument("--max-batch-size", type=int, default=32, help="单批最多条数")
+    args = parser.parse_args()
+
+    from backend.utils.embeddings import MicroBatcher, create_local_embeddings
+
+    model = create_local_embeddings(args.model, backend=args.backend, device="cpu")
+    model.embed_documents(["预热"] * 8)
+
+    elapsed, latencies = run_load(model.embed_query, args.concurrency, args.queries)
+    report("逐条嵌入", elapsed, latencies)
+
+    batcher = MicroBatcher(model.embed_documents, args.max_batch_size, args.max_wait_ms / 1000)
+    elapsed, latencies = run_load(lambda text: batcher.submit(text).result(), args.concurrency, args.queries)
+    report("微批处理", elapsed, latencies)
+    print(f"批处理统计: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
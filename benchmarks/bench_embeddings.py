@@ -0,0 +1,75 @@
+"""
+本地嵌入推理后端吞吐基准（texts/sec）
+
+对同一批语料分别使用各推理后端嵌入，并与第一个后端的结果比较余弦相似度，
+用于确认量化模型的精度损失可以接受。
+
+运行方式（在项目根目录，首次运行会下载模型）：
+    python -m benchmarks.bench_embeddings --backends torch,onnx,onnx-int8 --texts 512 --threads 4
+"""
+import argparse
+import time
+import numpy as np
+
+TOPICS = ["通货膨胀", "利率", "汇率", "国内生产总值", "货币政策", "财政政策", "债券收益率",
+          "股票估值", "供给与需求", "边际效用", "机会成本", "存款准备金率"]
+TEMPLATES = [
+    "{topic}是宏观经济学中的重要概念，它与就业、产出和价格水平密切相关。",
+    "请解释{topic}的定义，并举一个现实生活中的例子。",
+    "当{topic}发生变化时，企业和家庭的决策会受到怎样的影响？",
+    "{topic}的衡量方法有哪些，各自有什么优缺点？",
+]
+
+
+def build_corpus(size: int):
+    """生成测试语料（长短不一的中文金融文本）"""
+    texts = []
+    for i in range(size):
+        topic = TOPICS[i % len(TOPICS)]
+        template = TEMPLATES[(i // len(TOPICS)) % len(TEMPLATES)]
+        repeat = 1 + i % 3
+        texts.append(" ".join([template.format(topic=topic)] * repeat))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地嵌入推理后端吞吐基准")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="模型名称")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8", help="逗号分隔的推理后端")
+    parser.add_argument("--device", default="cpu", help="推理设备（CUDA 不可用时回退到 CPU）")
+    parser.add_argument("--threads", type=int, default=0, help="推理线程数（0 为库默认值）")
+    parser.add_argument("--texts", type=int, default=512, help="语料条数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    from backend.utils.embeddings import create_local_embeddings
+
+    corpus = build_corpus(args.texts)
+    baseline = None
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        try:
+            embeddings = create_local_embeddings(args.model, backend=backend, device=args.device,
+                                                 threads=args.threads)
+        except Exception as e:
+            print(f"{backend:10s} 无法加载: {e}")
+            continue
+
+        embeddings.embed_documents(corpus[:8])  # 预热
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            vectors = np.asarray(embeddings.embed_documents(corpus), dtype=np.float32)
+            best = min(best, time.perf_counter() - start)
+
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        if baseline is None:
+            baseline, agreement = vectors, 1.0
+        else:
+            agreement = float(np.mean(np.sum(baseline * vectors, axis=1)))
+
+        print(f"{backend:10s} {len(corpus) / best:9.1f} texts/sec  "
+              f"与第一个后端的平均余弦相似度 {agreement:.4f}")
+
+
+if __name__ == "__main__":
+    main()
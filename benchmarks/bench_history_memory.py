@@ -0,0 +1,73 @@
+"""
+对话历史内存占用基准：LangChain 消息对象 vs CompactHistory
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_history_memory --conversations 200 --turns 20
+"""
+import argparse
+import gc
+import tracemalloc
+
+
+def measure(build) -> int:
+    """返回 build() 构造的对象占用的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对话历史内存占用基准")
+    parser.add_argument("--conversations", type=int, default=200, help="对话数量")
+    parser.add_argument("--turns", type=int, default=20, help="每个对话的轮数")
+    args = parser.parse_args()
+
+    from langchain_core.chat_history import InMemoryChatMessageHistory
+    from backend.models.conversation_store import CompactHistory
+
+    # 文本在计时外生成，两种方案共享同一批字符串，只比较容器本身的开销
+    texts = [
+        (f"请问第{i}个问题：什么是国内生产总值（GDP）？", f"好问题！先想一想，第{i}个例子里哪些支出会计入 GDP？")
+        for i in range(args.turns)
+    ]
+    total_turns = args.conversations * args.turns
+
+    def build_langchain():
+        histories = []
+        for _ in range(args.conversations):
+            history = InMemoryChatMessageHistory()
+            for question, answer in texts:
+                history.add_user_message(question)
+                history.add_ai_message(answer)
+            histories.append(history)
+        return histories
+
+    def build_compact():
+        histories = []
+        message_id = 0
+        for _ in range(args.conversations):
+            history = CompactHistory()
+            for question, answer in texts:
+                message_id += 2
+                history.append(message_id - 1, "human", question)
+                history.append(message_id, "ai", answer)
+            histories.append(history)
+        return histories
+
+    langchain_bytes = measure(build_langchain)
+    compact_bytes = measure(build_compact)
+
+    print(f"对话数: {args.conversations}, 每个对话轮数: {args.turns}（不含共享文本本身）")
+    print(f"LangChain 消息对象: {langchain_bytes / total_turns:8.1f} 字节/轮")
+    print(f"CompactHistory:     {compact_bytes / total_turns:8.1f} 字节/轮")
+    print(f"节省: {(1 - compact_bytes / langchain_bytes) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+pre-fork 内存基准：master 预加载嵌入模型 vs 每个 worker 各自加载
+
+用不同的 worker 数启动 python -m backend.serve，每个 worker 完成一次检索（触发嵌入模型加载）后，
+统计 master 与全部 worker 的 PSS（按共享进程数分摊后的内存）之和。
+
+运行方式（在项目根目录，仅 Linux）：
+    python -m benchmarks.bench_prefork_memory --workers 1,2,4
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+
+def pss_mb(pid: int) -> float:
+    """进程 PSS（MB）"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return 0.0
+
+
+def children_of(pid: int):
+    """直接子进程 PID"""
+    result = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            result.extend(int(child) for child in f.read().split())
+    return result
+
+
+def request(url: str, payload=None, timeout: float = 5.0):
+    """发送请求并解析 JSON"""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def measure(workers: int, port: int, preload: bool, settle: float, timeout: float) -> float:
+    """启动服务、让每个 worker 处理检索请求，返回 PSS 合计（MB）"""
+    command = [sys.executable, "-m", "backend.serve", "--workers", str(workers), "--port", str(port)]
+    if not preload:
+        command.append("--no-preload")
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                request(f"{base}/healthz")
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("服务启动失败")
+                time.sleep(0.5)
+
+        query = urllib.parse.urlencode({"query": "什么是通货膨胀", "k": 3})
+        # 连接由内核分配给各 worker，多发一些请求让每个 worker 都加载过嵌入模型
+        for _ in range(workers * 4):
+            try:
+                request(f"{base}/api/knowledge/search?{query}", {}, timeout=timeout)
+            except OSError:
+                pass
+        time.sleep(settle)
+        return pss_mb(process.pid) + sum(pss_mb(child) for child in children_of(process.pid))
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pre-fork 内存基准")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的 worker 数")
+    parser.add_argument("--port", type=int, default=8765, help="测试端口")
+    parser.add_argument("--settle", type=float, default=3.0, help="统计前等待秒数")
+    parser.add_argument("--timeout", type=float, default=120.0, help="启动超时秒数")
+    args = parser.parse_args()
+
+    for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+        shared = measure(workers, args.port, True, args.settle, args.timeout)
+        separate = measure(workers, args.port, False, args.settle, args.timeout)
+        print(f"{workers} 个 worker  预加载 PSS {shared:8.1f} MB  各自加载 PSS {separate:8.1f} MB  "
+              f"节省 {separate - shared:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
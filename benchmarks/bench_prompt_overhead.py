@@ -0,0 +1,67 @@
+"""
+每轮对话的 Python 侧开销基准：每次请求重建提示词和链 vs 预编译复用
+
+使用假模型替代真实 LLM，测得的时间不包含网络耗时。
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_prompt_overhead --iterations 2000
+"""
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示词预编译基准")
+    parser.add_argument("--iterations", type=int, default=2000, help="每种场景的调用次数")
+    args = parser.parse_args()
+
+    from langchain.prompts import ChatPromptTemplate
+    from langchain.schema import AIMessage, HumanMessage
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from backend.modules import prompts
+
+    llm = FakeListChatModel(responses=['{"intent": "learn", "confidence": 0.9, "topic": "GDP"}'])
+    chat_history = [HumanMessage(content="什么是GDP？"), AIMessage(content="你觉得哪些支出会计入 GDP？")] * 5
+
+    cases = {
+        "intent": (prompts.INTENT_PROMPT_MESSAGES, {"user_input": "什么是GDP？"}),
+        "learn": (prompts.LEARN_PROMPT_MESSAGES, {
+            "learning_context": "当前学习主题: GDP",
+            "knowledge": "GDP 是一个国家在一定时期内生产的全部最终产品和服务的市场价值。",
+            "chat_history": chat_history,
+            "user_input": "什么是GDP？"
+        }),
+        "review": (prompts.REVIEW_PROMPT_MESSAGES, {
+            "topics": "GDP, 通货膨胀",
+            "mastery_levels": "{'GDP': 40.0}",
+            "weak_points": "无",
+            "knowledge": "通货膨胀是一般物价水平的持续上涨。",
+            "user_input": "帮我复习一下"
+        }),
+        "grading": (prompts.GRADING_PROMPT_MESSAGES, {"topic": "GDP", "answer": "GDP 包括消费、投资、政府支出和净出口"}),
+        "chat": (prompts.CHAT_PROMPT_MESSAGES, {
+            "search_results": "",
+            "chat_history": chat_history,
+            "user_input": "你好"
+        }),
+    }
+
+    print(f"{'场景':<10}{'每次重建 (us)':>16}{'预编译 (us)':>16}{'节省':>10}")
+    for name, (messages, inputs) in cases.items():
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            chain = ChatPromptTemplate.from_messages(messages) | llm
+            chain.invoke(inputs)
+        rebuild_us = (time.perf_counter() - start) / args.iterations * 1e6
+
+        chain = ChatPromptTemplate.from_messages(messages) | llm
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            chain.invoke(inputs)
+        compiled_us = (time.perf_counter() - start) / args.iterations * 1e6
+
+        print(f"{name:<10}{rebuild_us:>16.1f}{compiled_us:>16.1f}{(1 - compiled_us / rebuild_us) * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+多查询检索基准：逐个知识点检索 vs 批量嵌入 + 一次多查询检索
+
+用合成文档块建一个临时的 ChromaDB 集合，对比复习时按 N 个知识点逐个调用
+embed_query + query 与一次 embed_documents + 多查询 query 的延迟。
+
+运行方式（在项目根目录，首次运行会下载模型）：
+    python -m benchmarks.bench_search_many --topics 3 --docs 5000
+"""
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+
+TOPICS = ["通货膨胀", "利率", "债券价格", "GDP", "汇率", "货币政策", "财政政策", "股票估值"]
+
+
+def measure(fn, rounds: int):
+    """返回 (p50, p99) 毫秒"""
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多查询检索基准")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="模型名称")
+    parser.add_argument("--backend", default="torch", help="推理后端")
+    parser.add_argument("--topics", type=int, default=3, help="每次检索的知识点数量")
+    parser.add_argument("--docs", type=int, default=5000, help="文档块数量")
+    parser.add_argument("--k", type=int, default=3, help="每个知识点返回数量")
+    parser.add_argument("--rounds", type=int, default=100, help="重复次数")
+    args = parser.parse_args()
+
+    from backend.models.vector_store import ChromaVectorStore
+    from backend.modules.rag import merge_hits
+    from backend.utils.embeddings import create_local_embeddings
+
+    model = create_local_embeddings(args.model, backend=args.backend, device="cpu")
+    topics = [TOPICS[i % len(TOPICS)] for i in range(args.topics)]
+
+    root = tempfile.mkdtemp(prefix="bench_search_many_")
+    try:
+        store = ChromaVectorStore(root, "bench_collection")
+        texts = [f"{TOPICS[i % len(TOPICS)]} 相关的第 {i} 个文档块" for i in range(args.docs)]
+        for begin in range(0, args.docs, 1000):
+            part = texts[begin:begin + 1000]
+            store.add([f"chunk-{begin + i}" for i in range(len(part))], part,
+                      model.embed_documents(part), [{"source": "bench"} for _ in part])
+
+        def serial():
+            return [store.query([model.embed_query(topic)], args.k)[0] for topic in topics]
+
+        def batched():
+            return merge_hits(store.query(model.embed_documents(topics), args.k))
+
+        serial()
+        batched()
+        for name, fn in (("逐个检索", serial), ("批量检索", batched)):
+            p50, p99 = measure(fn, args.rounds)
+            print(f"{name} {args.topics} 个知识点  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
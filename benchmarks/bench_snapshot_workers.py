@@ -0,0 +1,104 @@
+"""
+多 worker 内存基准：每个 worker 打开 ChromaDB vs 共享只读快照
+
+模拟 N 个 worker 进程同时打开同一个知识库并检索，统计每个进程的
+USS（独占内存）和 PSS（按共享进程数分摊后的内存）。
+
+运行方式（在项目根目录，仅 Linux）：
+    python -m benchmarks.bench_snapshot_workers --workers 4 --docs 50000
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+from benchmarks.bench_vector_store import make_data
+
+
+def memory_kb():
+    """返回 (USS, PSS)，单位 KB"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(":")] = int(parts[1])
+    uss = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return uss, values.get("Pss", 0)
+
+
+def open_store(backend: str, path: str):
+    """按名称创建存储"""
+    from backend.models.vector_store import ChromaVectorStore, SnapshotVectorStore
+
+    if backend == "chroma":
+        return ChromaVectorStore(path, "bench_collection")
+    return SnapshotVectorStore(path, dtype="float16")
+
+
+def build(backend: str, path: str, docs: int, dim: int):
+    """建库（快照存储只发布一个版本）"""
+    vectors, _ = make_data(docs, dim, 1)
+    store = open_store(backend, path)
+    with store.batch():
+        for begin in range(0, docs, 2000):
+            end = min(begin + 2000, docs)
+            store.add([f"chunk-{i}" for i in range(begin, end)],
+                      [f"文档块 {i}" for i in range(begin, end)],
+                      vectors[begin:end].tolist(),
+                      [{"source": f"doc-{i // 50}.pdf"} for i in range(begin, end)])
+
+
+def worker(backend: str, path: str, docs: int, dim: int, queries: int, ready, done, result):
+    """worker 进程：打开存储、检索，等所有 worker 都就绪后统计内存"""
+    _, query_vectors = make_data(docs, dim, queries)
+    baseline_uss, baseline_pss = memory_kb()
+    store = open_store(backend, path)
+    for query in query_vectors:
+        store.query([query.tolist()], 10)
+    ready.wait()  # 所有 worker 同时映射时 PSS 才能反映共享情况
+    uss, pss = memory_kb()
+    result.put(((uss - baseline_uss) / 1024, (pss - baseline_pss) / 1024))
+    done.wait()
+
+
+def measure(backend: str, path: str, workers: int, docs: int, dim: int, queries: int):
+    """启动 workers 个进程，返回平均 (USS, PSS) 增量（MB）"""
+    context = multiprocessing.get_context("spawn")
+    ready, done = context.Barrier(workers + 1), context.Event()
+    result = context.Queue()
+    processes = [context.Process(target=worker, args=(backend, path, docs, dim, queries, ready, done, result))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    ready.wait()
+    samples = [result.get() for _ in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    return (sum(s[0] for s in samples) / workers, sum(s[1] for s in samples) / workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 内存基准")
+    parser.add_argument("--backends", default="chroma,snapshot", help="逗号分隔的后端")
+    parser.add_argument("--workers", type=int, default=4, help="worker 进程数")
+    parser.add_argument("--docs", type=int, default=50000, help="文档块数量")
+    parser.add_argument("--dim", type=int, default=384, help="向量维度")
+    parser.add_argument("--queries", type=int, default=50, help="每个 worker 的查询数")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_snapshot_")
+    try:
+        for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            path = os.path.join(root, backend)
+            build(backend, path, args.docs, args.dim)
+            uss, pss = measure(backend, path, args.workers, args.docs, args.dim, args.queries)
+            print(f"{backend:9s} {args.workers} 个 worker，每个 worker: USS +{uss:7.1f} MB  PSS +{pss:7.1f} MB  "
+                  f"合计 PSS +{pss * args.workers:7.1f} MB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
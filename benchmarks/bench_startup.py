@@ -0,0 +1,83 @@
+"""
+服务启动耗时基准：导入耗时、/healthz 可用时间、/readyz 就绪时间
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_startup --repeat 3
+
+/readyz 需要所有服务初始化成功（需要配置 OPENAI_API_KEY 和嵌入模型），
+否则只统计到 /healthz。
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+
+
+def measure_import() -> float:
+    """在新进程中测量导入 backend.main 的耗时"""
+    code = ("import time; start = time.perf_counter(); import backend.main; "
+            "print(time.perf_counter() - start)")
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    """获取一个空闲端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_server(timeout: float):
+    """启动 uvicorn，返回 (/healthz 可用耗时, /readyz 就绪耗时或 None, 最后一次 /readyz 响应)"""
+    port = free_port()
+    env = dict(os.environ, WARMUP_ON_STARTUP="true")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    healthy_at, ready_at, last_ready = None, None, None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if healthy_at is None:
+                    if httpx.get(f"{base_url}/healthz", timeout=1.0).status_code == 200:
+                        healthy_at = time.perf_counter() - start
+                else:
+                    response = httpx.get(f"{base_url}/readyz", timeout=1.0)
+                    last_ready = response.json()
+                    if response.status_code == 200:
+                        ready_at = time.perf_counter() - start
+                        break
+            except httpx.TransportError:
+                pass
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait()
+    return healthy_at, ready_at, last_ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数")
+    parser.add_argument("--timeout", type=float, default=60, help="等待就绪的最长时间（秒）")
+    args = parser.parse_args()
+
+    import_times = [measure_import() for _ in range(args.repeat)]
+    print(f"导入 backend.main: {min(import_times) * 1000:8.1f} ms")
+
+    for i in range(args.repeat):
+        healthy_at, ready_at, last_ready = measure_server(args.timeout)
+        healthy = f"{healthy_at * 1000:8.1f} ms" if healthy_at is not None else "     超时"
+        ready = f"{ready_at * 1000:8.1f} ms" if ready_at is not None else f"未就绪 {last_ready}"
+        print(f"第 {i + 1} 次启动: /healthz {healthy}, /readyz {ready}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+向量存储基准：ChromaDB vs 进程内存储（float16 / int8 / HNSW）
+
+使用合成的归一化向量（不需要嵌入模型），以 float32 精确检索结果为基准计算召回率。
+每个后端在独立的子进程中先建库，再在另一个子进程中打开并检索，
+统计的内存为检索进程打开存储并完成检索后的 RSS 增量。
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_vector_store --docs 50000 --dim 384 --queries 200
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import numpy as np
+
+
+def rss_mb() -> float:
+    """当前进程常驻内存（MB，仅 Linux）"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def make_data(docs: int, dim: int, queries: int, seed: int = 0):
+    """生成带簇结构的归一化向量（比纯随机向量更接近真实嵌入）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(docs // 200, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), docs)] + 0.6 * rng.normal(size=(docs, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = rng.integers(0, docs, queries)
+    query_vectors = vectors[picks] + 0.3 * rng.normal(size=(queries, dim)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+
+def open_store(backend: str, path: str):
+    """按名称创建存储"""
+    from backend.models.vector_store import ChromaVectorStore, LocalVectorStore
+
+    if backend == "chroma":
+        return ChromaVectorStore(path, "bench_collection")
+    if backend == "local-f16":
+        return LocalVectorStore(path, dtype="float16")
+    if backend == "local-i8":
+        return LocalVectorStore(path, dtype="int8")
+    if backend == "local-hnsw":
+        return LocalVectorStore(path, dtype="float16", hnsw_threshold=1)
+    raise ValueError(backend)
+
+
+def build(backend: str, path: str, docs: int, dim: int, queries: int, result):
+    """子进程：建库"""
+    vectors, _ = make_data(docs, dim, queries)
+    store = open_store(backend, path)
+    start = time.perf_counter()
+    for begin in range(0, docs, 2000):
+        end = min(begin + 2000, docs)
+        store.add([f"chunk-{i}" for i in range(begin, end)],
+                  [f"文档块 {i}" for i in range(begin, end)],
+                  vectors[begin:end].tolist(),
+                  [{"source": f"doc-{i // 50}.pdf", "chunk_index": i % 50} for i in range(begin, end)])
+    result.put(time.perf_counter() - start)
+
+
+def serve(backend: str, path: str, docs: int, dim: int, queries: int, k: int, result):
+    """子进程：打开存储并检索"""
+    vectors, query_vectors = make_data(docs, dim, queries)
+    truth = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+    del vectors
+
+    baseline = rss_mb()
+    store = open_store(backend, path)
+    store.query([query_vectors[0].tolist()], k)  # 预热（HNSW 在这里构建）
+
+    latencies, recalls = [], []
+    for query, expected in zip(query_vectors, truth):
+        start = time.perf_counter()
+        hits = store.query([query.tolist()], k)[0]
+        latencies.append(time.perf_counter() - start)
+        found = {int(hit.id.split("-")[1]) for hit in hits}
+        recalls.append(len(found & set(expected.tolist())) / k)
+    result.put({
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": sorted(latencies)[int(len(latencies) * 0.99) - 1] * 1000,
+        "recall": float(np.mean(recalls)),
+        "rss_mb": rss_mb() - baseline
+    })
+
+
+def run_in_child(target, *args):
+    """在独立子进程中运行并取回结果"""
+    context = multiprocessing.get_context("spawn")
+    result = context.Queue()
+    process = context.Process(target=target, args=(*args, result))
+    process.start()
+    value = result.get()
+    process.join()
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量存储基准")
+    parser.add_argument("--backends", default="chroma,local-f16,local-i8,local-hnsw", help="逗号分隔的后端")
+    parser.add_argument("--docs", type=int, default=50000, help="文档块数量")
+    parser.add_argument("--dim", type=int, default=384, help="向量维度")
+    parser.add_argument("--queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--k", type=int, default=10, help="每次检索返回数量")
+    args = parser.parse_args()
+
+    from backend.models import vector_store
+
+    root = tempfile.mkdtemp(prefix="bench_vector_store_")
+    try:
+        for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            if backend == "local-hnsw" and vector_store.hnswlib is None:
+                print(f"{backend:11s} 跳过（未安装 hnswlib）")
+                continue
+            path = os.path.join(root, backend)
+            build_seconds = run_in_child(build, backend, path, args.docs, args.dim, args.queries)
+            stats = run_in_child(serve, backend, path, args.docs, args.dim, args.queries, args.k)
+            print(f"{backend:11s} 建库 {build_seconds:6.1f} s  p50 {stats['p50_ms']:7.2f} ms  "
+                  f"p99 {stats['p99_ms']:7.2f} ms  recall@{args.k} {stats['recall']:.3f}  "
+                  f"RSS +{stats['rss_mb']:6.1f} MB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+联网搜索基准：每次新建连接 vs 共享连接池 vs 结果缓存
+
+在本地启动一个模拟 Tavily 接口的 HTTP 服务（第一次请求返回 503 以验证重试），
+不会访问外网。
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_web_search --requests 50 --latency-ms 20
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def start_stand_in_server(latency: float) -> ThreadingHTTPServer:
+    """启动模拟 Tavily 的本地服务"""
+    state = {"requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state["requests"] += 1
+            time.sleep(latency)
+            if state["requests"] == 1:
+                payload, status = b"{}", 503
+            else:
+                payload, status = json.dumps({"results": [{
+                    "title": f"关于 {body['query']} 的报道",
+                    "url": "https://example.com/news",
+                    "content": "央行宣布下调存款准备金率。",
+                    "score": 0.9
+                }]}, ensure_ascii=False).encode("utf-8"), 200
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="联网搜索基准")
+    parser.add_argument("--requests", type=int, default=50, help="每种场景的请求数")
+    parser.add_argument("--latency-ms", type=float, default=20, help="模拟服务的处理延迟")
+    args = parser.parse_args()
+
+    server = start_stand_in_server(args.latency_ms / 1000)
+    url = f"http://127.0.0.1:{server.server_address[1]}/search"
+    os.environ["TAVILY_API_KEY"] = "bench"
+    os.environ["TAVILY_BASE_URL"] = url
+    os.environ["HTTP_RETRY_BACKOFF"] = "0.01"
+
+    import httpx
+    from backend.modules.tools import WebSearchTool
+
+    tool = WebSearchTool()
+
+    # 第一次请求会收到 503，验证重试后成功
+    results = tool.search("最新 新闻 预热")
+    assert "error" not in results[0], results
+    print(f"重试验证: 服务端共收到 {server.state['requests']} 次请求，最终成功")
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        httpx.post(url, json={"query": f"fresh {i}"}, timeout=10.0).raise_for_status()
+    fresh_ms = (time.perf_counter() - start) / args.requests * 1000
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        tool.search(f"pooled {i}")
+    pooled_ms = (time.perf_counter() - start) / args.requests * 1000
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        tool.search("  最新 新闻  " if i % 2 else "最新 新闻")
+    cached_ms = (time.perf_counter() - start) / args.requests * 1000
+
+    print(f"每次新建连接: {fresh_ms:7.2f} ms/次")
+    print(f"共享连接池:   {pooled_ms:7.2f} ms/次")
+    print(f"重复查询缓存: {cached_ms:7.2f} ms/次")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+工作流初始化耗时基准：延迟创建 Agent vs 启动时立即创建
+
+运行方式（在项目根目录，需要配置 OPENAI_API_KEY，不会发起网络请求）：
+    python -m benchmarks.bench_workflow_init --repeat 5
+"""
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工作流初始化耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    args = parser.parse_args()
+
+    from backend.modules.workflow import TeachingWorkflow
+
+    lazy_times, eager_times = [], []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        TeachingWorkflow()
+        lazy_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        workflow = TeachingWorkflow()
+        workflow.agent  # 模拟旧实现：启动时立即创建 ReAct Agent
+        eager_times.append(time.perf_counter() - start)
+
+    print(f"延迟创建 Agent: {min(lazy_times) * 1000:8.1f} ms")
+    print(f"立即创建 Agent: {min(eager_times) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
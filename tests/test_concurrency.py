@@ -0,0 +1,83 @@
+"""并发更新测试：多个 worker 进程、每个进程多个线程同时更新同一用户，不能丢失更新"""
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.config import settings
+
+PROCESSES = 4
+THREADS = 4
+UPDATES = 10
+USER_ID = "stress_user"
+
+
+def _setup():
+    """子进程：创建数据库"""
+    from backend.models.database import LearningProgressDB
+    from backend.modules.memory import MemoryManager
+
+    LearningProgressDB()
+    MemoryManager()
+
+
+def _worker(process_index: int):
+    """子进程：模拟一个 worker，多个线程并发更新进度、保存对话"""
+    from backend.models.database import LearningProgressDB
+    from backend.models.schemas import ProgressUpdate
+    from backend.modules.memory import MemoryManager
+
+    db = LearningProgressDB()
+    manager = MemoryManager()
+
+    def run(thread_index: int):
+        for i in range(UPDATES):
+            tag = f"{process_index}-{thread_index}-{i}"
+            db.update_user_progress(USER_ID, ProgressUpdate(
+                topic="GDP", score=0, is_correct=False, question=f"q-{tag}", answer="a"
+            ))
+            manager.save_turn(USER_ID, None, f"q-{tag}", f"a-{tag}")
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(run, range(THREADS)))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 fork")
+def test_no_lost_updates_across_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "learning_progress_db_path", str(tmp_path / "progress"))
+    monkeypatch.setattr(settings, "conversation_store_backend", "sqlite")
+    monkeypatch.setattr(settings, "conversation_db_path", str(tmp_path / "conversations.sqlite3"))
+    monkeypatch.setattr(settings, "conversation_summary_enabled", False)
+
+    context = multiprocessing.get_context("fork")
+
+    # 先在单独的进程中建好数据库文件（与已部署的服务一致），worker 之间只竞争读写；
+    # 测试进程本身在 fork 前不能打开 ChromaDB 客户端，否则子进程可能卡死
+    setup = context.Process(target=_setup)
+    setup.start()
+    setup.join(timeout=120)
+    assert setup.exitcode == 0
+
+    processes = [context.Process(target=_worker, args=(i,)) for i in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=300)
+        assert process.exitcode == 0
+
+    from backend.models.database import LearningProgressDB
+    from backend.modules.memory import MemoryManager
+
+    total = PROCESSES * THREADS * UPDATES
+
+    # 每次更新都记录了一条不同的错题，丢失更新会导致数量不足
+    progress = LearningProgressDB().get_user_progress(USER_ID)
+    assert len(progress.weak_points) == total
+
+    # 每轮问答必须相邻写入
+    records = MemoryManager().conversation_store.read_recent(f"{USER_ID}_default", total * 2)
+    assert len(records) == total * 2
+    for human, ai in zip(records[0::2], records[1::2]):
+        assert (human.role, ai.role) == ("human", "ai")
+        assert human.content[1:] == ai.content[1:]
@@ -0,0 +1,46 @@
+"""提示词组装测试：检索片段占满预算时仍保留最新一轮对话和之前对话的摘要"""
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from backend.config import settings
+from backend.modules.context import assemble_context, count_message_tokens
+from backend.modules.prompts import LEARN_PROMPT
+
+BUDGET = 3000
+INPUTS = {"learning_context": "当前学习主题: GDP", "user_input": "那净出口为什么可以是负数？"}
+
+# 默认分块大小（1000 字）的 3 个检索片段
+KNOWLEDGE = [f"片段{i}：" + "国内生产总值衡量一定时期内生产的全部最终产品和服务的市场价值。" * 32 for i in range(3)]
+SUMMARY = SystemMessage(content="之前对话的摘要：\n学生已经理解 GDP 的定义，正在学习支出法。")
+HISTORY = [
+    SUMMARY,
+    HumanMessage(content="什么是 GDP？"),
+    AIMessage(content="你觉得一个国家一年里生产的东西应该怎么加总？"),
+    HumanMessage(content="支出法包括哪些部分？"),
+    AIMessage(content="消费、投资、政府购买和净出口。你觉得哪一项最大？"),
+]
+
+
+def test_knowledge_does_not_crowd_out_latest_turn():
+    context = assemble_context(LEARN_PROMPT, INPUTS, knowledge=KNOWLEDGE, history=HISTORY, budget=BUDGET)
+    kept = context.inputs["chat_history"]
+
+    # 摘要和最新一轮完整保留，检索片段用剩余的预算
+    assert kept[0] == SUMMARY
+    assert kept[-2:] == HISTORY[-2:]
+    assert context.knowledge_used >= 1
+    assert context.tokens <= BUDGET
+    assert count_message_tokens(LEARN_PROMPT.format_messages(**context.inputs)) <= BUDGET
+
+
+def test_no_reserve_lets_knowledge_fill_budget(monkeypatch):
+    monkeypatch.setattr(settings, "prompt_history_reserve_ratio", 0.0)
+    context = assemble_context(LEARN_PROMPT, INPUTS, knowledge=KNOWLEDGE, history=HISTORY, budget=BUDGET)
+
+    assert context.history_used == 0
+
+
+def test_short_knowledge_keeps_all_history():
+    context = assemble_context(LEARN_PROMPT, INPUTS, knowledge=KNOWLEDGE[:1], history=HISTORY, budget=BUDGET)
+
+    assert context.inputs["chat_history"] == HISTORY
+    assert context.knowledge_used == 1
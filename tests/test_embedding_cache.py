@@ -0,0 +1,59 @@
+"""嵌入缓存测试：超过大小上限后淘汰最久未使用的向量，文件大小有界"""
+import os
+import zlib
+
+import numpy as np
+
+from backend.utils.embedding_cache import EmbeddingCache
+
+DIM = 16
+ROW_BYTES = DIM * 4
+
+
+def _vectors(texts):
+    return [np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIM).tolist() for text in texts]
+
+
+def _vector_files(cache_dir: str):
+    return [name for name in os.listdir(cache_dir) if name.endswith(".f32")]
+
+
+def test_prune_bounds_size_and_keeps_recent(tmp_path):
+    cache_dir = str(tmp_path)
+    cache = EmbeddingCache(cache_dir, "model-a", max_bytes=100 * ROW_BYTES)
+
+    # 反复重新分片：每轮都是新的文档块
+    for round_ in range(10):
+        texts = [f"chunk-{round_}-{i}" for i in range(40)]
+        cache.embed_documents(texts, _vectors)
+        assert cache.size() <= 100 * ROW_BYTES
+
+    # 只剩当前一代文件
+    assert len(_vector_files(cache_dir)) == 1
+
+    # 最近写入的一轮仍然命中，向量与写入时一致
+    latest = [f"chunk-9-{i}" for i in range(40)]
+    cached = cache.get_many(latest)
+    assert all(vector is not None for vector in cached)
+    np.testing.assert_allclose(np.array(cached), np.array(_vectors(latest), dtype=np.float32))
+
+    # 最早的一轮已被淘汰
+    assert all(vector is None for vector in cache.get_many([f"chunk-0-{i}" for i in range(40)]))
+
+
+def test_prune_evicts_other_models_first(tmp_path):
+    cache_dir = str(tmp_path)
+    old = EmbeddingCache(cache_dir, "old-model", max_bytes=100 * ROW_BYTES)
+    old.embed_documents([f"old-{i}" for i in range(60)], _vectors)
+
+    new = EmbeddingCache(cache_dir, "new-model", max_bytes=100 * ROW_BYTES)
+    texts = [f"new-{i}" for i in range(60)]
+    new.embed_documents(texts, _vectors)
+
+    assert new.size() <= 100 * ROW_BYTES
+    assert all(vector is not None for vector in new.get_many(texts))
+    # 另一个进程（旧模型的缓存对象）映射的文件已被压缩替换，按未命中处理而不是读到错误的向量
+    old_cached = old.get_many([f"old-{i}" for i in range(60)])
+    for text, vector in zip([f"old-{i}" for i in range(60)], old_cached):
+        if vector is not None:
+            np.testing.assert_allclose(vector, np.array(_vectors([text])[0], dtype=np.float32))
@@ -0,0 +1,67 @@
+"""工具执行器测试：并发执行的总耗时约为最慢的调用，超时的调用被取消"""
+import asyncio
+import time
+
+from langchain.tools import Tool
+
+from backend.modules.tools import ToolCall, ToolExecutor, ToolRegistry
+
+LATENCY = 0.3
+
+
+def _registry(cancelled: list) -> ToolRegistry:
+    """两个慢工具和一个超时工具"""
+    def slow_sync(query: str) -> str:
+        time.sleep(LATENCY)
+        return f"sync:{query}"
+
+    async def slow(query: str) -> str:
+        await asyncio.sleep(LATENCY)
+        return f"async:{query}"
+
+    async def hang(query: str) -> str:
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(query)
+            raise
+        return query
+
+    registry = ToolRegistry()
+    registry.register(Tool(name="slow_a", func=slow_sync, coroutine=slow, description="慢工具 A"))
+    registry.register(Tool(name="slow_b", func=slow_sync, coroutine=slow, description="慢工具 B"))
+    registry.register(Tool(name="hang", func=slow_sync, coroutine=hang, description="不会结束的工具"))
+    return registry
+
+
+def test_arun_all_runs_concurrently():
+    executor = ToolExecutor(_registry([]), default_timeout=5.0)
+    start = time.perf_counter()
+    results = asyncio.run(executor.arun_all([ToolCall("slow_a", "x"), ToolCall("slow_b", "y")]))
+    elapsed = time.perf_counter() - start
+
+    assert [result.output for result in results] == ["async:x", "async:y"]
+    assert elapsed < LATENCY * 1.8
+
+
+def test_arun_all_timeout_cancels_call():
+    cancelled = []
+    executor = ToolExecutor(_registry(cancelled), default_timeout=5.0)
+    start = time.perf_counter()
+    results = asyncio.run(executor.arun_all([ToolCall("slow_a", "x"), ToolCall("hang", "z", timeout=0.1)]))
+    elapsed = time.perf_counter() - start
+
+    assert results[0].output == "async:x"
+    assert results[1].error == "工具调用超时"
+    assert cancelled == ["z"]
+    assert elapsed < LATENCY * 1.8
+
+
+def test_run_all_runs_concurrently():
+    executor = ToolExecutor(_registry([]), default_timeout=5.0, max_workers=4)
+    start = time.perf_counter()
+    results = executor.run_all([ToolCall("slow_a", "x"), ToolCall("slow_b", "y")])
+    elapsed = time.perf_counter() - start
+
+    assert [result.output for result in results] == ["sync:x", "sync:y"]
+    assert elapsed < LATENCY * 1.8
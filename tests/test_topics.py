@@ -0,0 +1,44 @@
+"""按知识点检索测试：记录的语义检索结果不足 k 个时用新的语义检索补足"""
+from backend.models.topic_index import TopicIndex
+from backend.models.vector_store import SearchHit
+from backend.modules.rag import RAGKnowledgeBase
+
+CHUNKS = {f"c{i}": f"text-{i}" for i in range(5)}
+
+
+class _Store:
+    """只支持按 ID 读取的向量存储"""
+
+    def get(self, ids):
+        return [{"id": id_, "content": CHUNKS[id_], "metadata": {}} for id_ in ids if id_ in CHUNKS]
+
+
+class _KnowledgeBase(RAGKnowledgeBase):
+    """不连接向量库和嵌入模型的知识库，语义检索按固定顺序返回"""
+
+    store = _Store()
+
+    def __init__(self, topic_index: TopicIndex):
+        self.topic_index = topic_index
+        self.queries = []
+
+    def search_many_hits(self, queries, k=3):
+        self.queries.extend(queries)
+        return [[SearchHit(f"c{i}", CHUNKS[f"c{i}"], {}, 0.1 * (i + 1)) for i in range(k)] for _ in queries]
+
+
+def test_learned_topic_is_topped_up(tmp_path):
+    index = TopicIndex(str(tmp_path / "topics.db"))
+    index.remember("GDP", [("c1", 0.05)])
+    kb = _KnowledgeBase(index)
+
+    hits = kb.search_topics(["GDP"], k=3)[0]
+
+    # 记录的行在前，语义检索补足剩余名额，按 ID 去重
+    assert [hit.id for hit in hits] == ["c1", "c0", "c2"]
+    assert hits[0].distance == 0.05
+    assert kb.queries == ["GDP"]
+
+    # 补足的结果也记入索引，下次直接查表
+    assert [hit.id for hit in kb.search_topics(["GDP"], k=3)[0]] == ["c1", "c0", "c2"]
+    assert kb.queries == ["GDP"]
@@ -0,0 +1,109 @@
+"""向量存储测试：删除后重新写入时文件大小有界，反复发布快照后旧版本的数据库连接和内存映射被释放"""
+import os
+
+import numpy as np
+import pytest
+
+from backend.models.vector_store import LocalVectorStore, SnapshotVectorStore
+
+PUBLISHES = 30
+DIM = 8
+CHUNKS = 1000
+ROUNDS = 5
+
+
+def _chunks(rng):
+    ids = [f"chunk-{i}" for i in range(CHUNKS)]
+    return ids, [f"text-{i}" for i in range(CHUNKS)], rng.standard_normal((CHUNKS, DIM)), [{"i": i} for i in range(CHUNKS)]
+
+
+def _vector_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+               if name.startswith(("vectors.", "scales.")))
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_reindex_compacts_deleted_rows(tmp_path, dtype):
+    store = LocalVectorStore(str(tmp_path / "store"), dtype=dtype)
+    rng = np.random.default_rng(0)
+    for _ in range(ROUNDS):
+        ids, texts, embeddings, metadatas = _chunks(rng)
+        store.delete(ids)
+        store.add(ids, texts, embeddings.tolist(), metadatas)
+
+    assert store.count() == CHUNKS
+    assert store._next_slot <= CHUNKS / (1 - 0.25)
+    row_bytes = DIM * np.dtype(dtype).itemsize + (4 if dtype == "int8" else 0)
+    assert _vector_bytes(store.path) <= row_bytes * CHUNKS / (1 - 0.25)
+
+    # 重新编号后每个 ID 仍然对应自己的向量
+    hits = store.query(embeddings[:20].tolist(), k=1)
+    assert [hit[0].id for hit in hits] == ids[:20]
+    reopened = LocalVectorStore(store.path, dtype=dtype)
+    assert [hit[0].id for hit in reopened.query(embeddings[:20].tolist(), k=1)] == ids[:20]
+
+
+def test_partial_deletes_stay_bounded(tmp_path):
+    store = LocalVectorStore(str(tmp_path / "store"))
+    rng = np.random.default_rng(1)
+    ids, texts, embeddings, metadatas = _chunks(rng)
+    store.add(ids, texts, embeddings.tolist(), metadatas)
+    for round_ in range(20):
+        # 每轮替换 10% 的文档块（一个来源重新索引）
+        start = round_ * 100 % CHUNKS
+        part = slice(start, start + 100)
+        embeddings[part] = rng.standard_normal((100, DIM))
+        store.add(ids[part], texts[part], embeddings[part].tolist(), metadatas[part])
+        assert store._next_slot <= CHUNKS / (1 - 0.25) + 100
+
+    assert [hit[0].id for hit in store.query(embeddings[::50].tolist(), k=1)] == ids[::50]
+
+
+def test_snapshot_versions_stay_bounded(tmp_path):
+    store = SnapshotVectorStore(str(tmp_path / "store"), check_interval=0.0)
+    rng = np.random.default_rng(2)
+    for _ in range(ROUNDS):
+        ids, texts, embeddings, metadatas = _chunks(rng)
+        with store.batch():
+            store.delete(ids)
+            store.add(ids, texts, embeddings.tolist(), metadatas)
+
+    current = os.path.join(store.snapshots_dir, store.version)
+    assert store.count() == CHUNKS
+    assert _vector_bytes(current) <= DIM * 2 * CHUNKS / (1 - 0.25)
+    assert [hit[0].id for hit in store.query(embeddings[:20].tolist(), k=1)] == ids[:20]
+
+
+def _open_files(root: str):
+    """本进程打开的 root 下的文件描述符和内存映射"""
+    fds = []
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            target = os.readlink(os.path.join("/proc/self/fd", fd))
+        except OSError:  # 列目录时使用的描述符已关闭
+            continue
+        if target.startswith(root):
+            fds.append(target)
+    with open("/proc/self/maps", encoding="utf-8") as f:
+        maps = [line.split(None, 5)[-1].strip() for line in f if root in line]
+    return fds, maps
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="需要 /proc 文件系统")
+def test_republish_releases_old_readers(tmp_path):
+    root = str(tmp_path / "store")
+    store = SnapshotVectorStore(root, check_interval=0.0)
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal((1, DIM)).tolist()
+
+    for i in range(PUBLISHES):
+        store.add([f"doc-{i}"], [f"text-{i}"], rng.standard_normal((1, DIM)).tolist(), [{"i": i}])
+        assert len(store.query(query, k=3)[0]) == min(i + 1, 3)
+
+    fds, maps = _open_files(root)
+    # 只剩当前版本：一个数据库连接，向量文件映射一次（mmap 会复制一个描述符）
+    assert len(fds) <= 2, fds
+    assert len(set(maps)) <= 1, maps
+    assert not [path for path in fds + maps if path.endswith("(deleted)")]
+    assert all(store.version in path for path in fds + maps)
+    assert store.count() == PUBLISHES